@@ -1,15 +1,20 @@
 from mltrace.client import (
     clean_db,
+    init_db,
     create_component,
     register,
     backtrace,
+    backtrace_batch,
     get_history,
+    find_runs,
     tag_component,
     log_component_run,
+    log_component_runs,
     create_random_ids,
     get_component_information,
     get_component_run_information,
     web_trace,
+    web_trace_dag,
     get_recent_run_ids,
     get_io_pointer,
     set_db_uri,
@@ -17,6 +22,16 @@ from mltrace.client import (
     get_git_hash,
     get_git_tags,
     set_address,
+    set_pool_config,
+    enable_async_logging,
+    disable_async_logging,
+    flush,
+    enable_async_artifacts,
+    disable_async_artifacts,
+    flush_artifacts,
+    get_artifact_stats,
+    gc_artifacts,
+    get_logging_stats,
     add_notes_to_component_run,
     flag_output_id,
     unflag_output_id,
@@ -25,7 +40,9 @@ from mltrace.client import (
     get_components,
     unflag_all,
     load,
+    load_many,
     save,
+    set_artifact_config,
     retract_label,
     retrieve_retracted_labels,
     retract_labels,
@@ -47,16 +64,21 @@ from mltrace.entities import (
 
 __all__ = [
     "clean_db",
+    "init_db",
     "create_component",
     "register",
     "backtrace",
+    "backtrace_batch",
     "get_history",
+    "find_runs",
     "tag_component",
     "log_component_run",
+    "log_component_runs",
     "create_random_ids",
     "get_component_information",
     "get_component_run_information",
     "web_trace",
+    "web_trace_dag",
     "get_recent_run_ids",
     "get_io_pointer",
     "set_db_uri",
@@ -64,6 +86,16 @@ __all__ = [
     "get_git_hash",
     "get_git_tags",
     "set_address",
+    "set_pool_config",
+    "enable_async_logging",
+    "disable_async_logging",
+    "flush",
+    "enable_async_artifacts",
+    "disable_async_artifacts",
+    "flush_artifacts",
+    "get_artifact_stats",
+    "gc_artifacts",
+    "get_logging_stats",
     "add_notes_to_component_run",
     "flag_output_id",
     "unflag_output_id",
@@ -76,7 +108,9 @@ __all__ = [
     "ComponentRun",
     "IOPointer",
     "load",
+    "load_many",
     "save",
+    "set_artifact_config",
     "retract_label",
     "retrieve_retracted_labels",
     "retract_labels",
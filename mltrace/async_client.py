@@ -0,0 +1,109 @@
+"""
+Asyncio versions of the client functions, for services running in an event
+loop. They use the same database URI as mltrace.client.
+"""
+from datetime import datetime
+from mltrace import client, utils
+from mltrace.db.async_store import AsyncStore
+from mltrace.entities import ComponentRun
+
+import typing
+
+
+async def log_component_run(
+    component_run: ComponentRun,
+    set_dependencies_from_inputs=True,
+    staleness_threshold: int = (60 * 60 * 24 * 30),
+):
+    """Takes client-facing ComponentRun object and logs it to the DB."""
+    async with AsyncStore(client.get_db_uri()) as store:
+        await store.run_sync(
+            client._log_component_run,
+            component_run,
+            set_dependencies_from_inputs=set_dependencies_from_inputs,
+            staleness_threshold=staleness_threshold,
+        )
+
+
+async def log_component_runs(
+    component_runs: typing.List[ComponentRun],
+    set_dependencies_from_inputs=True,
+    staleness_threshold: int = (60 * 60 * 24 * 30),
+) -> typing.List[int]:
+    """Logs many client-facing ComponentRun objects in one transaction."""
+    async with AsyncStore(client.get_db_uri()) as store:
+        return await store.bulk_commit_component_runs(
+            [client._component_run_to_bulk_dict(cr) for cr in component_runs],
+            set_dependencies_from_inputs=set_dependencies_from_inputs,
+            staleness_threshold=staleness_threshold,
+        )
+
+
+async def get_history(
+    component_name: str,
+    limit: int = 10,
+    date_lower: typing.Union[datetime, str] = datetime.min,
+    date_upper: typing.Union[datetime, str] = datetime.max,
+    last_run_id: int = None,
+) -> typing.List[ComponentRun]:
+    """Returns a list of ComponentRuns that are part of the component's
+    history, newest first. Pass the id of the last run of a page as
+    last_run_id to get the next page."""
+    if not date_lower:
+        date_lower = datetime.min
+    if not date_upper:
+        date_upper = datetime.max
+
+    async with AsyncStore(client.get_db_uri()) as store:
+        return await store.run_sync(
+            _get_client_history,
+            component_name,
+            limit,
+            date_lower,
+            date_upper,
+            last_run_id,
+        )
+
+
+def _get_client_history(store, *args) -> typing.List[ComponentRun]:
+    """Runs store.get_history and converts the runs to client runs. Their
+    relations are loaded right away, on the AsyncStore's session, since
+    the session is closed by the time the caller reads them."""
+    component_runs = utils.convertToClient(
+        store.get_history(*args), store=store
+    )
+    for cr in component_runs:
+        cr._load_relations()
+    return component_runs
+
+
+async def web_trace(output_id: str):
+    async with AsyncStore(client.get_db_uri()) as store:
+        return await store.web_trace(output_id, last_only=True)
+
+
+async def web_trace_dag(output_id: str) -> dict:
+    async with AsyncStore(client.get_db_uri()) as store:
+        return await store.web_trace_dag(output_id, last_only=True)
+
+
+async def log_output(
+    task_name: str,
+    identifier: str,
+    val: float,
+):
+    async with AsyncStore(client.get_db_uri()) as store:
+        await store.log_output(
+            identifier=identifier, task_name=task_name, val=val
+        )
+
+
+async def log_feedback(
+    task_name: str,
+    identifier: str,
+    val: float,
+):
+    async with AsyncStore(client.get_db_uri()) as store:
+        await store.log_feedback(
+            identifier=identifier, task_name=task_name, val=val
+        )
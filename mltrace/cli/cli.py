@@ -9,7 +9,8 @@ from mltrace import (
     get_component_run_information,
     get_component_information,
     get_history,
-    web_trace,
+    web_trace_dag,
+    backtrace_batch,
     flag_output_id,
     unflag_output_id,
     review_flagged_outputs,
@@ -17,10 +18,12 @@ from mltrace import (
     get_components,
     unflag_all,
     clean_db,
+    init_db,
     retract_label,
     retrieve_io_pointers_for_label,
     retrieve_retracted_labels,
     get_labels,
+    gc_artifacts,
 )
 import textwrap
 
@@ -167,12 +170,13 @@ def show_history(history):
 
 def show_res(res, indent, count, pos, need_stick):
     """
-    A recursive method that prints the trace of an output id.
+    Prints the trace of an output id.
 
     The response of `web_trace` is a list of nodes. The nodes
     can either be a list of children nodes or a dictionary.
 
-    We will recursively iterate the res, and print the `label`
+    We iterate over res depth-first with an explicit stack, so deep
+    traces don't hit the recursion limit, and print the `label`
     field of each node.
 
     Args:
@@ -182,38 +186,92 @@ def show_res(res, indent, count, pos, need_stick):
         pos: which child. (Used for prinitng)
         need_stick: how many "|" are needed. (Used for prinitng)
     """
-    if isinstance(res, dict):
-        # dictionary is a node
-        # BUILD THE TREE STRUCTURE
-        label = f"└─{res['label']}" if count == pos else f"├─{res['label']}"
-        pre = "  " if indent > 0 else ""
-        sticks = "│ " * (need_stick)
-        temp_indent = (indent - 1) - (need_stick)
-        post = "  " * (temp_indent)
-        label = pre + sticks + post + label
-        click.echo(label)
-        # NEED STICK LOGIC
-        need_stick = need_stick if count == pos else need_stick + 1
-        # CALL METHOD RECURSIVELY
-        if "childNodes" in res.keys():
-            show_res(
-                res=res["childNodes"],
-                indent=indent + 1,
-                count=count,
-                pos=pos,
-                need_stick=need_stick,
+    stack = [(res, indent, count, pos, need_stick)]
+    while len(stack) > 0:
+        res, indent, count, pos, need_stick = stack.pop()
+        if isinstance(res, dict):
+            # dictionary is a node
+            # BUILD THE TREE STRUCTURE
+            label = (
+                f"└─{res['label']}" if count == pos else f"├─{res['label']}"
             )
+            pre = "  " if indent > 0 else ""
+            sticks = "│ " * (need_stick)
+            temp_indent = (indent - 1) - (need_stick)
+            post = "  " * (temp_indent)
+            label = pre + sticks + post + label
+            click.echo(label)
+            # NEED STICK LOGIC
+            need_stick = need_stick if count == pos else need_stick + 1
+            # VISIT CHILDREN NEXT
+            if "childNodes" in res.keys():
+                stack.append(
+                    (res["childNodes"], indent + 1, count, pos, need_stick)
+                )
+
+        if isinstance(res, list):
+            # list of children, pushed in reverse so they print in order
+            stack.extend(
+                [
+                    (component, indent, len(res) - 1, index, need_stick)
+                    for index, component in reversed(list(enumerate(res)))
+                ]
+            )
+
+
+def dag_to_tree(dag: dict):
+    """
+    Converts the result of `web_trace_dag` into the nested nodes that
+    `show_res` prints. A ComponentRun reached by more than one path is only
+    expanded the first time; later occurrences are leaves marked
+    "(see above)", so the tree grows linearly with the number of runs.
+    Iterative, so long chains don't hit the recursion limit.
 
-    if isinstance(res, list):
-        # list of children
-        for index, component in enumerate(res):
-            show_res(
-                res=component,
-                indent=indent,
-                count=len(res) - 1,
-                pos=index,
-                need_stick=need_stick,
+    Args:
+        dag: dictionary with roots, nodes and edges.
+    """
+    nodes = {node["id"]: node for node in dag["nodes"]}
+    deps = {}
+    for src, dst in dag["edges"]:
+        deps.setdefault(src, []).append(dst)
+
+    shown = set()
+    trees = []
+    # (node id, list its tree is appended to), in depth-first order
+    stack = [(root, trees) for root in reversed(dag["roots"])]
+    while len(stack) > 0:
+        node_id, siblings = stack.pop()
+        node = nodes[node_id]
+        if node_id in shown:
+            siblings.append(
+                {"id": node_id, "label": f"{node['label']} (see above)"}
             )
+            continue
+        shown.add(node_id)
+        tree = dict(node, childNodes=list(node["childNodes"]))
+        siblings.append(tree)
+        stack.extend(
+            [
+                (dep, tree["childNodes"])
+                for dep in reversed(deps.get(node_id, []))
+            ]
+        )
+
+    return trees
+
+
+def show_trace(output_id: str, trace):
+    """
+    Prints a trace returned by `backtrace` as an indented list of
+    component runs.
+
+    Args:
+        output_id: The traced output id.
+        trace: List of (level, ComponentRun) tuples.
+    """
+    click.echo(output_id)
+    for level, cr in trace:
+        click.echo(f"{'  ' * level}└─{cr.component_name} (ID {cr.id})")
 
 
 # ------------------------- CLI ------------------------ #
@@ -267,9 +325,9 @@ def history(component_name: str, limit: int, address: str = ""):
     if address and len(address) > 0:
         set_address(address)
     history = (
-        get_history(component_name, limit)
+        get_history(component_name, limit, profile="full")
         if limit
-        else get_history(component_name)
+        else get_history(component_name, profile="full")
     )
     show_history(history)
 
@@ -284,7 +342,7 @@ def trace(output_id: str, address: str = ""):
     # Set address
     if address and len(address) > 0:
         set_address(address)
-    res = web_trace(output_id)
+    res = dag_to_tree(web_trace_dag(output_id))
     click.echo(res[0]["label"])
     if "childNodes" in res[0].keys():
         show_res(
@@ -292,6 +350,34 @@ def trace(output_id: str, address: str = ""):
         )
 
 
+@mltrace.command("trace-batch")
+@click.argument("output_ids", nargs=-1)
+@click.option(
+    "--file",
+    type=click.File("r"),
+    help="File with one output ID per line",
+)
+@click.option("--address", help="Database server address")
+def trace_batch(output_ids, file=None, address: str = ""):
+    """
+    CLI for tracing many output ids at once.
+    """
+    output_ids = list(output_ids)
+    if file:
+        output_ids += [line.strip() for line in file if line.strip()]
+    if len(output_ids) == 0:
+        raise click.ClickException(
+            "Need to specify output IDs or a --file of output IDs."
+        )
+
+    # Set address
+    if address and len(address) > 0:
+        set_address(address)
+    for output_id, trace in backtrace_batch(output_ids).items():
+        show_trace(output_id, trace)
+        click.echo()
+
+
 @mltrace.command("flag")
 @click.argument("output_id")
 @click.option("--address", help="Database server address")
@@ -344,7 +430,9 @@ def review(limit: int = 5, address: str = ""):
     """Command to find common component runs in a set of flagged outputs."""
     if address and len(address) > 0:
         set_address(address)
-    outputs, component_counts = review_flagged_outputs()
+    outputs, component_counts = review_flagged_outputs(
+        limit=limit, profile="summary"
+    )
 
     # Print output ids
     click.echo("Flagged outputs:")
@@ -356,7 +444,7 @@ def review(limit: int = 5, address: str = ""):
     click.echo()
 
     # Print component runs
-    for component, count in component_counts[:limit]:
+    for component, count in component_counts:
         show_info_card(component.id, count, len(outputs))
 
 
@@ -414,6 +502,20 @@ def clear(address: str = ""):
     clean_db()
 
 
+@mltrace.command("init-db")
+@click.option("--address", help="Database server address")
+def initialize_db(address: str = ""):
+    """
+    Command to create any missing tables in the db.
+    """
+    # Set address
+    if address and len(address) > 0:
+        set_address(address)
+
+    revision = init_db()
+    click.echo(f"Database schema revision: {revision}")
+
+
 @mltrace.command("retract")
 @click.argument("label_id")
 @click.option(
@@ -489,3 +591,25 @@ def labels(address: str = ""):
     labels = get_labels()
     for label in labels:
         click.echo(f"{label}")
+
+
+@mltrace.command("gc-artifacts")
+@click.option(
+    "--min-age",
+    default=3600.0,
+    help="Keep contents written or linked in the last min-age seconds.",
+)
+@click.option(
+    "--dry-run", is_flag=True, help="Only report what would be deleted."
+)
+def collect_artifacts(min_age: float = 3600.0, dry_run: bool = False):
+    """
+    Command to delete stored artifact contents that no saved artifact
+    refers to anymore.
+    """
+    res = gc_artifacts(min_age=min_age, dry_run=dry_run)
+    verb = "Would delete" if dry_run else "Deleted"
+    click.echo(
+        f"{verb} {res['deleted']} unreferenced files "
+        + f"({res['bytes']} bytes). Kept {res['kept']}."
+    )
@@ -1,9 +1,25 @@
 from datetime import datetime
 from mltrace import utils
 from mltrace.db import Store, PointerTypeEnum
-from mltrace.db.utils import _get_data_and_model_args, _load, _save
+from mltrace.db.utils import (
+    _gc_artifacts,
+    _get_artifact_writer,
+    _get_data_and_model_args,
+    _load,
+    _load_many,
+    _map_extension_to_enum,
+    _save,
+    _set_artifact_config,
+    _set_artifact_writer,
+    _set_pool_config,
+    _wait_for_artifacts,
+    _write_artifact,
+)
+from mltrace.db.artifact_writer import ArtifactWriter
+from mltrace.db.writer import BatchWriter
 from mltrace.entities import Component, ComponentRun, IOPointer
 
+import atexit
 import copy
 import functools
 import git
@@ -15,6 +31,7 @@ import typing
 import uuid
 
 _db_uri = utils.get_db_uri()
+_writer = None
 
 # --------------------- Database management functions ------------------- #
 
@@ -32,7 +49,31 @@ def get_db_uri() -> str:
 
 def set_address(address: str):
     global _db_uri
-    _db_uri = utils.set_address(address)
+    utils.set_address(address)
+    _db_uri = utils.get_db_uri()
+
+
+def set_pool_config(
+    pool_size: int = None,
+    max_overflow: int = None,
+    pool_pre_ping: bool = None,
+    pool_recycle: int = None,
+):
+    """Configures the connection pool shared by all database calls in this
+    process. Arguments left as None keep their current values."""
+    _set_pool_config(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=pool_pre_ping,
+        pool_recycle=pool_recycle,
+    )
+
+
+def init_db() -> str:
+    """Creates any missing tables and returns the schema revision of the
+    database."""
+    with Store(_db_uri) as store:
+        return store.init_db()
 
 
 def clean_db():
@@ -40,18 +81,204 @@ def clean_db():
     store = Store(_db_uri, delete_first=True)
 
 
+# ----------------------- Async logging functions ---------------------- #
+
+
+def enable_async_logging(
+    max_queue_size: int = 10000,
+    batch_size: int = 100,
+    flush_interval: float = 0.1,
+    block: bool = True,
+):
+    """Makes register-decorated functions hand their component runs to a
+    background writer instead of logging them before returning. The writer
+    commits one transaction per batch and is flushed on exit. If block is
+    False, runs are dropped when the queue is full instead of waiting.
+
+    Values are hashed by the writer, so don't mutate logged objects after
+    the call returns. Functions registered with auto_log=True are still
+    logged synchronously since resolving their arguments needs the db."""
+    global _writer
+    disable_async_logging()
+    _writer = BatchWriter(
+        _db_uri,
+        _write_component_runs,
+        max_queue_size=max_queue_size,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        block=block,
+    )
+
+
+def disable_async_logging(timeout: float = None):
+    """Flushes and stops the background writer, if there is one."""
+    global _writer
+    if _writer is not None:
+        _writer.close(timeout)
+        _writer = None
+
+
+def flush(timeout: float = None) -> bool:
+    """Blocks until all queued component runs are written. Returns False if
+    the timeout expired first."""
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+
+def get_logging_stats() -> dict:
+    """Returns queue depth, counts and flush latencies of the background
+    writer, or an empty dict if async logging is disabled."""
+    if _writer is None:
+        return {}
+    return _writer.stats()
+
+
+def _write_component_runs(
+    store: Store, items: typing.List[typing.Tuple[ComponentRun, int]]
+):
+    """Logs queued (ComponentRun, staleness_threshold) items in bulk."""
+    by_threshold = {}
+    for component_run, staleness_threshold in items:
+        by_threshold.setdefault(staleness_threshold, []).append(
+            _component_run_to_bulk_dict(component_run)
+        )
+    for staleness_threshold, component_runs in by_threshold.items():
+        store.bulk_commit_component_runs(
+            component_runs, staleness_threshold=staleness_threshold
+        )
+
+
+def _client_io_pointer(
+    name: str,
+    value: typing.Any = "",
+    pointer_type: PointerTypeEnum = None,
+) -> IOPointer:
+    """Client-side counterpart of Store.get_io_pointer."""
+    if pointer_type is None:
+        pointer_type = _map_extension_to_enum(name)
+    return IOPointer(name, value, pointer_type)
+
+
+def _client_io_pointers(
+    names: typing.List[str],
+    values: typing.List[typing.Any] = None,
+    pointer_type: PointerTypeEnum = None,
+) -> typing.List[IOPointer]:
+    """Client-side counterpart of Store.get_io_pointers."""
+    values = values if values else [""] * len(names)
+    if pointer_type is None and len(names) > 0:
+        pointer_type = _map_extension_to_enum(names[0])
+    return [
+        IOPointer(name, value, pointer_type)
+        for name, value in zip(names, values)
+    ]
+
+
+atexit.register(disable_async_logging)
+
 # ----------------------- Load and save functions ---------------------- #
 
 
-def load(pathname: str):
-    """Loads joblib file at pathname."""
-    return _load(pathname)
+def enable_async_artifacts(
+    max_workers: int = 4, max_in_flight_bytes: int = 1 << 30
+):
+    """Makes save (and auto_log=True) queue artifact writes on a pool of
+    max_workers threads and return the pathname right away. Files are
+    written to a temporary name and renamed into place. save blocks while
+    more than max_in_flight_bytes of objects are waiting to be written.
+
+    Objects are serialized in the background, so don't modify a saved
+    object until flush_artifacts returns. load waits for pending writes of
+    the file it reads."""
+    disable_async_artifacts()
+    _set_artifact_writer(
+        ArtifactWriter(
+            _write_artifact,
+            max_workers=max_workers,
+            max_in_flight_bytes=max_in_flight_bytes,
+        )
+    )
+
+
+def disable_async_artifacts(timeout: float = None):
+    """Flushes and stops the background artifact writer, if there is one."""
+    writer = _set_artifact_writer(None)
+    if writer is not None:
+        writer.close(timeout)
+
+
+def flush_artifacts(timeout: float = None) -> bool:
+    """Blocks until all queued artifact writes have finished. Returns False
+    if the timeout expired first."""
+    writer = _get_artifact_writer()
+    if writer is None:
+        return True
+    return writer.flush(timeout)
+
+
+def get_artifact_stats() -> dict:
+    """Returns the number and estimated size of pending artifact writes and
+    counts of finished ones, or an empty dict if async artifact writes are
+    disabled."""
+    writer = _get_artifact_writer()
+    if writer is None:
+        return {}
+    return writer.stats()
+
+
+atexit.register(disable_async_artifacts)
+
+
+def gc_artifacts(min_age: float = 3600, dry_run: bool = False) -> dict:
+    """Deletes stored artifact contents that no saved artifact refers to
+    anymore, e.g. after their files were deleted. Contents written or
+    linked in the last min_age seconds are kept. Returns the number of
+    files deleted and kept, and the bytes freed (or that would be freed,
+    with dry_run)."""
+    return _gc_artifacts(min_age=min_age, dry_run=dry_run)
+
+
+def set_artifact_config(
+    compress: str = None, compress_level: int = None, mmap_mode: str = None
+):
+    """Sets the defaults of save and load. compress is a codec (zlib, gzip,
+    bz2, lzma, xz or lz4) and compress_level its level, 0 to 9. With
+    mmap_mode ("r", "r+" or "c"), numpy arrays in uncompressed files are
+    memory mapped instead of read into memory. Arguments left as None keep
+    their current values; pass "" for compress or mmap_mode to turn them
+    off."""
+    _set_artifact_config(
+        compress=compress, compress_level=compress_level, mmap_mode=mmap_mode
+    )
+
+
+def load(pathname: str, mmap_mode: str = None):
+    """Loads joblib file at pathname. mmap_mode overrides the default set
+    with set_artifact_config."""
+    return _load(pathname, mmap_mode=mmap_mode)
+
+
+def load_many(
+    pathnames: typing.List[str], mmap_mode: str = None, max_workers: int = 8
+) -> typing.List[typing.Any]:
+    """Loads the joblib files at pathnames on up to max_workers threads and
+    returns them in order. Inside a registered function, every file is
+    logged as an input, as with load."""
+    return _load_many(
+        pathnames, mmap_mode=mmap_mode, max_workers=max_workers
+    )
 
 
 # TODO(shreyashankar): Handle multiple writes at the same second
-def save(obj, pathname: str = None) -> str:
-    """Saves joblib object to pathname."""
-    return _save(obj, pathname)
+def save(
+    obj, pathname: str = None, compress: str = None, compress_level: int = None
+) -> str:
+    """Saves joblib object to pathname. compress and compress_level
+    override the defaults set with set_artifact_config."""
+    return _save(
+        obj, pathname, compress=compress, compress_level=compress_level
+    )
 
 
 # ----------------------- Creation functions ---------------------------- #
@@ -61,14 +288,14 @@ def create_component(
     name: str, description: str, owner: str, tags: typing.List[str] = []
 ):
     """Creates a component entity in the database."""
-    store = Store(_db_uri)
-    store.create_component(name, description, owner, tags)
+    with Store(_db_uri) as store:
+        store.create_component(name, description, owner, tags)
 
 
 def tag_component(component_name: str, tags: typing.List[str]):
     """Adds tags to existing component."""
-    store = Store(_db_uri)
-    store.add_tags_to_component(component_name, tags)
+    with Store(_db_uri) as store:
+        store.add_tags_to_component(component_name, tags)
 
 
 def log_component_run(
@@ -77,8 +304,67 @@ def log_component_run(
     staleness_threshold: int = (60 * 60 * 24 * 30),
 ):
     """Takes client-facing ComponentRun object and logs it to the DB."""
-    store = Store(_db_uri)
+    with Store(_db_uri) as store:
+        _log_component_run(
+            store,
+            component_run,
+            set_dependencies_from_inputs=set_dependencies_from_inputs,
+            staleness_threshold=staleness_threshold,
+        )
+
+
+def log_component_runs(
+    component_runs: typing.List[ComponentRun],
+    set_dependencies_from_inputs=True,
+    staleness_threshold: int = (60 * 60 * 24 * 30),
+) -> typing.List[int]:
+    """Logs many client-facing ComponentRun objects in one transaction.
+    Runs may depend on runs earlier in the list. Returns the ids of the
+    logged runs."""
+    with Store(_db_uri) as store:
+        return store.bulk_commit_component_runs(
+            [_component_run_to_bulk_dict(cr) for cr in component_runs],
+            set_dependencies_from_inputs=set_dependencies_from_inputs,
+            staleness_threshold=staleness_threshold,
+        )
 
+
+def _component_run_to_bulk_dict(component_run: ComponentRun) -> dict:
+    """Converts a client-facing ComponentRun into the dict accepted by
+    Store.bulk_commit_component_runs."""
+    component_run_dict = component_run.to_dictionary()
+
+    code_snapshot = component_run_dict["code_snapshot"]
+    if isinstance(code_snapshot, str):
+        code_snapshot = bytes(code_snapshot, "utf-8")
+
+    return {
+        "component_name": component_run_dict["component_name"],
+        "start_timestamp": component_run_dict["start_timestamp"],
+        "end_timestamp": component_run_dict["end_timestamp"],
+        "notes": component_run_dict["notes"],
+        "git_hash": component_run_dict["git_hash"],
+        "git_tags": component_run_dict["git_tags"],
+        "code_snapshot": code_snapshot,
+        "inputs": [
+            (inp.name, inp.value, inp.pointer_type)
+            for inp in component_run_dict["inputs"]
+        ],
+        "outputs": [
+            (out.name, out.value, out.pointer_type)
+            for out in component_run_dict["outputs"]
+        ],
+        "dependencies": component_run_dict["dependencies"],
+    }
+
+
+def _log_component_run(
+    store: Store,
+    component_run: ComponentRun,
+    set_dependencies_from_inputs=True,
+    staleness_threshold: int = (60 * 60 * 24 * 30),
+):
+    """Logs a client-facing ComponentRun object with the given store."""
     # Make dictionary object
     component_run_dict = component_run.to_dictionary()
 
@@ -100,9 +386,13 @@ def log_component_run(
     if component_run_dict["notes"]:
         component_run_sql.add_notes(component_run_dict["notes"])
 
+    code_snapshot = component_run_dict["code_snapshot"]
+    if isinstance(code_snapshot, str):
+        code_snapshot = bytes(code_snapshot, "utf-8")
+
     component_run_sql.set_git_hash(component_run_dict["git_hash"])
     component_run_sql.set_git_tags(component_run_dict["git_tags"])
-    component_run_sql.set_code_snapshot(component_run_dict["code_snapshot"])
+    component_run_sql.set_code_snapshot(code_snapshot)
 
     # Add I/O
     component_run_sql.add_inputs(
@@ -123,7 +413,7 @@ def log_component_run(
     )
 
     # Create component if it does not exist
-    create_component(component_run.component_name, "", "")
+    store.create_component(component_run.component_name, "", "")
 
     # Add dependencies if there is flag to automatically set
     if set_dependencies_from_inputs:
@@ -163,17 +453,25 @@ def register(
     auto_log: bool = False,
 ):
     def actual_decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
+        def run_and_log(store: Store, args, kwargs):
             # Get function information
             filename = inspect.getfile(func)
             function_name = func.__name__
 
             # Construct component run object
-            store = Store(_db_uri)
             component_run = store.initialize_empty_component_run(
                 component_name
             )
+
+            # In async mode, pointers are client-side IOPointers that the
+            # background writer resolves against the db
+            writer = _writer if not auto_log else None
+            get_io_pointer, get_io_pointers = (
+                (_client_io_pointer, _client_io_pointers)
+                if writer is not None
+                else (store.get_io_pointer, store.get_io_pointers)
+            )
+
             component_run.set_start_timestamp()
 
             # Define trace helper
@@ -231,9 +529,9 @@ def register(
                     logging.debug(f"Variable {var} has value {val}.")
                     continue
                 if isinstance(val, list):
-                    input_pointers += store.get_io_pointers(val)
+                    input_pointers += get_io_pointers(val)
                 else:
-                    input_pointers.append(store.get_io_pointer(str(val)))
+                    input_pointers.append(get_io_pointer(str(val)))
             for var in output_vars:
                 if var not in local_vars:
                     raise ValueError(
@@ -245,21 +543,21 @@ def register(
                     continue
                 if isinstance(val, list):
                     output_pointers += (
-                        store.get_io_pointers(
+                        get_io_pointers(
                             val, pointer_type=PointerTypeEnum.ENDPOINT
                         )
                         if endpoint
-                        else store.get_io_pointers(val)
+                        else get_io_pointers(val)
                     )
                 else:
                     output_pointers += (
                         [
-                            store.get_io_pointer(
+                            get_io_pointer(
                                 str(val), pointer_type=PointerTypeEnum.ENDPOINT
                             )
                         ]
                         if endpoint
-                        else [store.get_io_pointer(str(val))]
+                        else [get_io_pointer(str(val))]
                     )
             # Add input_kwargs and output_kwargs as pointers
             for key, val in input_kwargs.items():
@@ -280,12 +578,12 @@ def register(
                             f'Value "{val}" does not have the same length as'
                             + f' the key "{key}."'
                         )
-                    input_pointers += store.get_io_pointers(
+                    input_pointers += get_io_pointers(
                         local_vars[key], values=local_vars[val]
                     )
                 else:
                     input_pointers.append(
-                        store.get_io_pointer(
+                        get_io_pointer(
                             str(local_vars[key]), local_vars[val]
                         )
                     )
@@ -308,20 +606,20 @@ def register(
                             + f' the key "{key}."'
                         )
                     output_pointers += (
-                        store.get_io_pointers(
+                        get_io_pointers(
                             local_vars[key],
                             local_vars[val],
                             pointer_type=PointerTypeEnum.ENDPOINT,
                         )
                         if endpoint
-                        else store.get_io_pointers(
+                        else get_io_pointers(
                             local_vars[key], local_vars[val]
                         )
                     )
                 else:
                     output_pointers += (
                         [
-                            store.get_io_pointer(
+                            get_io_pointer(
                                 str(local_vars[key]),
                                 local_vars[val],
                                 pointer_type=PointerTypeEnum.ENDPOINT,
@@ -329,7 +627,7 @@ def register(
                         ]
                         if endpoint
                         else [
-                            store.get_io_pointer(
+                            get_io_pointer(
                                 str(local_vars[key]), local_vars[val]
                             )
                         ]
@@ -337,33 +635,34 @@ def register(
 
             # Directly specified I/O
             if not callable(inputs):
-                input_pointers += [store.get_io_pointer(inp) for inp in inputs]
-            input_pointers += [store.get_io_pointer(inp) for inp in inputs]
+                input_pointers += [get_io_pointer(inp) for inp in inputs]
+            input_pointers += [get_io_pointer(inp) for inp in inputs]
             output_pointers += (
                 [
-                    store.get_io_pointer(
+                    get_io_pointer(
                         out, pointer_type=PointerTypeEnum.ENDPOINT
                     )
                     for out in outputs
                 ]
                 if endpoint
-                else [store.get_io_pointer(out) for out in outputs]
+                else [get_io_pointer(out) for out in outputs]
             )
 
             # If there were calls to mltrace.load and mltrace.save, log them
             if "_mltrace_loaded_artifacts" in local_vars:
                 input_pointers += [
-                    store.get_io_pointer(name, val)
+                    get_io_pointer(name, val)
                     for name, val in local_vars[
                         "_mltrace_loaded_artifacts"
                     ].items()
                 ]
             if "_mltrace_saved_artifacts" in local_vars:
+                saved_artifacts = local_vars["_mltrace_saved_artifacts"]
+                # Saved files are identified by their contents
+                _wait_for_artifacts(saved_artifacts)
                 output_pointers += [
-                    store.get_io_pointer(name, val)
-                    for name, val in local_vars[
-                        "_mltrace_saved_artifacts"
-                    ].items()
+                    get_io_pointer(name, val)
+                    for name, val in saved_artifacts.items()
                 ]
 
             func_source_code = inspect.getsource(func)
@@ -378,9 +677,6 @@ def register(
                     **all_output_args
                 )
 
-            component_run.add_inputs(input_pointers)
-            component_run.add_outputs(output_pointers)
-
             # Add code versions
             try:
                 repo = git.Repo(search_parent_directories=True)
@@ -398,6 +694,26 @@ def register(
                     bytes(func_source_code, "ascii")
                 )
 
+            if writer is not None:
+                # Hand the run to the background writer
+                client_component_run = ComponentRun(
+                    component_name,
+                    start_timestamp=component_run.start_timestamp,
+                    end_timestamp=component_run.end_timestamp,
+                    inputs=input_pointers,
+                    outputs=output_pointers,
+                    git_hash=component_run.git_hash,
+                    git_tags=component_run.git_tags,
+                )
+                client_component_run.code_snapshot = (
+                    component_run.code_snapshot
+                )
+                writer.put((client_component_run, staleness_threshold))
+                return value
+
+            component_run.add_inputs(input_pointers)
+            component_run.add_outputs(output_pointers)
+
             # Create component if it does not exist
             create_component(component_run.component_name, "", "")
 
@@ -410,6 +726,12 @@ def register(
 
             return value
 
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Closes the store even if func or logging raises
+            with Store(_db_uri) as store:
+                return run_and_log(store, args, kwargs)
+
         return wrapper
 
     return actual_decorator
@@ -444,25 +766,25 @@ def get_git_tags() -> typing.List[str]:
 
 def add_notes_to_component_run(component_run_id: str, notes: str) -> str:
     """Adds notes to component run."""
-    store = Store(_db_uri)
-    return store.add_notes_to_component_run(component_run_id, notes)
+    with Store(_db_uri) as store:
+        return store.add_notes_to_component_run(component_run_id, notes)
 
 
 def flag_output_id(output_id: str) -> bool:
     """Sets the flag property of an IOPointer to true."""
-    store = Store(_db_uri)
-    return store.set_io_pointer_flag(output_id, True)
+    with Store(_db_uri) as store:
+        return store.set_io_pointer_flag(output_id, True)
 
 
 def unflag_output_id(output_id: str) -> bool:
     """Sets the flag property of an IOPointer to false."""
-    store = Store(_db_uri)
-    return store.set_io_pointer_flag(output_id, False)
+    with Store(_db_uri) as store:
+        return store.set_io_pointer_flag(output_id, False)
 
 
 def unflag_all():
-    store = Store(_db_uri)
-    store.unflag_all()
+    with Store(_db_uri) as store:
+        store.unflag_all()
 
 
 # ----------------- Basic retrieval functions ------------------- #
@@ -473,193 +795,270 @@ def get_history(
     limit: int = 10,
     date_lower: typing.Union[datetime, str] = datetime.min,
     date_upper: typing.Union[datetime, str] = datetime.max,
+    last_run_id: int = None,
+    profile: str = "default",
 ) -> typing.List[ComponentRun]:
     """Returns a list of ComponentRuns that are part of the component's
-    history."""
-    store = Store(_db_uri)
+    history, newest first. Pass the id of the last run of a page as
+    last_run_id to get the next page. Code snapshots are only loaded with
+    profile="full"; profile="summary" also leaves out git tags, mlflow
+    params and metrics, and test results.
+
+    Inputs, outputs and dependencies are loaded for the whole page the
+    first time any run uses them, from the database the page was read
+    from, even if set_db_uri is called in between."""
+    uri = _db_uri
+    with Store(uri) as store:
+
+        # Check if none
+        if not date_lower:
+            date_lower = datetime.min
+        if not date_upper:
+            date_upper = datetime.max
+
+        history = store.get_history_rows(
+            component_name,
+            limit,
+            date_lower,
+            date_upper,
+            last_run_id,
+            profile=profile,
+        )
 
-    # Check if none
-    if not date_lower:
-        date_lower = datetime.min
-    if not date_upper:
-        date_upper = datetime.max
+    # Convert to client-facing ComponentRuns
+    loader = utils._RelationLoader([row.id for row in history], uri)
+    return [
+        utils._client_component_run(row._mapping, loader) for row in history
+    ]
 
-    history = store.get_history(component_name, limit, date_lower, date_upper)
 
-    # Convert to client-facing ComponentRuns
-    component_runs = []
-    for cr in history:
-        inputs = [
-            IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-            for iop in cr.inputs
-        ]
-        outputs = [
-            IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-            for iop in cr.outputs
-        ]
-        dependencies = [dep.component_name for dep in cr.dependencies]
-        d = copy.deepcopy(cr.__dict__)
-        d.update(
-            {
-                "inputs": inputs,
-                "outputs": outputs,
-                "dependencies": dependencies,
-            }
+def find_runs(
+    component_name: str = None,
+    stale: bool = None,
+    git_tag: str = None,
+    mlflow_params: typing.Dict[str, typing.Any] = None,
+    mlflow_metrics: typing.List[typing.Tuple[str, str, float]] = None,
+    limit: int = 100,
+    last_run_id: int = None,
+    profile: str = "default",
+) -> typing.List[ComponentRun]:
+    """Returns up to limit ComponentRuns, newest first, that match all of
+    the given filters. For example, find_runs(mlflow_metrics=[("val_auc",
+    "<", 0.8)]) returns runs whose val_auc metric is below 0.8, and
+    find_runs(stale=True) returns runs with staleness messages. Filters are
+    applied by the database; see Store.find_component_runs. Relations are
+    loaded lazily, as in get_history."""
+    uri = _db_uri
+    with Store(uri) as store:
+        runs = store.find_component_run_rows(
+            component_name,
+            stale,
+            git_tag,
+            mlflow_params,
+            mlflow_metrics,
+            limit,
+            last_run_id,
+            profile=profile,
         )
-        component_runs.append(ComponentRun.from_dictionary(d))
 
-    return component_runs
+    loader = utils._RelationLoader([row.id for row in runs], uri)
+    return [utils._client_component_run(row._mapping, loader) for row in runs]
 
 
 def get_component_information(component_name: str) -> Component:
     """Returns a Component with the name, info, owner, and tags."""
-    store = Store(_db_uri)
-    c = store.get_component(component_name)
-    if not c:
-        raise RuntimeError(f"Component with name {component_name} not found.")
-    tags = [tag.name for tag in c.tags]
-    d = copy.deepcopy(c.__dict__)
-    d.update({"tags": tags})
-    return Component.from_dictionary(d)
+    with Store(_db_uri) as store:
+        c = store.get_component(component_name)
+        if not c:
+            raise RuntimeError(
+                f"Component with name {component_name} not found."
+            )
+        tags = [tag.name for tag in c.tags]
+        d = copy.deepcopy(c.__dict__)
+        d.update({"tags": tags})
+        return Component.from_dictionary(d)
 
 
 def get_component_run_information(component_run_id: str) -> ComponentRun:
     """Returns a ComponentRun object."""
-    store = Store(_db_uri)
-    cr = store.get_component_run(component_run_id)
-    if not cr:
-        raise RuntimeError(f"Component run with id {id} not found.")
-    inputs = [
-        IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-        for iop in cr.inputs
-    ]
-    outputs = [
-        IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-        for iop in cr.outputs
-    ]
-    dependencies = [dep.component_name for dep in cr.dependencies]
-    d = copy.deepcopy(cr.__dict__)
-    if cr.code_snapshot:
-        d.update({"code_snapshot": str(cr.code_snapshot.decode("utf-8"))})
-    d.update(
-        {"inputs": inputs, "outputs": outputs, "dependencies": dependencies}
-    )
-    return ComponentRun.from_dictionary(d)
+    with Store(_db_uri) as store:
+        row = store.get_component_run_row(component_run_id)
+        if not row:
+            raise RuntimeError(f"Component run with id {id} not found.")
+        inputs, outputs, dependencies = utils._RelationLoader(
+            [row.id], store=store
+        ).load(row.id)
+        d = dict(row._mapping)
+        d.update(
+            {
+                "inputs": inputs,
+                "outputs": outputs,
+                "dependencies": dependencies,
+            }
+        )
+        return ComponentRun.from_dictionary(d)
 
 
 def get_components(tag="", owner="") -> typing.List[Component]:
     """Returns all components with the specified owner and/or tag.
     Else, returns all components."""
-    store = Store(_db_uri)
-    res = store.get_components(tag=tag, owner=owner)
+    with Store(_db_uri) as store:
+        res = store.get_components(tag=tag, owner=owner)
 
-    # Convert to client-facing Components
-    components = []
-    for c in res:
-        tags = [tag.name for tag in c.tags]
-        d = copy.deepcopy(c.__dict__)
-        d.update({"tags": tags})
-        components.append(Component.from_dictionary(d))
+        # Convert to client-facing Components
+        components = []
+        for c in res:
+            tags = [tag.name for tag in c.tags]
+            d = copy.deepcopy(c.__dict__)
+            d.update({"tags": tags})
+            components.append(Component.from_dictionary(d))
 
-    return components
+        return components
 
 
 def get_recent_run_ids(limit: int = 5, last_run_id=None):
-    """Returns most recent component run ids."""
-    store = Store(_db_uri)
-    return store.get_recent_run_ids(limit, last_run_id)
+    """Returns most recent component run ids. Pass the last id of a page
+    as last_run_id to get the next page."""
+    with Store(_db_uri) as store:
+        return store.get_recent_run_ids(limit, last_run_id)
 
 
 def get_io_pointer(
     io_pointer_id: str, io_pointer_val: typing.Any = None, create=True
 ):
     """Returns IO Pointer metadata."""
-    store = Store(_db_uri)
-    iop = store.get_io_pointer(io_pointer_id, io_pointer_val, create=create)
-    return IOPointer.from_dictionary(iop.__dict__)
+    with Store(_db_uri) as store:
+        iop = store.get_io_pointer(
+            io_pointer_id, io_pointer_val, create=create
+        )
+        return IOPointer.from_dictionary(iop.__dict__)
 
 
 def get_tags() -> typing.List[str]:
-    store = Store(_db_uri)
-    res = store.get_tags()
-    tags = [t.name for t in res]
-    return tags
+    with Store(_db_uri) as store:
+        res = store.get_tags()
+        tags = [t.name for t in res]
+        return tags
 
 
 # --------------- Complex retrieval functions ------------------ #
 
 
-def backtrace(output_pointer: str):
+def backtrace(output_pointer: str, profile: str = "default"):
     """Prints trace for an output id.
     Returns list of tuples (level, ComponentRun) where level is how
-    many hops away the node is from the node that produced the output_id."""
-    store = Store(_db_uri)
-    trace = store.trace(output_pointer)
-
-    # Convert to entities.ComponentRun
-    component_runs = []
-    for depth, cr in trace:
-        inputs = [IOPointer.from_dictionary(iop.__dict__) for iop in cr.inputs]
-        outputs = [
-            IOPointer.from_dictionary(iop.__dict__) for iop in cr.outputs
-        ]
-        dependencies = [dep.component_name for dep in cr.dependencies]
-        d = copy.deepcopy(cr.__dict__)
-        d.update(
-            {
-                "inputs": inputs,
-                "outputs": outputs,
-                "dependencies": dependencies,
-            }
-        )
-        component_runs.append((depth, ComponentRun.from_dictionary(d)))
+    many hops away the node is from the node that produced the output_id.
+    Code snapshots are only loaded with profile="full"."""
+    with Store(_db_uri) as store:
+        trace = store.trace(output_pointer, profile)
+
+        # Convert to entities.ComponentRun
+        return [(depth, _to_client_component_run(cr)) for depth, cr in trace]
+
 
-    return component_runs
+def backtrace_batch(
+    output_pointers: typing.List[str], profile: str = "default"
+):
+    """Traces many output ids at once. Returns a dictionary from output id
+    to the list of tuples (level, ComponentRun) backtrace would return.
+    Each distinct ComponentRun is converted once and shared between
+    traces."""
+    with Store(_db_uri) as store:
+        traces = store.trace_batch(output_pointers, profile)
+
+        converted = {}
+        res = {}
+        for output_pointer, trace in traces.items():
+            for _, cr in trace:
+                if cr.id not in converted:
+                    converted[cr.id] = _to_client_component_run(cr)
+            res[output_pointer] = [
+                (depth, converted[cr.id]) for depth, cr in trace
+            ]
+
+        return res
+
+
+def _to_client_component_run(cr) -> ComponentRun:
+    """Converts a db ComponentRun whose inputs, outputs and dependencies
+    are loaded to an entities.ComponentRun, without copying its columns."""
+    inputs = [
+        IOPointer(iop.name, iop.value, iop.pointer_type, iop.flag)
+        for iop in cr.inputs
+    ]
+    outputs = [
+        IOPointer(iop.name, iop.value, iop.pointer_type, iop.flag)
+        for iop in cr.outputs
+    ]
+    dependencies = [dep.component_name for dep in cr.dependencies]
+    d = {
+        k: v
+        for k, v in cr.__dict__.items()
+        if k not in ["inputs", "outputs", "dependencies"]
+    }
+    d.update(
+        {
+            "inputs": inputs,
+            "outputs": outputs,
+            "dependencies": dependencies,
+        }
+    )
+    return ComponentRun.from_dictionary(d)
 
 
 def web_trace(output_id: str):
-    store = Store(_db_uri)
-    return store.web_trace(output_id, last_only=True)
+    with Store(_db_uri) as store:
+        return store.web_trace(output_id, last_only=True)
+
+
+def web_trace_dag(output_id: str) -> dict:
+    """Returns the trace of an output id as a dictionary of roots, nodes
+    and edges, with each ComponentRun listed once. See
+    Store.web_trace_dag."""
+    with Store(_db_uri) as store:
+        return store.web_trace_dag(output_id, last_only=True)
 
 
-def review_flagged_outputs():
+def review_flagged_outputs(limit: int = None, profile: str = "default"):
     """Finds common ComponentRuns for a group of flagged outputs.
     Returns a list of ComponentRuns and occurrence counts in the
     group of flagged outputs, sorted by descending count and then
-    alphabetically."""
-    store = Store(_db_uri)
-    return store.review_flagged_outputs()
+    alphabetically. If limit is set, only the top limit ComponentRuns
+    are returned. Columns left out by profile can't be read from the
+    returned runs."""
+    with Store(_db_uri) as store:
+        return store.review_flagged_outputs(limit=limit, profile=profile)
 
 
 def retract_label(label_id: str):
-    store = Store(_db_uri)
-    store.delete_label(label_id)
+    with Store(_db_uri) as store:
+        store.delete_label(label_id)
 
 
 def retract_labels(label_ids: typing.List[str]):
-    store = Store(_db_uri)
-    store.delete_labels(label_ids)
+    with Store(_db_uri) as store:
+        store.delete_labels(label_ids)
 
 
 def retrieve_retracted_labels():
-    store = Store(_db_uri)
-    return store.retrieve_deleted_labels()
+    with Store(_db_uri) as store:
+        return store.retrieve_deleted_labels()
 
 
 def retrieve_io_pointers_for_label(label_id: str):
-    store = Store(_db_uri)
-    iops = store.retrieve_io_pointers_for_label(label_id)
-    return [IOPointer.from_dictionary(iop.__dict__) for iop in iops]
+    with Store(_db_uri) as store:
+        iops = store.retrieve_io_pointers_for_label(label_id)
+        return [IOPointer.from_dictionary(iop.__dict__) for iop in iops]
 
 
 def get_labels() -> typing.List[str]:
-    store = Store(_db_uri)
-    return [label.id for label in store.get_all_labels()]
+    with Store(_db_uri) as store:
+        return [label.id for label in store.get_all_labels()]
 
 
 def create_labels(label_ids: typing.List[str]):
-    store = Store(_db_uri)
-    store.get_labels(label_ids)
+    with Store(_db_uri) as store:
+        store.get_labels(label_ids)
 
 
 def log_output(
@@ -667,8 +1066,8 @@ def log_output(
     identifier: str,
     val: float,
 ):
-    store = Store(_db_uri)
-    store.log_output(identifier=identifier, task_name=task_name, val=val)
+    with Store(_db_uri) as store:
+        store.log_output(identifier=identifier, task_name=task_name, val=val)
 
 
 def log_feedback(
@@ -676,8 +1075,8 @@ def log_feedback(
     identifier: str,
     val: float,
 ):
-    store = Store(_db_uri)
-    store.log_feedback(identifier=identifier, task_name=task_name, val=val)
+    with Store(_db_uri) as store:
+        store.log_feedback(identifier=identifier, task_name=task_name, val=val)
 
 
 def compute_metric(
@@ -685,5 +1084,5 @@ def compute_metric(
     metric_fn: typing.Callable,
     window_size: int = None,
 ):
-    store = Store(_db_uri)
-    store.compute_metric(task_name, metric_fn, window_size)
+    with Store(_db_uri) as store:
+        store.compute_metric(task_name, metric_fn, window_size)
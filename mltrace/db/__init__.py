@@ -11,12 +11,16 @@ from mltrace.db.models import (
     feedback_table,
 )
 from mltrace.db.store import Store
+from mltrace.db.lineage_index import LineageIndex
+from mltrace.db.fingerprint import register_fingerprinter
 
 __all__ = [
     "Component",
     "ComponentRun",
     "IOPointer",
     "Store",
+    "LineageIndex",
+    "register_fingerprinter",
     "PointerTypeEnum",
     "Tag",
     "Label",
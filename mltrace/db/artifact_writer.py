@@ -0,0 +1,162 @@
+import concurrent.futures
+import logging
+import sys
+import threading
+import typing
+
+import numpy as np
+import pandas as pd
+
+
+def _estimate_size(obj: typing.Any) -> int:
+    """Returns a cheap estimate of the in-memory size of obj, in bytes."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    return sys.getsizeof(obj)
+
+
+class ArtifactWriter(object):
+    """Writes artifacts from a thread pool, so mltrace.save returns as soon
+    as the write is queued. At most max_in_flight_bytes of objects (by
+    estimated size) are held for writing at a time; save blocks until
+    enough earlier writes finish. An object larger than the cap is
+    written on its own.
+
+    Objects are serialized by the writer, so they must not be modified
+    until their write has finished (see flush)."""
+
+    def __init__(
+        self,
+        write_fn: typing.Callable[[typing.Any, str], None],
+        max_workers: int = 4,
+        max_in_flight_bytes: int = 1 << 30,
+    ):
+        """
+        Starts the writer's thread pool.
+
+        Args:
+            write_fn (Callable): Called with an object and the pathname to
+                write it to, on a pool thread.
+            max_workers (int): Maximum number of concurrent writes.
+            max_in_flight_bytes (int): Maximum estimated size of the
+                objects queued or being written.
+        """
+        self.write_fn = write_fn
+        self.max_in_flight_bytes = max_in_flight_bytes
+
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mltrace-artifacts"
+        )
+        self._cv = threading.Condition()
+        self._pending = {}
+        self._in_flight_bytes = 0
+        self._stats = {"written": 0, "failed": 0, "bytes_written": 0}
+        self._closed = False
+
+    def put(
+        self,
+        obj: typing.Any,
+        pathname: str,
+        write_fn: typing.Callable[[typing.Any, str], None] = None,
+    ) -> str:
+        """Queues obj to be written to pathname, with write_fn instead of
+        the writer's if given, and returns pathname. Writes to the same
+        pathname happen in the order they were queued."""
+        size = _estimate_size(obj)
+        with self._cv:
+            if self._closed:
+                raise RuntimeError("Artifact writer has been closed.")
+            self._cv.wait_for(
+                lambda: self._in_flight_bytes == 0
+                or self._in_flight_bytes + size <= self.max_in_flight_bytes
+            )
+            self._in_flight_bytes += size
+            previous = self._pending.get(pathname)
+            future = self._pool.submit(
+                self._write,
+                write_fn or self.write_fn,
+                obj,
+                pathname,
+                size,
+                previous,
+            )
+            self._pending[pathname] = future
+            future.add_done_callback(
+                lambda future: self._forget(pathname, future)
+            )
+        return pathname
+
+    def _write(
+        self,
+        write_fn: typing.Callable[[typing.Any, str], None],
+        obj: typing.Any,
+        pathname: str,
+        size: int,
+        previous: concurrent.futures.Future,
+    ):
+        failed = True
+        try:
+            if previous is not None:
+                concurrent.futures.wait([previous])
+            write_fn(obj, pathname)
+            failed = False
+        except Exception as e:
+            logging.error(f"Could not write artifact {pathname}: {e}")
+            raise
+        finally:
+            with self._cv:
+                if failed:
+                    self._stats["failed"] += 1
+                else:
+                    self._stats["written"] += 1
+                    self._stats["bytes_written"] += size
+                self._in_flight_bytes -= size
+                self._cv.notify_all()
+
+    def _forget(self, pathname: str, future: concurrent.futures.Future):
+        with self._cv:
+            if self._pending.get(pathname) is future:
+                del self._pending[pathname]
+
+    def wait(self, pathnames: typing.List[str], timeout: float = None):
+        """Blocks until the queued writes to pathnames have finished, and
+        raises the exception of any that failed."""
+        with self._cv:
+            futures = [
+                self._pending[pathname]
+                for pathname in pathnames
+                if pathname in self._pending
+            ]
+        for future in futures:
+            future.result(timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until every queued write has finished. Returns False if
+        the timeout expired first. Failed writes are logged and counted in
+        stats."""
+        with self._cv:
+            futures = list(self._pending.values())
+        _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        return len(not_done) == 0
+
+    def close(self, timeout: float = None):
+        """Flushes the writer and stops its threads."""
+        if self._closed:
+            return
+
+        self.flush(timeout)
+        with self._cv:
+            self._closed = True
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """Returns the number of queued writes, their estimated size in
+        bytes, and counts of finished writes."""
+        with self._cv:
+            return {
+                "pending": len(self._pending),
+                "in_flight_bytes": self._in_flight_bytes,
+                **self._stats,
+            }
@@ -0,0 +1,180 @@
+from datetime import datetime
+from mltrace.db.store import Store
+from mltrace.db.utils import (
+    _check_schema,
+    _get_async_engine,
+    _verified_uris,
+    _verified_uris_lock,
+)
+from mltrace.db import ComponentRun
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import typing
+
+
+def _to_async_uri(uri: str) -> str:
+    """Maps a Store uri to one with an asyncio driver."""
+    if uri.startswith("postgresql://"):
+        return uri.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if uri.startswith("postgresql+asyncpg://"):
+        return uri
+    raise RuntimeError("Database URI must be prefixed with `postgresql://`")
+
+
+class AsyncStore(object):
+    """Asyncio counterpart of Store. Store methods run on the sync session
+    of an AsyncSession, so every db round trip is awaited instead of
+    blocking the event loop. Requires asyncpg (or aiosqlite for the "test"
+    database)."""
+
+    def __init__(self, uri: str):
+        """
+        Creates the store. Engines are shared by all AsyncStores with the
+        same uri; the in-memory "test" database gets a fresh engine every
+        time.
+
+        Args:
+            uri (str): URI string to connect to the SQLAlchemy database.
+                postgresql:// URIs use the asyncpg driver.
+        """
+        if uri.lower().strip() == "test":
+            self.uri = None
+            self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        else:
+            self.uri = _to_async_uri(uri)
+            self.engine = _get_async_engine(self.uri)
+
+        self.session = AsyncSession(self.engine)
+        self._schema_checked = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Closes the session, returning its connection to the pool."""
+        await self.session.close()
+
+    async def _verify_schema(self):
+        """Creates missing tables, at most once per process per uri."""
+        if self._schema_checked or self.uri in _verified_uris:
+            return
+
+        async with self.engine.begin() as con:
+            await con.run_sync(_check_schema)
+
+        self._schema_checked = True
+        if self.uri is not None:
+            with _verified_uris_lock:
+                _verified_uris.add(self.uri)
+
+    async def run_sync(
+        self, fn: typing.Callable[..., typing.Any], *args, **kwargs
+    ) -> typing.Any:
+        """Awaits fn(store, *args, **kwargs), where store is a Store bound
+        to this AsyncStore's session."""
+        await self._verify_schema()
+        return await self.session.run_sync(
+            lambda session: fn(Store.from_session(session), *args, **kwargs)
+        )
+
+    async def commit_component_run(
+        self,
+        component_run: ComponentRun,
+        staleness_threshold: int = (60 * 60 * 24 * 30),
+    ):
+        """Commits a fully initialized component run to the DB."""
+        await self.run_sync(
+            Store.commit_component_run,
+            component_run,
+            staleness_threshold=staleness_threshold,
+        )
+
+    async def bulk_commit_component_runs(
+        self,
+        component_runs: typing.List[dict],
+        set_dependencies_from_inputs: bool = True,
+        staleness_threshold: int = (60 * 60 * 24 * 30),
+    ) -> typing.List[int]:
+        """Commits many component runs in one transaction."""
+        return await self.run_sync(
+            Store.bulk_commit_component_runs,
+            component_runs,
+            set_dependencies_from_inputs=set_dependencies_from_inputs,
+            staleness_threshold=staleness_threshold,
+        )
+
+    async def get_history(
+        self,
+        component_name: str,
+        limit: int = 10,
+        date_lower: typing.Union[datetime, str] = datetime.min,
+        date_upper: typing.Union[datetime, str] = datetime.max,
+        last_run_id: int = None,
+        profile: str = "default",
+    ) -> typing.List[ComponentRun]:
+        """Gets lineage for the component, or a history of all its runs.
+        Relationships and columns left out by profile can't be lazy loaded
+        outside the session; use run_sync to traverse them."""
+        return await self.run_sync(
+            Store.get_history,
+            component_name,
+            limit,
+            date_lower,
+            date_upper,
+            last_run_id,
+            profile,
+        )
+
+    async def web_trace(self, output_id: str, last_only: bool = False):
+        """Returns list of ComponentRuns to display in the UI."""
+        return await self.run_sync(Store.web_trace, output_id, last_only)
+
+    async def web_trace_dag(self, output_id: str, last_only: bool = False):
+        """Returns the trace of output_id as roots, nodes and edges."""
+        return await self.run_sync(Store.web_trace_dag, output_id, last_only)
+
+    async def log_output(self, task_name: str, identifier: str, val: float):
+        """Logs an output value to the output table."""
+        await self.run_sync(Store.log_output, task_name, identifier, val)
+
+    async def log_outputs(
+        self,
+        task_name: str,
+        identifiers: typing.List[str],
+        vals: typing.List[float],
+    ):
+        """Logs output values to the output table."""
+        await self.run_sync(Store.log_outputs, task_name, identifiers, vals)
+
+    async def log_feedback(
+        self, task_name: str, identifier: str, val: float
+    ):
+        """Logs a feedback value to the feedback table."""
+        await self.run_sync(Store.log_feedback, task_name, identifier, val)
+
+    async def log_feedbacks(
+        self,
+        task_name: str,
+        identifiers: typing.List[str],
+        vals: typing.List[float],
+    ):
+        """Logs feedback values to the feedback table."""
+        await self.run_sync(Store.log_feedbacks, task_name, identifiers, vals)
+
+    async def get_outputs_or_feedback(
+        self,
+        task_name: str,
+        tablename: str = "output_table",
+        limit: int = None,
+        window_size: int = None,
+    ):
+        return await self.run_sync(
+            Store.get_outputs_or_feedback,
+            task_name,
+            tablename,
+            limit,
+            window_size,
+        )
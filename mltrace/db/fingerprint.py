@@ -0,0 +1,412 @@
+import concurrent.futures
+import hashlib
+import io
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+import numpy as np
+import pandas as pd
+
+_DIGEST_SIZE = 32
+_CHUNK_SIZE = 1 << 20
+
+# Files are hashed as a two-level merkle tree of fixed size chunks, so
+# chunks of large files can be read and hashed in parallel
+_FILE_CHUNK_SIZE = 1 << 23
+
+# Files modified this recently are not cached, since a write in the same
+# mtime tick would not change their stat key
+_RACY_SECONDS = 2.0
+
+# (type, fingerprinter, exact) tuples. Later registrations are tried
+# first, so users can override the built-in fingerprinters.
+_fingerprinters = []
+
+# Object array elements of these types are hashed by pandas
+_SCALAR_TYPES = {str, int, float, bool}
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+_file_cache = None
+_file_cache_lock = threading.Lock()
+
+
+def register_fingerprinter(
+    cls: type,
+    fingerprinter: typing.Callable[[typing.Any, typing.Any], None],
+    exact: bool = False,
+):
+    """Registers a fingerprinter for values of type cls (and subclasses).
+    fingerprinter(value, h) feeds the identifying content of value to the
+    hashlib object h with h.update; buffers are hashed without copying. For
+    example, a model type could feed its serialized weights.
+
+    Set exact if values with the same fingerprint are interchangeable, so
+    a saved copy of one can be loaded in place of the other. Saved values
+    of exact types are stored once per fingerprint without being
+    serialized again.
+
+    Values without a fingerprinter are hashed by their repr, and so are
+    values whose fingerprinter raises, unless they are exact."""
+    _fingerprinters.insert(0, (cls, fingerprinter, exact))
+
+
+def _get_fingerprinter(value: typing.Any):
+    for cls, fingerprinter, _ in _fingerprinters:
+        if isinstance(value, cls):
+            return cls, fingerprinter
+    return None, None
+
+
+def _has_objects(value: typing.Any) -> bool:
+    """Returns whether an array, index, series or frame holds Python
+    objects or pandas extension types, whose fingerprints are built from
+    the elements' reprs."""
+    if isinstance(value, pd.DataFrame):
+        dtypes = list(value.dtypes) + [value.index.dtype]
+    elif isinstance(value, pd.Series):
+        dtypes = [value.dtype, value.index.dtype]
+    elif isinstance(value, (np.ndarray, pd.Index)):
+        dtypes = [value.dtype]
+    else:
+        return False
+    return any(
+        not isinstance(dtype, np.dtype) or dtype.hasobject
+        for dtype in dtypes
+    )
+
+
+def _is_exact(value: typing.Any) -> bool:
+    """Returns whether value's fingerprint identifies it exactly; see
+    register_fingerprinter. Subclasses of exact types (like masked arrays)
+    may carry state their fingerprint leaves out, so they aren't exact,
+    and neither are values that hold Python objects."""
+    for cls, _, exact in _fingerprinters:
+        if isinstance(value, cls):
+            return exact and cls is type(value) and not _has_objects(value)
+    return False
+
+
+def _fingerprint(value: typing.Any) -> bytes:
+    """Returns the 32 byte fingerprint of value. Registered types are
+    hashed with blake2b, tagged with the type they were registered for;
+    everything else is the sha256 of its repr, as in earlier releases."""
+    if isinstance(value, str) and value == "":
+        return b""
+
+    cls, fingerprinter = _get_fingerprinter(value)
+    if fingerprinter is None:
+        return hashlib.sha256(repr(value).encode()).digest()
+
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE, person=b"mltrace")
+    h.update(f"{cls.__module__}.{cls.__qualname__}\0".encode())
+    try:
+        fingerprinter(value, h)
+    except Exception as e:
+        # Saved copies of exact values are shared by fingerprint, so a
+        # repr hash could hand out another value's copy
+        if _is_exact(value):
+            raise RuntimeError(
+                f"Could not fingerprint {cls.__qualname__} value: {e}"
+            )
+        logging.debug(
+            f"Could not fingerprint {cls.__qualname__} value ({e}). "
+            + "Hashing its repr instead."
+        )
+        return hashlib.sha256(repr(value).encode()).digest()
+    return h.digest()
+
+
+def _get_pool(name: str = "values") -> concurrent.futures.ThreadPoolExecutor:
+    """Returns the thread pool called name. Values and file chunks use
+    separate pools, so a value's fingerprinter can wait on chunks without
+    holding up the workers its chunks need."""
+    with _pool_lock:
+        if name not in _pools:
+            _pools[name] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(8, os.cpu_count() or 1),
+                thread_name_prefix=f"mltrace-fingerprint-{name}",
+            )
+        return _pools[name]
+
+
+def _fingerprint_many(values: typing.List[typing.Any]) -> typing.List[bytes]:
+    """Fingerprints values, hashing the ones with a fingerprinter in
+    parallel threads. hashlib releases the GIL while hashing large buffers,
+    so big arrays and frames hash concurrently; reprs are cheaper to hash
+    inline."""
+    by_content = [
+        i
+        for i, value in enumerate(values)
+        if _get_fingerprinter(value)[1] is not None
+    ]
+    if len(by_content) < 2:
+        return [_fingerprint(value) for value in values]
+
+    pool = _get_pool()
+    futures = {i: pool.submit(_fingerprint, values[i]) for i in by_content}
+    return [
+        futures[i].result() if i in futures else _fingerprint(value)
+        for i, value in enumerate(values)
+    ]
+
+
+def _update_objects(values: np.ndarray, h):
+    """Feeds the elements of an object array to h, each tagged with its
+    type, so that e.g. 1 and "1" differ. Arrays of one scalar type are
+    hashed by pandas; otherwise elements are fingerprinted if they have a
+    fingerprinter, and hashed by their repr if not."""
+    values = values.ravel()
+    types = set(map(type, values)) - {type(None)}
+    if len(types) == 1 and types <= _SCALAR_TYPES:
+        # Elements of a single scalar type (and None) are distinct iff
+        # their strings are, so pandas can hash them
+        missing = np.fromiter(
+            (element is None for element in values), bool, len(values)
+        )
+        h.update(f"{types.pop().__qualname__}\0".encode())
+        h.update(np.packbits(missing))
+        h.update(pd.util.hash_array(values[~missing], categorize=False))
+        return
+
+    for element in values:
+        cls = type(element)
+        h.update(f"{cls.__module__}.{cls.__qualname__}\0".encode())
+        if _get_fingerprinter(element)[1] is not None:
+            h.update(_fingerprint(element))
+        else:
+            h.update(repr(element).encode() + b"\0")
+
+
+def _update_array(values: np.ndarray, h):
+    """Feeds the dtype, shape and contents of a numpy array to h. Contiguous
+    arrays are hashed in place; object arrays are hashed elementwise."""
+    h.update(f"{values.dtype.str}{values.shape}\0".encode())
+    if values.dtype.hasobject:
+        _update_objects(values, h)
+    else:
+        h.update(np.ascontiguousarray(values).reshape(-1).view(np.uint8))
+
+
+def _update_values(values: typing.Union[pd.Index, pd.Series], h):
+    """Feeds the values of an index or series to h, without its index."""
+    if isinstance(values, pd.Index):
+        h.update(repr(values.names).encode())
+    if isinstance(values, pd.RangeIndex):
+        h.update(f"{values.start}:{values.stop}:{values.step}\0".encode())
+        return
+
+    h.update(f"{values.dtype!r}\0".encode())
+    if isinstance(values.dtype, np.dtype):
+        _update_array(values.to_numpy(), h)
+    else:
+        h.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+
+def _fingerprint_dataframe(value: pd.DataFrame, h):
+    """Frames with a single numpy dtype are hashed as one row-major array,
+    which is the frame's own buffer when it was built from a 2d array.
+    Other frames are hashed a column at a time."""
+    h.update(repr(list(value.columns)).encode())
+    h.update(repr(value.columns.names).encode())
+    _update_values(value.index, h)
+
+    dtypes = set(value.dtypes)
+    if len(dtypes) == 1:
+        dtype = dtypes.pop()
+        if isinstance(dtype, np.dtype) and not dtype.hasobject:
+            h.update(f"{dtype}\0".encode())
+            _update_array(value.to_numpy(), h)
+            return
+
+    for _, column in value.items():
+        _update_values(column, h)
+
+
+def _fingerprint_series(value: pd.Series, h):
+    h.update(repr(value.name).encode())
+    _update_values(value.index, h)
+    _update_values(value, h)
+
+
+def _fingerprint_index(value: pd.Index, h):
+    _update_values(value, h)
+
+
+def _fingerprint_bytes(value: typing.Union[bytes, bytearray, memoryview], h):
+    h.update(value)
+
+
+def _update_file(f: typing.BinaryIO, h):
+    while True:
+        chunk = f.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        h.update(chunk)
+
+
+def _fingerprint_file(value: typing.BinaryIO, h):
+    """Hashes the rest of an open binary file, then rewinds it."""
+    position = value.tell() if value.seekable() else None
+    _update_file(value, h)
+    if position is not None:
+        value.seek(position)
+
+
+def _hash_file_chunk(path: str, index: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(index * _FILE_CHUNK_SIZE)
+        chunk = f.read(_FILE_CHUNK_SIZE)
+    return hashlib.blake2b(
+        chunk, digest_size=_DIGEST_SIZE, person=b"mltrace-chunk"
+    ).digest()
+
+
+def _hash_file(path: str, size: int) -> bytes:
+    """Returns the merkle root of the file's chunk digests. Files of more
+    than one chunk are hashed in parallel threads."""
+    num_chunks = max(-(-size // _FILE_CHUNK_SIZE), 1)
+    if num_chunks == 1:
+        leaves = [_hash_file_chunk(path, 0)]
+    else:
+        leaves = _get_pool("chunks").map(
+            lambda index: _hash_file_chunk(path, index), range(num_chunks)
+        )
+
+    root = hashlib.blake2b(digest_size=_DIGEST_SIZE, person=b"mltrace-file")
+    root.update(f"{size}\0".encode())
+    for leaf in leaves:
+        root.update(leaf)
+    return root.digest()
+
+
+class _FileFingerprintCache(object):
+    """Persistent cache of file digests, keyed by the file's (path, size,
+    mtime_ns, inode). Unchanged files are not read again, even by other
+    processes. Entries are kept in a sqlite database, by default
+    fingerprints.db in SAVE_DIR."""
+
+    def __init__(self, path: str = None):
+        if path is None:
+            save_dir = os.environ.get(
+                "SAVE_DIR", os.path.join(os.path.expanduser("~"), ".mltrace")
+            )
+            path = os.environ.get(
+                "MLTRACE_FINGERPRINT_CACHE",
+                os.path.join(save_dir, "fingerprints.db"),
+            )
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            if path != ":memory:":
+                os.makedirs(
+                    os.path.dirname(os.path.abspath(path)), exist_ok=True
+                )
+            self._con = self._connect(path)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(
+                f"Could not open the fingerprint cache at {path} ({e}). "
+                + "File fingerprints will only be cached in memory."
+            )
+            self._con = self._connect(":memory:")
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        con = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        if path != ":memory:":
+            con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (path TEXT PRIMARY KEY, "
+            + "size INTEGER, mtime_ns INTEGER, inode INTEGER, digest BLOB)"
+        )
+        return con
+
+    @staticmethod
+    def _key(st: os.stat_result) -> typing.Tuple[int, int, int]:
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def get(self, path: str) -> typing.Optional[bytes]:
+        """Returns the cached digest of the file at path, or None if it
+        isn't cached or the file changed since."""
+        path = os.path.realpath(path)
+        key = self._key(os.stat(path))
+        with self._lock:
+            row = self._con.execute(
+                "SELECT size, mtime_ns, inode, digest FROM fingerprints "
+                + "WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != key:
+            return None
+        return bytes(row[3])
+
+    def fingerprint(self, path: str) -> bytes:
+        """Returns the digest of the file at path, hashing it on a miss."""
+        path = os.path.realpath(path)
+        digest = self.get(path)
+        if digest is not None:
+            return digest
+
+        before = os.stat(path)
+        digest = _hash_file(path, before.st_size)
+        after = os.stat(path)
+
+        # Only cache digests of files that didn't change while being hashed
+        # and can't change again without changing their key
+        key = self._key(after)
+        if (
+            key == self._key(before)
+            and time.time() - after.st_mtime_ns / 1e9 > _RACY_SECONDS
+        ):
+            with self._lock:
+                self._con.execute(
+                    "INSERT OR REPLACE INTO fingerprints "
+                    + "(path, size, mtime_ns, inode, digest) "
+                    + "VALUES (?, ?, ?, ?, ?)",
+                    (path,) + key + (digest,),
+                )
+        return digest
+
+    def clear(self):
+        with self._lock:
+            self._con.execute("DELETE FROM fingerprints")
+
+
+def _get_file_cache() -> _FileFingerprintCache:
+    global _file_cache
+    with _file_cache_lock:
+        if _file_cache is None:
+            _file_cache = _FileFingerprintCache()
+        return _file_cache
+
+
+def _fingerprint_path(value: pathlib.PurePath, h):
+    """Hashes the contents of the file at value, or the path itself if
+    there is no such file. File digests are cached by stat key."""
+    if os.path.isfile(value):
+        h.update(b"file\0")
+        h.update(_get_file_cache().fingerprint(value))
+    else:
+        h.update(b"path\0" + os.fsencode(value))
+
+
+# Paths and open files are fingerprinted by the contents of the file they
+# point to, so they are not exact
+register_fingerprinter(pathlib.PurePath, _fingerprint_path)
+register_fingerprinter(io.BufferedIOBase, _fingerprint_file)
+register_fingerprinter(io.RawIOBase, _fingerprint_file)
+register_fingerprinter(bytes, _fingerprint_bytes, exact=True)
+register_fingerprinter(bytearray, _fingerprint_bytes, exact=True)
+register_fingerprinter(memoryview, _fingerprint_bytes)
+register_fingerprinter(np.ndarray, _update_array, exact=True)
+register_fingerprinter(pd.Index, _fingerprint_index, exact=True)
+register_fingerprinter(pd.Series, _fingerprint_series, exact=True)
+register_fingerprinter(pd.DataFrame, _fingerprint_dataframe, exact=True)
@@ -0,0 +1,293 @@
+from array import array
+from datetime import datetime
+from mltrace.db.models import (
+    ComponentRun,
+    IOPointer,
+    component_run_dependencies,
+    component_run_output_association,
+)
+from mltrace.db.store import Store, _web_trace_node
+from sqlalchemy import and_, or_, select
+
+import contextlib
+import threading
+import time
+import typing
+
+
+class LineageIndex(object):
+    """In-memory copy of the lineage graph for read-heavy processes like
+    the server. Runs are stored at dense positions with integer adjacency
+    arrays in both directions, the latest producing run of every output
+    name, and the metadata needed to render traces. Runs logged after the
+    index was built are picked up by polling for ids above a high-water
+    mark, so traces and reviews don't query the lineage tables.
+
+    Runs are assumed to be immutable once committed: deleted runs and later
+    edits to a run's dependencies or staleness messages are only seen after
+    rebuild()."""
+
+    def __init__(
+        self,
+        uri: str = None,
+        refresh_interval: float = 5.0,
+        overlap: int = 1000,
+        store: Store = None,
+    ):
+        """
+        Creates an empty index. It is filled on first use.
+
+        Args:
+            uri (str): URI string to connect to the SQLAlchemy database.
+            refresh_interval (float): Minimum number of seconds between
+                polls for new runs.
+            overlap (int): Number of ids below the high-water mark to scan
+                again on every poll, so runs whose transactions committed
+                out of id order are not missed.
+            store (Store): Store to read from instead of opening one for
+                every poll, e.g. for an in-memory test database.
+        """
+        if uri is None and store is None:
+            raise RuntimeError("Please specify a uri or a store.")
+        self.uri = uri
+        self._store = store
+        self.refresh_interval = refresh_interval
+        self.overlap = overlap
+        self._lock = threading.RLock()
+        self.rebuild(load=False)
+
+    def rebuild(self, load: bool = True):
+        """Drops everything in the index, and reloads it if load is set."""
+        with self._lock:
+            self._high_water = 0
+            self._last_refresh = None
+            self._pos = {}
+            self._run_ids = array("q")
+            self._component_names = []
+            self._start_timestamps = []
+            self._stale = []
+            self._outputs = []
+            self._deps = []
+            self._dependents = []
+            self._producers = {}
+            if load:
+                self.refresh()
+
+    @contextlib.contextmanager
+    def _get_store(self):
+        if self._store is not None:
+            with self._lock:
+                yield self._store
+        else:
+            with Store(self.uri) as store:
+                yield store
+
+    def __len__(self) -> int:
+        return len(self._run_ids)
+
+    def maybe_refresh(self):
+        """Polls for new runs if refresh_interval has passed."""
+        if (
+            self._last_refresh is None
+            or time.monotonic() - self._last_refresh >= self.refresh_interval
+        ):
+            self.refresh()
+
+    def refresh(self):
+        """Adds runs with ids above the high-water mark (less overlap) that
+        are not in the index yet."""
+        with self._lock, self._get_store() as store:
+            lower = max(self._high_water - self.overlap, 0)
+            runs = store.session.execute(
+                select(
+                    ComponentRun.id,
+                    ComponentRun.component_name,
+                    ComponentRun.start_timestamp,
+                    ComponentRun.stale,
+                )
+                .where(ComponentRun.id > lower)
+                .order_by(ComponentRun.id)
+            ).all()
+            runs = [r for r in runs if r[0] not in self._pos]
+            self._last_refresh = time.monotonic()
+            if len(runs) == 0:
+                return
+
+            new_ids = set([r[0] for r in runs])
+            new_start = min(new_ids)
+            first_new_pos = len(self._run_ids)
+            for run_id, component_name, start_timestamp, stale in runs:
+                self._pos[run_id] = len(self._run_ids)
+                self._run_ids.append(run_id)
+                self._component_names.append(component_name)
+                self._start_timestamps.append(start_timestamp or datetime.min)
+                self._stale.append(stale or [])
+                self._outputs.append([])
+                self._deps.append(array("l"))
+                self._dependents.append(array("l"))
+            self._high_water = max(self._high_water, max(new_ids))
+
+            # Edges from and to the new runs. A run can commit before the
+            # run it depends on, so edges to new runs are added to runs that
+            # are already indexed too.
+            deps = component_run_dependencies
+            changed = set(range(first_new_pos, len(self._deps)))
+            for run_id, dep_id in store.session.execute(
+                select(
+                    deps.c.component_run_id,
+                    deps.c.depends_on_component_run_id,
+                ).where(
+                    or_(
+                        deps.c.component_run_id >= new_start,
+                        deps.c.depends_on_component_run_id >= new_start,
+                    )
+                )
+            ).all():
+                if run_id not in self._pos or dep_id not in self._pos:
+                    continue
+                if run_id not in new_ids and dep_id not in new_ids:
+                    continue
+                pos, dep_pos = self._pos[run_id], self._pos[dep_id]
+                if dep_pos not in self._deps[pos]:
+                    self._deps[pos].append(dep_pos)
+                    self._dependents[dep_pos].append(pos)
+                    changed.add(pos)
+
+            assoc = component_run_output_association
+            for run_id, name, pointer_type in store.session.execute(
+                select(
+                    assoc.c.component_run_id,
+                    assoc.c.output_path_name,
+                    IOPointer.pointer_type,
+                )
+                .join(
+                    IOPointer,
+                    and_(
+                        IOPointer.name == assoc.c.output_path_name,
+                        IOPointer.value == assoc.c.output_path_value,
+                    ),
+                )
+                .where(assoc.c.component_run_id >= new_start)
+            ).all():
+                if run_id not in new_ids:
+                    continue
+                pos = self._pos[run_id]
+                self._outputs[pos].append((name, pointer_type))
+
+                # Latest producer by start time, then id, like Store.trace
+                current = self._producers.get(name)
+                if current is None or self._sort_key(pos) > self._sort_key(
+                    current
+                ):
+                    self._producers[name] = pos
+
+            for pos in changed:
+                self._deps[pos] = array(
+                    "l", sorted(self._deps[pos], key=self._run_ids.__getitem__)
+                )
+
+    def _sort_key(self, pos: int):
+        return (self._start_timestamps[pos], self._run_ids[pos])
+
+    def producer(self, output_id: str) -> int:
+        """Returns the id of the latest run that wrote output_id."""
+        self.maybe_refresh()
+        if output_id not in self._producers:
+            raise RuntimeError(f"ID {output_id} does not exist.")
+        return self._run_ids[self._producers[output_id]]
+
+    def _ancestor_positions(self, pos: int) -> typing.List[int]:
+        """Returns the positions of pos and all of its ancestors, in run id
+        order."""
+        seen = set([pos])
+        stack = [pos]
+        while len(stack) > 0:
+            for dep_pos in self._deps[stack.pop()]:
+                if dep_pos not in seen:
+                    seen.add(dep_pos)
+                    stack.append(dep_pos)
+        return sorted(seen, key=self._run_ids.__getitem__)
+
+    def ancestors(self, run_id: int) -> typing.List[int]:
+        """Returns the ids of run_id and every run it depends on, directly
+        or transitively."""
+        self.maybe_refresh()
+        return [
+            self._run_ids[pos]
+            for pos in self._ancestor_positions(self._pos[run_id])
+        ]
+
+    def descendants(self, run_id: int) -> typing.List[int]:
+        """Returns the ids of run_id and every run that depends on it,
+        directly or transitively."""
+        self.maybe_refresh()
+        seen = set([self._pos[run_id]])
+        stack = list(seen)
+        while len(stack) > 0:
+            for pos in self._dependents[stack.pop()]:
+                if pos not in seen:
+                    seen.add(pos)
+                    stack.append(pos)
+        return sorted([self._run_ids[pos] for pos in seen])
+
+    def web_trace_dag(self, output_id: str) -> dict:
+        """Same as Store.web_trace_dag(output_id, last_only=True), answered
+        from memory."""
+        self.maybe_refresh()
+        with self._lock:
+            if output_id not in self._producers:
+                raise RuntimeError(f"ID {output_id} does not exist.")
+            root = self._producers[output_id]
+            positions = self._ancestor_positions(root)
+
+            def node_id(pos):
+                return f"componentrun_{self._run_ids[pos]}"
+
+            return {
+                "roots": [node_id(root)],
+                "nodes": [
+                    _web_trace_node(
+                        self._run_ids[pos],
+                        self._component_names[pos],
+                        self._stale[pos],
+                        self._outputs[pos],
+                    )
+                    for pos in positions
+                ],
+                "edges": [
+                    [node_id(pos), node_id(dep_pos)]
+                    for pos in positions
+                    for dep_pos in self._deps[pos]
+                ],
+            }
+
+    def review_flagged_outputs(
+        self, limit: int = None
+    ) -> typing.Tuple[typing.List[str], typing.List[typing.Tuple[int, int]]]:
+        """Like Store.review_flagged_outputs, but returns (run id, count)
+        tuples. Only the flagged output names are read from the db."""
+        with self._get_store() as store:
+            flagged_output_ids = [
+                r[0]
+                for r in store.session.query(IOPointer.name)
+                .filter(IOPointer.flag.is_(True))
+                .all()
+            ]
+
+        self.maybe_refresh()
+        with self._lock:
+            counts = {}
+            for output_id in set(flagged_output_ids):
+                if output_id not in self._producers:
+                    continue
+                for pos in self._ancestor_positions(
+                    self._producers[output_id]
+                ):
+                    counts[pos] = counts.get(pos, 0) + 1
+
+            counts = sorted(
+                [(self._run_ids[pos], c) for pos, c in counts.items()],
+                key=lambda item: (-item[1], -item[0]),
+            )
+
+        return flagged_output_ids, counts[:limit]
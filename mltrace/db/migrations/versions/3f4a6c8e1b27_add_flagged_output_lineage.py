@@ -0,0 +1,40 @@
+"""add_flagged_output_lineage
+
+Revision ID: 3f4a6c8e1b27
+Revises: e5b2d7c94f10
+Create Date: 2026-10-18 13:21:56.318470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f4a6c8e1b27"
+down_revision = "e5b2d7c94f10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table may already exist if a newer client connected first. It
+    # starts empty; reviews fill in the lineage of flagged outputs lazily.
+    inspector = sa.inspect(op.get_bind())
+    if "flagged_output_lineage" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "flagged_output_lineage",
+        sa.Column("output_name", sa.String, primary_key=True),
+        sa.Column(
+            "component_run_id",
+            sa.Integer,
+            sa.ForeignKey("component_runs.id", ondelete="CASCADE"),
+            primary_key=True,
+            index=True,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("flagged_output_lineage")
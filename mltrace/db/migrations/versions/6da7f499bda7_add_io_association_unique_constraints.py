@@ -0,0 +1,39 @@
+"""add_io_association_unique_constraints
+
+Revision ID: 6da7f499bda7
+Revises: 52750448d2da
+Create Date: 2026-10-18 10:12:41.517093
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "6da7f499bda7"
+down_revision = "52750448d2da"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, prefix, name in [
+        ("component_runs_inputs", "input", "_cri_uc"),
+        ("component_runs_outputs", "output", "_cro_uc"),
+    ]:
+        columns = [
+            "component_run_id",
+            f"{prefix}_path_name",
+            f"{prefix}_path_value",
+        ]
+        # Drop duplicate rows so the constraint can be created
+        op.execute(
+            f"DELETE FROM {table} a USING {table} b "
+            + "WHERE a.ctid > b.ctid AND "
+            + " AND ".join([f"a.{c} = b.{c}" for c in columns])
+        )
+        op.create_unique_constraint(name, table, columns)
+
+
+def downgrade():
+    op.drop_constraint("_cri_uc", "component_runs_inputs", type_="unique")
+    op.drop_constraint("_cro_uc", "component_runs_outputs", type_="unique")
@@ -0,0 +1,54 @@
+"""add_keyset_run_indexes
+
+Revision ID: 7b1d9e3a5c60
+Revises: 3f4a6c8e1b27
+Create Date: 2026-10-18 14:52:31.904117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "7b1d9e3a5c60"
+down_revision = "3f4a6c8e1b27"
+branch_labels = None
+depends_on = None
+
+# Run listings page on (start_timestamp, id), so the id tie-breaker is part
+# of the index and deep pages are index range scans.
+# (name, replaces, columns)
+INDEXES = [
+    (
+        "ix_component_runs_name_start_id",
+        "ix_component_runs_name_start",
+        "component_name, start_timestamp, id",
+    ),
+    (
+        "ix_component_runs_start_id",
+        "ix_component_runs_start",
+        "start_timestamp, id",
+    ),
+]
+
+
+def upgrade():
+    # See e5b2d7c94f10: concurrent builds don't block writes. The old
+    # indexes are only dropped once their replacements exist.
+    with op.get_context().autocommit_block():
+        for name, replaces, columns in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                + f"ON component_runs ({columns})"
+            )
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {replaces}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, replaces, columns in INDEXES:
+            old_columns = columns.rsplit(", id", 1)[0]
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {replaces} "
+                + f"ON component_runs ({old_columns})"
+            )
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
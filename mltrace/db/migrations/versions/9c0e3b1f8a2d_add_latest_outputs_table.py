@@ -0,0 +1,49 @@
+"""add_latest_outputs_table
+
+Revision ID: 9c0e3b1f8a2d
+Revises: 6da7f499bda7
+Create Date: 2026-10-18 11:03:27.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9c0e3b1f8a2d"
+down_revision = "6da7f499bda7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Stores that ran against a newer client may have created the table
+    # already, so only create it if it is missing
+    inspector = sa.inspect(op.get_bind())
+    if "component_runs_latest_outputs" not in inspector.get_table_names():
+        op.create_table(
+            "component_runs_latest_outputs",
+            sa.Column("output_path_name", sa.String, primary_key=True),
+            sa.Column("output_path_value", sa.LargeBinary),
+            sa.Column(
+                "component_run_id",
+                sa.Integer,
+                sa.ForeignKey("component_runs.id", ondelete="CASCADE"),
+                index=True,
+            ),
+        )
+
+    # Backfill with the highest run id that wrote each output name
+    op.execute(
+        "INSERT INTO component_runs_latest_outputs "
+        + "SELECT DISTINCT ON (output_path_name) output_path_name, "
+        + "output_path_value, component_run_id FROM component_runs_outputs "
+        + "ORDER BY output_path_name, component_run_id DESC "
+        + "ON CONFLICT (output_path_name) DO UPDATE SET "
+        + "output_path_value = excluded.output_path_value, "
+        + "component_run_id = excluded.component_run_id"
+    )
+
+
+def downgrade():
+    op.drop_table("component_runs_latest_outputs")
@@ -0,0 +1,99 @@
+"""add_code_snapshots_table
+
+Revision ID: a4c8e2f61d93
+Revises: 7b1d9e3a5c60
+Create Date: 2026-10-18 15:37:12.480266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import zlib
+
+
+# revision identifiers, used by Alembic.
+revision = "a4c8e2f61d93"
+down_revision = "7b1d9e3a5c60"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.create_table(
+        "code_snapshots",
+        sa.Column("hash", sa.String, primary_key=True),
+        sa.Column("snapshot", sa.LargeBinary),
+    )
+    op.add_column(
+        "component_runs",
+        sa.Column(
+            "code_snapshot_hash",
+            sa.String,
+            sa.ForeignKey("code_snapshots.hash"),
+        ),
+    )
+
+    # Hash in the db (sha256 needs Postgres 11), then compress one copy of
+    # each distinct snapshot here, since Postgres has no zlib
+    con = op.get_bind()
+    con.execute(
+        sa.text(
+            "UPDATE component_runs SET code_snapshot_hash = "
+            + "encode(sha256(code_snapshot), 'hex') "
+            + "WHERE code_snapshot IS NOT NULL"
+        )
+    )
+    rows = con.execution_options(stream_results=True).execute(
+        sa.text(
+            "SELECT DISTINCT ON (code_snapshot_hash) code_snapshot_hash, "
+            + "code_snapshot FROM component_runs "
+            + "WHERE code_snapshot_hash IS NOT NULL "
+            + "ORDER BY code_snapshot_hash"
+        )
+    )
+    insert = sa.text(
+        "INSERT INTO code_snapshots (hash, snapshot) VALUES (:hash, :snapshot)"
+    )
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if len(batch) == 0:
+            break
+        con.execute(
+            insert,
+            [
+                {"hash": h, "snapshot": zlib.compress(bytes(s))}
+                for h, s in batch
+            ],
+        )
+
+    op.drop_column("component_runs", "code_snapshot")
+
+
+def downgrade():
+    op.add_column(
+        "component_runs", sa.Column("code_snapshot", sa.LargeBinary)
+    )
+
+    con = op.get_bind()
+    rows = con.execution_options(stream_results=True).execute(
+        sa.text("SELECT hash, snapshot FROM code_snapshots")
+    )
+    update = sa.text(
+        "UPDATE component_runs SET code_snapshot = :snapshot "
+        + "WHERE code_snapshot_hash = :hash"
+    )
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if len(batch) == 0:
+            break
+        con.execute(
+            update,
+            [
+                {"hash": h, "snapshot": zlib.decompress(bytes(s))}
+                for h, s in batch
+            ],
+        )
+
+    op.drop_column("component_runs", "code_snapshot_hash")
+    op.drop_table("code_snapshots")
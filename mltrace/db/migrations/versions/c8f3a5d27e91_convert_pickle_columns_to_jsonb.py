@@ -0,0 +1,111 @@
+"""convert_pickle_columns_to_jsonb
+
+Revision ID: c8f3a5d27e91
+Revises: a4c8e2f61d93
+Create Date: 2026-10-18 16:24:05.113702
+
+"""
+from alembic import op
+from sqlalchemy.dialects import postgresql
+import sqlalchemy as sa
+import json
+import pickle
+
+
+# revision identifiers, used by Alembic.
+revision = "c8f3a5d27e91"
+down_revision = "a4c8e2f61d93"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+COLUMNS = ["git_tags", "mlflow_run_params", "mlflow_run_metrics", "stale"]
+
+# (name, column) GIN indexes for containment queries
+GIN_INDEXES = [
+    ("ix_component_runs_git_tags", "git_tags"),
+    ("ix_component_runs_mlflow_params", "mlflow_run_params"),
+    ("ix_component_runs_mlflow_metrics", "mlflow_run_metrics"),
+]
+
+
+def _convert(suffix: str, convert, cast: str):
+    """Copies every column to column + suffix, converting values in Python
+    a batch at a time."""
+    con = op.get_bind()
+    columns = ", ".join(COLUMNS)
+    rows = con.execution_options(stream_results=True).execute(
+        sa.text(f"SELECT id, {columns} FROM component_runs")
+    )
+    assignments = ", ".join(
+        f"{c}{suffix} = CAST(:{c} AS {cast})" for c in COLUMNS
+    )
+    update = sa.text(
+        f"UPDATE component_runs SET {assignments} WHERE id = :id"
+    )
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if len(batch) == 0:
+            break
+        con.execute(
+            update,
+            [
+                dict(
+                    id=row[0],
+                    **{
+                        c: None if value is None else convert(value)
+                        for c, value in zip(COLUMNS, row[1:])
+                    },
+                )
+                for row in batch
+            ],
+        )
+
+
+def _replace_columns(suffix: str):
+    """Drops the old columns and renames column + suffix to column."""
+    for column in COLUMNS:
+        op.drop_column("component_runs", column)
+        op.alter_column(
+            "component_runs", f"{column}{suffix}", new_column_name=column
+        )
+
+
+def upgrade():
+    # Values pickled by older clients are decoded here once, so reads
+    # never unpickle them again
+    for column in COLUMNS:
+        op.add_column(
+            "component_runs", sa.Column(f"{column}_json", postgresql.JSONB)
+        )
+    _convert(
+        "_json",
+        lambda value: json.dumps(pickle.loads(bytes(value)), default=str),
+        "jsonb",
+    )
+    _replace_columns("_json")
+
+    for name, column in GIN_INDEXES:
+        op.create_index(
+            name, "component_runs", [column], postgresql_using="gin"
+        )
+    op.create_index(
+        "ix_component_runs_stale",
+        "component_runs",
+        ["start_timestamp", "id"],
+        postgresql_where=sa.text("stale <> '[]'::jsonb"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_component_runs_stale", table_name="component_runs")
+    for name, _ in GIN_INDEXES:
+        op.drop_index(name, table_name="component_runs")
+
+    for column in COLUMNS:
+        op.add_column(
+            "component_runs", sa.Column(f"{column}_pickle", sa.LargeBinary)
+        )
+    _convert("_pickle", pickle.dumps, "bytea")
+    _replace_columns("_pickle")
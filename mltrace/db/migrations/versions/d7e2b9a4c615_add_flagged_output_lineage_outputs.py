@@ -0,0 +1,30 @@
+"""add_flagged_output_lineage_outputs
+
+Revision ID: d7e2b9a4c615
+Revises: c8f3a5d27e91
+Create Date: 2026-10-18 19:02:41.736519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d7e2b9a4c615"
+down_revision = "c8f3a5d27e91"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "flagged_output_lineage_outputs",
+        sa.Column("output_name", sa.String, primary_key=True),
+    )
+    # Older clients didn't drop cached lineage when outputs were written
+    # again, so it is recomputed on the next review
+    op.execute("DELETE FROM flagged_output_lineage")
+
+
+def downgrade():
+    op.drop_table("flagged_output_lineage_outputs")
@@ -0,0 +1,71 @@
+"""add_lineage_indexes
+
+Revision ID: e5b2d7c94f10
+Revises: 9c0e3b1f8a2d
+Create Date: 2026-10-18 11:48:05.662931
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b2d7c94f10"
+down_revision = "9c0e3b1f8a2d"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, where)
+INDEXES = [
+    (
+        "ix_component_runs_name_start",
+        "component_runs",
+        "component_name, start_timestamp",
+        None,
+    ),
+    ("ix_component_runs_start", "component_runs", "start_timestamp", None),
+    ("ix_io_pointers_value", "io_pointers", "value", None),
+    ("ix_io_pointers_flagged", "io_pointers", "name", "flag"),
+    (
+        "ix_cri_name_value",
+        "component_runs_inputs",
+        "input_path_name, input_path_value",
+        None,
+    ),
+    (
+        "ix_cro_name_run",
+        "component_runs_outputs",
+        "output_path_name, component_run_id",
+        None,
+    ),
+    (
+        "ix_cro_value_run",
+        "component_runs_outputs",
+        "output_path_value, component_run_id",
+        None,
+    ),
+    (
+        "ix_crd_depends_on",
+        "component_run_dependencies",
+        "depends_on_component_run_id",
+        None,
+    ),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction. It doesn't
+    # block writes, so this can run against a live server. If a build
+    # fails, drop the INVALID index it leaves behind and rerun.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                + f"ON {table} ({columns})"
+                + (f" WHERE {where}" if where else "")
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
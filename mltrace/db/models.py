@@ -7,6 +7,7 @@ from mltrace.db.base import Base
 from sqlalchemy import (
     ARRAY,
     Column,
+    DDL,
     JSON,
     Index,
     String,
@@ -16,16 +17,22 @@ from sqlalchemy import (
     Table,
     ForeignKey,
     Enum,
-    PickleType,
     UniqueConstraint,
     text,
     Numeric,
+    select,
+    type_coerce,
+    event,
 )
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, backref, column_property
 from sqlalchemy.schema import ForeignKeyConstraint
+from sqlalchemy.types import TypeDecorator
 
 import enum
+import hashlib
 import typing
+import zlib
 
 
 class PointerTypeEnum(str, enum.Enum):
@@ -164,7 +171,16 @@ class IOPointer(Base):
         backref="labels",
     )
 
-    __table_args__ = (UniqueConstraint("name", "value", name="_iop_uc"),)
+    __table_args__ = (
+        UniqueConstraint("name", "value", name="_iop_uc"),
+        Index("ix_io_pointers_value", "value"),
+        Index(
+            "ix_io_pointers_flagged",
+            "name",
+            postgresql_where=text("flag"),
+            sqlite_where=text("flag"),
+        ),
+    )
 
     def __init__(
         self,
@@ -204,9 +220,13 @@ component_run_input_association = Table(
     Column("input_path_name", String),
     Column("input_path_value", LargeBinary),
     Column("component_run_id", Integer, ForeignKey("component_runs.id")),
-    # UniqueConstraint(
-    #     "input_path_name", "input_path_value", name="inp_nameval"
-    # ),
+    UniqueConstraint(
+        "component_run_id",
+        "input_path_name",
+        "input_path_value",
+        name="_cri_uc",
+    ),
+    Index("ix_cri_name_value", "input_path_name", "input_path_value"),
     ForeignKeyConstraint(
         ["input_path_name", "input_path_value"],
         ["io_pointers.name", "io_pointers.value"],
@@ -219,15 +239,92 @@ component_run_output_association = Table(
     Column("output_path_name", String),
     Column("output_path_value", LargeBinary),
     Column("component_run_id", Integer, ForeignKey("component_runs.id")),
-    # UniqueConstraint(
-    #     "output_path_name", "output_path_value", name="out_nameval"
-    # ),
+    UniqueConstraint(
+        "component_run_id",
+        "output_path_name",
+        "output_path_value",
+        name="_cro_uc",
+    ),
+    Index("ix_cro_name_run", "output_path_name", "component_run_id"),
+    Index("ix_cro_value_run", "output_path_value", "component_run_id"),
     ForeignKeyConstraint(
         ["output_path_name", "output_path_value"],
         ["io_pointers.name", "io_pointers.value"],
     ),
 )
 
+# Most recent write of each output name, maintained on commit so change
+# detection and dependency lookups don't scan component_runs_outputs
+component_run_latest_outputs = Table(
+    "component_runs_latest_outputs",
+    Base.metadata,
+    Column("output_path_name", String, primary_key=True),
+    Column("output_path_value", LargeBinary),
+    Column(
+        "component_run_id",
+        Integer,
+        ForeignKey("component_runs.id", ondelete="CASCADE"),
+        index=True,
+    ),
+)
+
+# Ancestor runs of each flagged output, maintained when outputs are
+# flagged or unflagged so reviews are a single GROUP BY. Commits drop the
+# rows of the outputs they write, and reviews fill them in again.
+flagged_output_lineage = Table(
+    "flagged_output_lineage",
+    Base.metadata,
+    Column("output_name", String, primary_key=True),
+    Column(
+        "component_run_id",
+        Integer,
+        ForeignKey("component_runs.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
+)
+
+# Flagged outputs whose lineage is in flagged_output_lineage, including
+# outputs that no run wrote, which have no rows there
+flagged_output_lineage_outputs = Table(
+    "flagged_output_lineage_outputs",
+    Base.metadata,
+    Column("output_name", String, primary_key=True),
+)
+
+# JSON columns are JSONB on Postgres, so they can be GIN indexed and
+# filtered in SQL. None is stored as SQL NULL.
+_JSONB = JSON(none_as_null=True).with_variant(
+    JSONB(none_as_null=True), "postgresql"
+)
+
+
+class _CompressedBinary(TypeDecorator):
+    """LargeBinary that is zlib-compressed in the db."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return zlib.compress(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return zlib.decompress(value) if value is not None else None
+
+
+def _code_snapshot_hash(code_snapshot: bytes) -> str:
+    """Returns the key of a code snapshot in code_snapshots."""
+    return hashlib.sha256(code_snapshot).hexdigest()
+
+
+# Source code of component runs, stored once per distinct snapshot
+code_snapshots = Table(
+    "code_snapshots",
+    Base.metadata,
+    Column("hash", String, primary_key=True),
+    Column("snapshot", _CompressedBinary),
+)
+
 component_run_dependencies = Table(
     "component_run_dependencies",
     Base.metadata,
@@ -243,6 +340,7 @@ component_run_dependencies = Table(
         ForeignKey("component_runs.id"),
         primary_key=True,
     ),
+    Index("ix_crd_depends_on", "depends_on_component_run_id"),
 )
 
 
@@ -253,13 +351,21 @@ class ComponentRun(Base):
     component_name = Column(String, ForeignKey("components.name"))
     notes = Column(String)
     git_hash = Column(String)
-    git_tags = Column(PickleType)
-    code_snapshot = Column(LargeBinary)
+    git_tags = Column(_JSONB)
+    code_snapshot_hash = Column(String, ForeignKey("code_snapshots.hash"))
+    code_snapshot = column_property(
+        type_coerce(
+            select(code_snapshots.c.snapshot)
+            .where(code_snapshots.c.hash == code_snapshot_hash)
+            .scalar_subquery(),
+            _CompressedBinary,
+        )
+    )
     start_timestamp = Column(DateTime)
     end_timestamp = Column(DateTime)
     mlflow_run_id = Column(String)
-    mlflow_run_params = Column(PickleType)
-    mlflow_run_metrics = Column(PickleType)
+    mlflow_run_params = Column(_JSONB)
+    mlflow_run_metrics = Column(_JSONB)
     inputs = relationship(
         "IOPointer",
         secondary=component_run_input_association,
@@ -281,9 +387,26 @@ class ComponentRun(Base):
         backref="left_component_run_ids",
         cascade="all",
     )
-    stale = Column(PickleType)
+    stale = Column(_JSONB)
     test_results = Column(JSON)
 
+    __table_args__ = (
+        Index(
+            "ix_component_runs_name_start_id",
+            "component_name",
+            "start_timestamp",
+            "id",
+        ),
+        Index("ix_component_runs_start_id", "start_timestamp", "id"),
+        Index(
+            "ix_component_runs_stale",
+            "start_timestamp",
+            "id",
+            postgresql_where=text("stale <> '[]'::jsonb"),
+            sqlite_where=text("json_array_length(stale) > 0"),
+        ),
+    )
+
     def __init__(self, component_name):
         """Initialize ComponentRun, or an instance of a Component's 'run.'"""
         self.component_name = component_name
@@ -329,8 +452,13 @@ class ComponentRun(Base):
         self.end_timestamp = ts
 
     def set_code_snapshot(self, code_snapshot: bytes):
-        """Code snapshot setter."""
+        """Code snapshot setter. The Store saves the snapshot in
+        code_snapshots when the run is committed, unless it's already
+        there."""
         self.code_snapshot = code_snapshot
+        self.code_snapshot_hash = (
+            _code_snapshot_hash(code_snapshot) if code_snapshot else None
+        )
 
     def add_notes(self, notes: str):
         """Add notes describing details of component run"""
@@ -438,3 +566,19 @@ class ComponentRun(Base):
 
     def set_test_result(self, test_results: JSON):
         self.test_results = test_results
+
+
+# GIN indexes on the JSONB columns. They are only created on Postgres;
+# other dbs would build plain indexes over the JSON text.
+for _name, _column in [
+    ("ix_component_runs_git_tags", "git_tags"),
+    ("ix_component_runs_mlflow_params", "mlflow_run_params"),
+    ("ix_component_runs_mlflow_metrics", "mlflow_run_metrics"),
+]:
+    event.listen(
+        ComponentRun.__table__,
+        "after_create",
+        DDL(
+            f"CREATE INDEX {_name} ON component_runs USING gin ({_column})"
+        ).execute_if(dialect="postgresql"),
+    )
@@ -4,13 +4,22 @@ from git.index import typ
 from sqlalchemy.exc import IntegrityError
 from mltrace.db.utils import (
     _create_engine_wrapper,
+    _get_engine,
+    _get_schema_revision,
     _initialize_db_tables,
+    _verify_schema,
+    _forget_schema,
     _drop_everything,
     _map_extension_to_enum,
     _hash_value,
+    _hash_values,
+    _hash_io_values,
+    _io_value,
     _get_data_and_model_args,
     _load,
     _save,
+    _saved_artifact_value,
+    _stored_artifact_value,
     _get_view_name,
 )
 from mltrace.db import (
@@ -20,23 +29,306 @@ from mltrace.db import (
     PointerTypeEnum,
     Tag,
     Label,
-    component_run_output_association,
     deleted_labels,
     output_table,
     feedback_table,
 )
-from mltrace.db.models import component_run_output_association
-from sqlalchemy import func, and_, text
-from sqlalchemy.orm import sessionmaker, joinedload
+from mltrace.db.models import (
+    code_snapshots,
+    component_run_dependencies,
+    component_run_input_association,
+    component_run_latest_outputs,
+    component_run_output_association,
+    flagged_output_lineage,
+    flagged_output_lineage_outputs,
+)
+from sqlalchemy import (
+    and_,
+    exists,
+    func,
+    literal,
+    not_,
+    or_,
+    select,
+    text,
+    type_coerce,
+    union_all,
+)
+from sqlalchemy.orm import defer, sessionmaker, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql.expression import Tuple
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+import contextlib
 import ctypes
 import hashlib
 import inspect
 import logging
+import operator
+import os
 import sqlalchemy
 import typing
+import weakref
+
+
+def _chunks(items: typing.List[typing.Any], size: int = 500):
+    """Splits items into lists of at most size elements, to keep IN
+    clauses under the db's bind parameter limit."""
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def _web_trace_node(
+    run_id: int,
+    component_name: str,
+    stale: typing.List[str],
+    outputs: typing.List[typing.Tuple[str, PointerTypeEnum]],
+) -> dict:
+    """Returns the web trace dictionary of a ComponentRun and its outputs,
+    given as (name, pointer type) tuples, without its dependencies."""
+    res = {}
+    res["id"] = f"componentrun_{run_id}"
+    res["label"] = component_name
+    res["hasCaret"] = True
+    res["isExpanded"] = True
+    res["stale"] = stale
+    res["childNodes"] = []
+
+    for name, pointer_type in sorted(outputs, key=lambda x: x[0]):
+        out_dict = {
+            "id": f"iopointer_{name}",
+            "label": name,
+            "hasCaret": False,
+            "parent": res["id"],
+        }
+
+        # Settle on icon
+        if pointer_type == PointerTypeEnum.DATA:
+            out_dict["icon"] = "database"
+        elif pointer_type == PointerTypeEnum.MODEL:
+            out_dict["icon"] = "function"
+        elif pointer_type == PointerTypeEnum.ENDPOINT:
+            out_dict["icon"] = "flow-end"
+
+        res["childNodes"].append(out_dict)
+
+    return res
+
+
+def _producers(names) -> sqlalchemy.sql.Select:
+    """Selects (name, run_id) for the most recently started ComponentRun
+    that wrote each output name in names (a list or a subquery)."""
+    assoc = component_run_output_association
+    latest = (
+        select(
+            assoc.c.output_path_name.label("name"),
+            func.max(ComponentRun.start_timestamp).label("ts"),
+        )
+        .join(ComponentRun, ComponentRun.id == assoc.c.component_run_id)
+        .where(assoc.c.output_path_name.in_(names))
+        .group_by(assoc.c.output_path_name)
+        .subquery()
+    )
+    return (
+        select(latest.c.name, func.max(ComponentRun.id).label("run_id"))
+        .select_from(latest)
+        .join(assoc, assoc.c.output_path_name == latest.c.name)
+        .join(
+            ComponentRun,
+            and_(
+                ComponentRun.id == assoc.c.component_run_id,
+                ComponentRun.start_timestamp == latest.c.ts,
+            ),
+        )
+        .group_by(latest.c.name)
+    )
+
+
+# Load profiles for ComponentRun reads, mapped to the columns they leave
+# out. Snapshots can be up to 64KB, and the other columns are JSON decoded
+# for every row. "default" leaves out only the snapshot; "full"
+# loads everything. Deferred columns are loaded on access while the
+# session is open and are None in client ComponentRuns.
+_PROFILES = {
+    "summary": (
+        "code_snapshot",
+        "git_tags",
+        "mlflow_run_params",
+        "mlflow_run_metrics",
+        "test_results",
+    ),
+    "default": ("code_snapshot",),
+    "full": (),
+}
+
+
+def _deferred_columns(profile: str) -> typing.Tuple[str, ...]:
+    if profile not in _PROFILES:
+        raise RuntimeError(
+            f"Unknown profile {profile}. Options are {list(_PROFILES)}."
+        )
+    return _PROFILES[profile]
+
+
+def _run_load_options(profile: str) -> list:
+    """Returns query options that defer the columns profile leaves out."""
+    return [
+        defer(getattr(ComponentRun, name))
+        for name in _deferred_columns(profile)
+    ]
+
+
+def _run_columns(profile: str) -> list:
+    """Returns the ComponentRun columns profile loads. Only "full" includes
+    the code snapshot, which is read from code_snapshots."""
+    deferred = _deferred_columns(profile)
+    return [
+        getattr(ComponentRun, prop.key)
+        for prop in sqlalchemy.inspect(ComponentRun).column_attrs
+        if prop.key not in deferred
+    ]
+
+
+# Hashes of the code snapshots known to be in code_snapshots, per engine,
+# so runs of unchanged code don't send their snapshot again. Hashes are
+# only added once the transaction that inserted them commits.
+_known_code_snapshots = weakref.WeakKeyDictionary()
+
+
+def _remember_code_snapshots(session: sqlalchemy.orm.Session):
+    new_hashes = session.info.pop("new_code_snapshots", None)
+    if new_hashes:
+        _known_code_snapshots.setdefault(session.bind, set()).update(
+            new_hashes
+        )
+
+
+def _forget_code_snapshots(session: sqlalchemy.orm.Session):
+    session.info.pop("new_code_snapshots", None)
+
+
+def _run_order(descending: bool = True) -> typing.List[typing.Any]:
+    """Orders ComponentRuns by (start_timestamp, id), so runs that started
+    at the same time still have a stable order to page through."""
+    if descending:
+        return [ComponentRun.start_timestamp.desc(), ComponentRun.id.desc()]
+    return [ComponentRun.start_timestamp, ComponentRun.id]
+
+
+def _after_run(last_run_id: int, descending: bool = True):
+    """Keyset filter for the ComponentRuns that come after last_run_id in
+    _run_order. The cursor's start timestamp is read in a subquery, so a
+    page is still a single query."""
+    last_run_id = int(last_run_id)
+    key = Tuple(ComponentRun.start_timestamp, ComponentRun.id)
+    cursor = Tuple(
+        select(ComponentRun.start_timestamp)
+        .where(ComponentRun.id == last_run_id)
+        .scalar_subquery(),
+        literal(last_run_id),
+    )
+    return key < cursor if descending else key > cursor
+
+
+_COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def _json_value(column, key: str, value):
+    """Returns the JSON value of key in column, cast to the SQL type of
+    value."""
+    element = column[key]
+    if isinstance(value, bool):
+        return element.as_boolean()
+    if isinstance(value, int):
+        return element.as_integer()
+    if isinstance(value, float):
+        return element.as_float()
+    return element.as_string()
+
+
+def _run_filters(
+    dialect: str,
+    stale: bool = None,
+    git_tag: str = None,
+    mlflow_params: typing.Dict[str, typing.Any] = None,
+    mlflow_metrics: typing.List[typing.Tuple[str, str, float]] = None,
+) -> list:
+    """Returns SQL filters on the JSON columns of ComponentRun. On Postgres,
+    tag and param filters are JSONB containment, which the GIN indexes
+    serve, and the staleness filter matches the partial stale index."""
+    filters = []
+    postgres = dialect == "postgresql"
+
+    if stale is not None:
+        if postgres:
+            has_stale = text("component_runs.stale <> '[]'::jsonb")
+        else:
+            has_stale = text("json_array_length(component_runs.stale) > 0")
+        filters.append(
+            has_stale
+            if stale
+            else or_(ComponentRun.stale.is_(None), not_(has_stale))
+        )
+
+    if git_tag is not None:
+        if postgres:
+            filters.append(
+                type_coerce(ComponentRun.git_tags, JSONB).contains([git_tag])
+            )
+        else:
+            tags = func.json_each(ComponentRun.git_tags).table_valued("value")
+            filters.append(
+                exists(select(literal(1)).where(tags.c.value == git_tag))
+            )
+
+    if mlflow_params:
+        if postgres:
+            filters.append(
+                type_coerce(ComponentRun.mlflow_run_params, JSONB).contains(
+                    mlflow_params
+                )
+            )
+        else:
+            filters.extend(
+                _json_value(ComponentRun.mlflow_run_params, key, value)
+                == value
+                for key, value in mlflow_params.items()
+            )
+
+    for name, op, value in mlflow_metrics or []:
+        if op not in _COMPARISONS:
+            raise RuntimeError(
+                f"Unknown comparison {op}. Options are {list(_COMPARISONS)}."
+            )
+        filters.append(
+            _COMPARISONS[op](
+                ComponentRun.mlflow_run_metrics[name].as_float(), value
+            )
+        )
+
+    return filters
+
+
+def _ancestors(producers: sqlalchemy.sql.Select) -> sqlalchemy.sql.Select:
+    """Expands (name, run_id) rows to the runs in each run's lineage with a
+    recursive query over component_run_dependencies."""
+    deps = component_run_dependencies
+    ancestors = producers.cte("ancestors", recursive=True)
+    ancestors = ancestors.union(
+        select(ancestors.c.name, deps.c.depends_on_component_run_id).where(
+            deps.c.component_run_id == ancestors.c.run_id
+        )
+    )
+    return select(ancestors.c.name, ancestors.c.run_id)
 
 
 class Store(object):
@@ -45,7 +337,10 @@ class Store(object):
     def __init__(self, uri: str, delete_first: bool = False):
         """
         Creates the postgres database for the store. Raises exception if uri
-        isn't prefixed with postgresql://.
+        isn't prefixed with postgresql://. Engines (and their connection
+        pools) are shared by all Stores with the same uri; the in-memory
+        "test" database gets a fresh engine every time. The schema is
+        verified once per process per uri; use init_db to force it.
 
         Args:
             uri (str): URI string to connect to the SQLAlchemy database.
@@ -53,29 +348,95 @@ class Store(object):
                 deleted.
         """
         if uri.lower().strip() == "test":
-            uri = "sqlite:///:memory:"
+            self.engine = _create_engine_wrapper("sqlite:///:memory:")
+            _initialize_db_tables(self.engine)
 
         elif not uri.startswith("postgresql://"):
             raise RuntimeError(
                 "Database URI must be prefixed with `postgresql://`"
             )
 
-        self.engine = _create_engine_wrapper(uri)
+        else:
+            self.engine = _get_engine(uri)
 
-        # TODO(shreyashankar) remove this line
-        if delete_first:
-            _drop_everything(self.engine)
+            # TODO(shreyashankar) remove this line
+            if delete_first:
+                _drop_everything(self.engine)
+                _forget_schema(uri)
+                _known_code_snapshots.pop(self.engine, None)
 
-        # TODO(shreyashankar) check existing tables against expected tables
-        _initialize_db_tables(self.engine)
+            # Only the first Store per uri in this process checks the schema
+            _verify_schema(uri, self.engine)
 
         # Initialize session
         self.Session = sessionmaker(self.engine)
+        sqlalchemy.event.listen(
+            self.Session, "after_commit", _remember_code_snapshots
+        )
+        sqlalchemy.event.listen(
+            self.Session, "after_rollback", _forget_code_snapshots
+        )
         self.session = self.Session()
+        self._owns_session = True
+        self._batch_depth = 0
+
+    @classmethod
+    def from_session(cls, session: sqlalchemy.orm.Session) -> "Store":
+        """Wraps a session owned by someone else, e.g. the sync session of
+        an AsyncSession. The Store will not close it."""
+        store = cls.__new__(cls)
+        store.engine = session.bind
+        store.Session = None
+        store.session = session
+        store._owns_session = False
+        store._batch_depth = 0
+        return store
 
     def __del__(self):
         """On destruction, close session."""
-        self.session.close()
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the session, returning its connection to the pool."""
+        session = getattr(self, "session", None)
+        if session is not None and self._owns_session:
+            session.close()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Groups all writes made inside the block into one transaction,
+        which is committed when the outermost block exits and rolled back
+        if it raises."""
+        self._batch_depth += 1
+        try:
+            yield self
+            if self._batch_depth == 1:
+                self.session.commit()
+        except Exception:
+            if self._batch_depth == 1:
+                self.session.rollback()
+            raise
+        finally:
+            self._batch_depth -= 1
+
+    def _commit(self):
+        """Commits the session, or only flushes it inside a batch."""
+        if self._batch_depth > 0:
+            self.session.flush()
+        else:
+            self.session.commit()
+
+    def init_db(self) -> str:
+        """Creates any missing tables and returns the schema revision
+        recorded in the db."""
+        _initialize_db_tables(self.engine)
+        return _get_schema_revision(self.engine)
 
     def create_component(
         self,
@@ -102,7 +463,7 @@ class Store(object):
             name=name, description=description, owner=owner, tags=tags
         )
         self.session.add(component)
-        self.session.commit()
+        self._commit()
 
     def get_component(self, name: str) -> Component:
         """Retrieves component if exists."""
@@ -125,6 +486,63 @@ class Store(object):
 
         return component_run
 
+    def get_component_run_row(self, id: str) -> sqlalchemy.engine.Row:
+        """Selects the columns of a component run as a row, or returns None
+        if it doesn't exist."""
+        return (
+            self.session.query(*_run_columns("full"))
+            .filter(ComponentRun.id == id)
+            .first()
+        )
+
+    def get_component_run_relations(
+        self, run_ids: typing.List[int]
+    ) -> typing.Dict[int, typing.Tuple[list, list, typing.List[str]]]:
+        """Returns the inputs, outputs and dependency component names of
+        many runs, with one query per relation. Inputs and outputs are
+        (name, value, pointer type, flag) tuples."""
+        res = {run_id: ([], [], []) for run_id in run_ids}
+        deps = component_run_dependencies
+        for chunk in _chunks(list(res)):
+            for idx, (table, prefix) in enumerate(
+                [
+                    (component_run_input_association, "input"),
+                    (component_run_output_association, "output"),
+                ]
+            ):
+                for run_id, *iop in self.session.execute(
+                    select(
+                        table.c.component_run_id,
+                        IOPointer.name,
+                        IOPointer.value,
+                        IOPointer.pointer_type,
+                        IOPointer.flag,
+                    )
+                    .join(
+                        IOPointer,
+                        and_(
+                            IOPointer.name == table.c[f"{prefix}_path_name"],
+                            IOPointer.value
+                            == table.c[f"{prefix}_path_value"],
+                        ),
+                    )
+                    .where(table.c.component_run_id.in_(chunk))
+                ):
+                    res[run_id][idx].append(tuple(iop))
+
+            for run_id, component_name in self.session.execute(
+                select(deps.c.component_run_id, ComponentRun.component_name)
+                .join(
+                    ComponentRun,
+                    ComponentRun.id == deps.c.depends_on_component_run_id,
+                )
+                .where(deps.c.component_run_id.in_(chunk))
+                .order_by(deps.c.depends_on_component_run_id)
+            ):
+                res[run_id][2].append(component_name)
+
+        return res
+
     def add_tags_to_component(
         self, component_name: str, tags: typing.List[str]
     ):
@@ -138,7 +556,7 @@ class Store(object):
 
         tag_objects = list(set([self.get_tag(t) for t in tags]))
         component.add_tags(tag_objects)
-        self.session.commit()
+        self._commit()
 
     def unflag_all(self):
         """Unflags all IO Pointers and commits."""
@@ -151,7 +569,9 @@ class Store(object):
         for iop in flagged_iop:
             iop.clear_flag()
 
-        self.session.commit()
+        self.session.execute(flagged_output_lineage.delete())
+        self.session.execute(flagged_output_lineage_outputs.delete())
+        self._commit()
 
     def initialize_empty_component_run(
         self, component_name: str
@@ -170,7 +590,7 @@ class Store(object):
             logging.info(f'Creating new Tag with name "{name}".')
             tag = Tag(name)
             self.session.add(tag)
-            self.session.commit()
+            self._commit()
             return tag
 
         # Return existing Tag
@@ -186,47 +606,21 @@ class Store(object):
         """Creates io pointers around the specified path names. Retrieves
         existing io pointer if exists in DB, otherwise creates a new one with
         inferred pointer type."""
-        values = (
-            [_hash_value(v) for v in values] if values else [b""] * len(names)
-        )
-        res = (
-            self.session.query(IOPointer)
-            .filter(
-                Tuple(IOPointer.name, IOPointer.value).in_(
-                    list(zip(names, values))
-                )
-            )
-            .all()
-        )
+        values = _hash_io_values(names, values)
+        if pointer_type is None and len(names) > 0:
+            pointer_type = _map_extension_to_enum(names[0])
+
+        pointer_types = {(n, v): pointer_type for n, v in zip(names, values)}
+        iops = self._upsert_io_pointers(pointer_types)
+        res = [iops[key] for key in pointer_types]
+        self._commit()
+
         # Create label vector
-        label_vec = self.get_labels(labels) if labels else None
-        if res and labels:
+        if labels:
+            label_vec = self.get_labels(labels)
             for iop in res:
                 iop.add_labels(label_vec)
-
-        res_names_values = set([(r.name, r.value) for r in res])
-        need_to_add = set(zip(names, values)) - res_names_values
-
-        if len(need_to_add) != 0:
-            # Create new IOPointers
-            if pointer_type is None:
-                pointer_type = _map_extension_to_enum(
-                    next(iter(need_to_add))[0]
-                )
-            iops = [
-                IOPointer(
-                    name=name,
-                    value=value,
-                    pointer_type=pointer_type,
-                )
-                for name, value in need_to_add
-            ]
-            if labels:
-                for iop in iops:
-                    iop.add_labels(label_vec)
-            self.session.add_all(iops)
-            self.session.commit()
-            return res + iops
+            self._commit()
 
         return res
 
@@ -241,70 +635,137 @@ class Store(object):
         """Creates an io pointer around the specified path.
         Retrieves existing io pointer if exists in DB,
         otherwise creates a new one if create flag is set."""
+        hval = _hash_value(_io_value(name, value))
+        return self._get_io_pointer(name, hval, pointer_type, create, labels)
 
-        hval = _hash_value(value)
-        same_name_res = (
-            self.session.query(
-                component_run_output_association.c.output_path_value
-            )
-            .filter(
-                component_run_output_association.c.output_path_name == name
-            )
-            .order_by(
-                component_run_output_association.c.component_run_id.desc()
+    def _get_io_pointer(
+        self,
+        name: str,
+        hval: bytes,
+        pointer_type: PointerTypeEnum,
+        create: bool,
+        labels: typing.List[str],
+    ) -> IOPointer:
+        """get_io_pointer for an already hashed value."""
+        last_value = self.session.execute(
+            select(component_run_latest_outputs.c.output_path_value).where(
+                component_run_latest_outputs.c.output_path_name == name
             )
-            .all()
-        )
-        same_name_res = [r[0] for r in same_name_res]
+        ).scalar()
 
         # Create label vector
         label_vec = self.get_labels(labels) if labels else None
 
-        if len(same_name_res) > 0 and bytes(same_name_res[0]) != hval:
+        if last_value is not None and bytes(last_value) != hval:
             logging.warning(
                 f'IOPointer with name "{name}" has a different value '
                 + "from the last write."
             )
 
-        res = (
-            self.session.query(IOPointer)
-            .filter(and_(IOPointer.name == name, IOPointer.value == hval))
-            .all()
-        )
-
-        # Must create new IOPointer
-        if len(res) == 0:
-            if create is False:
+        if create is False:
+            res = (
+                self.session.query(IOPointer)
+                .filter(and_(IOPointer.name == name, IOPointer.value == hval))
+                .first()
+            )
+            if res is None:
                 raise RuntimeError(
                     f"IOPointer with name {name} noes not exist. Set create"
                     + f" flag to True if you would like to create it."
                 )
-
-            logging.info(f'Creating new IOPointer with name "{name}".')
+        else:
             if pointer_type is None:
                 pointer_type = _map_extension_to_enum(name)
+            res = self._upsert_io_pointers({(name, hval): pointer_type})[
+                (name, hval)
+            ]
+            self._commit()
 
-            iop = IOPointer(name=name, value=hval, pointer_type=pointer_type)
-            if labels:
-                iop.add_labels(label_vec)
-            self.session.add(iop)
-            self.session.commit()
-            return iop
-
-        # Return existing object
         # Add labels if they exist
         if labels:
-            res[0].add_labels(label_vec)
-        return res[0]
+            res.add_labels(label_vec)
+            self._commit()
+        return res
+
+    def _upsert_io_pointers(
+        self, pointer_types: typing.Dict[typing.Tuple[str, bytes], typing.Any]
+    ) -> typing.Dict[typing.Tuple[str, bytes], IOPointer]:
+        """Retrieves or creates IOPointers for (name, hashed value) keys with
+        INSERT ... ON CONFLICT DO NOTHING, so concurrent writers of the same
+        pointer don't race. On postgres, the insert and the lookup of the
+        rows that already existed are a single statement."""
+        table = IOPointer.__table__
+        postgres = self.engine.dialect.name == "postgresql"
+        res = {}
+        for chunk in _chunks(list(pointer_types.keys())):
+            stmt = self._insert_ignore(table).values(
+                [
+                    {
+                        "name": name,
+                        "value": value,
+                        "pointer_type": pointer_types[(name, value)]
+                        or _map_extension_to_enum(name),
+                        "flag": False,
+                    }
+                    for name, value in chunk
+                ]
+            )
+            existing = select(table).where(
+                Tuple(table.c.name, table.c.value).in_(chunk)
+            )
+
+            if postgres:
+                inserted = stmt.returning(*table.c).cte("inserted")
+                iops = (
+                    self.session.query(IOPointer)
+                    .from_statement(union_all(select(inserted), existing))
+                    .all()
+                )
+            else:
+                self.session.execute(stmt)
+                iops = []
+
+            res.update({(iop.name, bytes(iop.value)): iop for iop in iops})
+
+            # Rows a concurrent transaction committed after our statement
+            # started are not in its snapshot, so look them up again
+            missing = [key for key in chunk if key not in res]
+            if len(missing) > 0:
+                res.update(
+                    {
+                        (iop.name, bytes(iop.value)): iop
+                        for iop in self.session.query(IOPointer)
+                        .filter(
+                            Tuple(IOPointer.name, IOPointer.value).in_(
+                                missing
+                            )
+                        )
+                        .all()
+                    }
+                )
+
+        return res
 
     def delete_component(self, component: Component):
+        names = set(
+            [
+                out.name
+                for cr in component.component_runs
+                for out in cr.outputs
+            ]
+        )
         self.session.delete(component)
+        self.session.flush()
+        self._rebuild_latest_outputs(names)
         logging.info(
             f'Successfully deleted Component with name "{component.name}".'
         )
 
     def delete_component_run(self, component_run: ComponentRun):
+        names = set([out.name for out in component_run.outputs])
         self.session.delete(component_run)
+        self.session.flush()
+        self._rebuild_latest_outputs(names)
         logging.info(
             f'Successfully deleted ComponentRun with id "{component_run.id}"'
             + f' and name "{component_run.component_name}".'
@@ -330,7 +791,126 @@ class Store(object):
             logging.info(status_dict["msg"])
 
         # Check for staleness
-        for dep in component_run.dependencies:
+        self._add_staleness_messages([component_run], staleness_threshold)
+
+        # Dedup labels
+        for inp in component_run.inputs:
+            inp.dedup_labels()
+        for out in component_run.outputs:
+            out.dedup_labels()
+
+        # Commit to DB
+        self._save_code_snapshots([component_run])
+        self.session.add(component_run)
+        self.session.flush()
+        self._update_latest_outputs(
+            [
+                (component_run.id, out.name, out.value)
+                for out in component_run.outputs
+            ]
+        )
+        self._invalidate_flagged_lineage(
+            [component_run.id], [out.name for out in component_run.outputs]
+        )
+        logging.info(
+            f"Committing ComponentRun {component_run.id} of type "
+            + f'"{component_run.component_name}" to the database.'
+        )
+        self._commit()
+
+    def _save_code_snapshots(self, component_runs: typing.List[ComponentRun]):
+        """Inserts the code snapshots of component_runs that aren't known to
+        be in code_snapshots yet. Existing rows are left alone."""
+        known = _known_code_snapshots.get(self.engine, set())
+        snapshots = {}
+        for cr in component_runs:
+            code_snapshot = cr.__dict__.get("code_snapshot")
+            if code_snapshot and cr.code_snapshot_hash not in known:
+                snapshots[cr.code_snapshot_hash] = code_snapshot
+        if len(snapshots) == 0:
+            return
+
+        self.session.execute(
+            self._insert_ignore(code_snapshots),
+            [{"hash": h, "snapshot": s} for h, s in snapshots.items()],
+        )
+        self.session.info.setdefault("new_code_snapshots", set()).update(
+            snapshots
+        )
+
+    def _update_latest_outputs(
+        self, rows: typing.List[typing.Tuple[int, str, bytes]]
+    ):
+        """Records (component_run_id, name, hashed value) output writes in
+        component_runs_latest_outputs, keeping the highest run id per
+        name."""
+        latest = {}
+        for run_id, name, value in rows:
+            if name not in latest or latest[name][0] < run_id:
+                latest[name] = (run_id, value)
+
+        table = component_run_latest_outputs
+        for chunk in _chunks(list(latest.items())):
+            stmt = self._insert(table).values(
+                [
+                    {
+                        "output_path_name": name,
+                        "output_path_value": value,
+                        "component_run_id": run_id,
+                    }
+                    for name, (run_id, value) in chunk
+                ]
+            )
+            self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[table.c.output_path_name],
+                    set_={
+                        "output_path_value": stmt.excluded.output_path_value,
+                        "component_run_id": stmt.excluded.component_run_id,
+                    },
+                    where=table.c.component_run_id
+                    < stmt.excluded.component_run_id,
+                )
+            )
+
+    def _rebuild_latest_outputs(self, names: typing.Set[str]):
+        """Recomputes component_runs_latest_outputs rows for names from
+        component_runs_outputs, e.g. after their latest writer is
+        deleted."""
+        table = component_run_latest_outputs
+        for chunk in _chunks(list(names)):
+            self.session.execute(
+                table.delete().where(table.c.output_path_name.in_(chunk))
+            )
+            self._update_latest_outputs(
+                self.session.query(
+                    component_run_output_association.c.component_run_id,
+                    component_run_output_association.c.output_path_name,
+                    component_run_output_association.c.output_path_value,
+                )
+                .filter(
+                    component_run_output_association.c.output_path_name.in_(
+                        chunk
+                    )
+                )
+                .all()
+            )
+
+    def _add_staleness_messages(
+        self,
+        component_runs: typing.List[ComponentRun],
+        staleness_threshold: int,
+    ):
+        """Adds staleness messages to component runs whose dependencies are
+        old or have fresher runs, and warns the user about them."""
+        pairs = [
+            (component_run, dep)
+            for component_run in component_runs
+            for dep in component_run.dependencies
+        ]
+        fresher_counts = self._count_fresher_runs(pairs)
+
+        for (component_run, dep), num_fresher in zip(pairs, fresher_counts):
             # First case: there is over a month between component runs
             time_diff = (
                 component_run.start_timestamp - dep.start_timestamp
@@ -338,44 +918,331 @@ class Store(object):
             if time_diff > staleness_threshold:
                 days_diff = int(time_diff // (60 * 60 * 24))
                 component_run.add_staleness_message(
-                    f"{dep.component_name} (ID {dep.id}) was run {days_diff}"
-                    + " days ago."
+                    f"{dep.component_name} (ID {dep.id}) was run "
+                    + f"{days_diff} days ago."
                 )
             # Second case: there is a newer run of the dependency
-            fresher_runs = self.get_history(
-                dep.component_name,
-                limit=None,
-                date_lower=dep.start_timestamp,
-                date_upper=component_run.start_timestamp,
-            )
-            fresher_runs = [
-                cr for cr in fresher_runs if component_run.id != cr.id
-            ]
-            if len(fresher_runs) > 1:
-                run_or_runs = "run" if len(fresher_runs) - 1 == 1 else "runs"
+            if num_fresher > 0:
+                run_or_runs = "run" if num_fresher == 1 else "runs"
                 component_run.add_staleness_message(
                     f"{dep.component_name} (ID {dep.id}) has "
-                    + f"{len(fresher_runs) - 1} fresher {run_or_runs} that "
-                    + "began before this component run started."
+                    + f"{num_fresher} fresher {run_or_runs} "
+                    + "that began before this component run started."
                 )
 
         # Warn user if there is a staleness message
-        if len(component_run.stale) > 0:
-            logging.warning(component_run.stale)
+        for component_run in component_runs:
+            if len(component_run.stale) > 0:
+                logging.warning(component_run.stale)
+
+    def _count_fresher_runs(
+        self, pairs: typing.List[typing.Tuple[ComponentRun, ComponentRun]]
+    ) -> typing.List[int]:
+        """For each (component_run, dependency) pair, counts the runs of the
+        dependency's component other than the dependency itself that
+        started between the two, in one aggregate query per chunk."""
+        counts = [0] * len(pairs)
+        ts_type = ComponentRun.start_timestamp.type
+        with self.session.no_autoflush:
+            for chunk in _chunks(list(enumerate(pairs)), size=100):
+                bounds = [
+                    select(
+                        literal(idx).label("idx"),
+                        literal(dep.component_name).label("component_name"),
+                        literal(dep.start_timestamp, ts_type).label("lower"),
+                        literal(cr.start_timestamp, ts_type).label("upper"),
+                        literal(-1 if cr.id is None else cr.id).label(
+                            "run_id"
+                        ),
+                    )
+                    for idx, (cr, dep) in chunk
+                ]
+                bounds = (
+                    union_all(*bounds) if len(bounds) > 1 else bounds[0]
+                ).subquery()
+                res = (
+                    self.session.query(
+                        bounds.c.idx, func.count(ComponentRun.id)
+                    )
+                    .join(
+                        ComponentRun,
+                        and_(
+                            ComponentRun.component_name
+                            == bounds.c.component_name,
+                            ComponentRun.start_timestamp >= bounds.c.lower,
+                            ComponentRun.start_timestamp <= bounds.c.upper,
+                            ComponentRun.id != bounds.c.run_id,
+                        ),
+                    )
+                    .group_by(bounds.c.idx)
+                    .all()
+                )
+                for idx, count in res:
+                    # The dependency itself is in its own range
+                    counts[idx] = max(count - 1, 0)
 
-        # Dedup labels
-        for inp in component_run.inputs:
-            inp.dedup_labels()
-        for out in component_run.outputs:
-            out.dedup_labels()
+        return counts
+
+    def bulk_commit_component_runs(
+        self,
+        component_runs: typing.List[dict],
+        set_dependencies_from_inputs: bool = True,
+        staleness_threshold: int = (60 * 60 * 24 * 30),
+    ) -> typing.List[int]:
+        """Commits many component runs in one transaction. IOPointers,
+        components and dependencies are resolved with set-based queries
+        instead of once per run.
+
+        Each run is a dict with keys component_name, start_timestamp and
+        end_timestamp, and optionally notes, git_hash, git_tags,
+        code_snapshot, inputs and outputs (lists of (name, value,
+        pointer_type) tuples) and dependencies (component names). Runs may
+        depend on runs earlier in the list. Returns the new run ids."""
+        if len(component_runs) == 0:
+            return []
+
+        for run in component_runs:
+            for key in ["start_timestamp", "end_timestamp"]:
+                if run.get(key) is None:
+                    raise RuntimeError(
+                        f"{run['component_name']} ComponentRun has no "
+                        + f"{key.replace('_', ' ')}."
+                    )
+
+        # Hash values once, keyed by (name, hashed value). Runs are copied
+        # so the caller's dicts keep their values.
+        component_runs = [dict(run) for run in component_runs]
+        pointer_types = {}
+        for run in component_runs:
+            for key in ["inputs", "outputs"]:
+                pointers = run.get(key, [])
+                hvals = _hash_io_values(
+                    [name for name, _, _ in pointers],
+                    [value for _, value, _ in pointers],
+                )
+                run[key] = [
+                    (name, hval, pointer_type)
+                    for (name, _, pointer_type), hval in zip(pointers, hvals)
+                ]
+                for name, hval, pointer_type in run[key]:
+                    pointer_types.setdefault((name, hval), pointer_type)
+
+        with self.session.no_autoflush:
+            self._upsert_io_pointers(pointer_types)
+            self._bulk_create_components(
+                set([run["component_name"] for run in component_runs])
+            )
+
+            producers = (
+                self._get_latest_producers(
+                    set(
+                        [
+                            name
+                            for run in component_runs
+                            for name, _, _ in run["inputs"]
+                        ]
+                    )
+                )
+                if set_dependencies_from_inputs
+                else {}
+            )
+            latest_runs = self._get_latest_runs(
+                set(
+                    [
+                        dep
+                        for run in component_runs
+                        for dep in run.get("dependencies", [])
+                    ]
+                )
+            )
+
+            component_runs_sql = []
+            for run in component_runs:
+                component_run = ComponentRun(run["component_name"])
+                component_run.set_start_timestamp(run["start_timestamp"])
+                component_run.set_end_timestamp(run["end_timestamp"])
+                if run.get("notes"):
+                    component_run.add_notes(run["notes"])
+                component_run.set_git_hash(run.get("git_hash"))
+                component_run.set_git_tags(run.get("git_tags"))
+                component_run.set_code_snapshot(run.get("code_snapshot"))
+
+                dependencies = [
+                    producers[name]
+                    for name, _, _ in run["inputs"]
+                    if name in producers
+                ]
+                for dep in run.get("dependencies", []):
+                    if dep not in latest_runs:
+                        raise RuntimeError(
+                            f'Component with name "{dep}" has no runs.'
+                        )
+                    dependencies.append(latest_runs[dep])
+                component_run.dependencies = list(set(dependencies))
+
+                # Later runs in the list depend on this one
+                for name, _, _ in run["outputs"]:
+                    producers[name] = component_run
+                latest = latest_runs.get(component_run.component_name)
+                if (
+                    latest is None
+                    or latest.start_timestamp <= component_run.start_timestamp
+                ):
+                    latest_runs[component_run.component_name] = component_run
+
+                component_runs_sql.append(component_run)
+
+            self._save_code_snapshots(component_runs_sql)
+            self.session.add_all(component_runs_sql)
 
-        # Commit to DB
-        self.session.add(component_run)
         logging.info(
-            f"Committing ComponentRun {component_run.id} of type "
-            + f'"{component_run.component_name}" to the database.'
+            f"Committing {len(component_runs_sql)} ComponentRuns to the "
+            + "database."
+        )
+        self.session.flush()
+        self._link_io_pointers(
+            component_run_input_association,
+            "input",
+            [
+                (cr.id, name, hval)
+                for cr, run in zip(component_runs_sql, component_runs)
+                for name, hval, _ in run["inputs"]
+            ],
+        )
+        self._link_io_pointers(
+            component_run_output_association,
+            "output",
+            [
+                (cr.id, name, hval)
+                for cr, run in zip(component_runs_sql, component_runs)
+                for name, hval, _ in run["outputs"]
+            ],
+        )
+        self._update_latest_outputs(
+            [
+                (cr.id, name, hval)
+                for cr, run in zip(component_runs_sql, component_runs)
+                for name, hval, _ in run["outputs"]
+            ]
+        )
+        self._invalidate_flagged_lineage(
+            [cr.id for cr in component_runs_sql],
+            [name for run in component_runs for name, _, _ in run["outputs"]],
         )
-        self.session.commit()
+        for cr in component_runs_sql:
+            self.session.expire(cr, ["inputs", "outputs"])
+
+        self._add_staleness_messages(component_runs_sql, staleness_threshold)
+        ids = [cr.id for cr in component_runs_sql]
+        self._commit()
+        return ids
+
+    def _insert(self, table):
+        """Returns an INSERT for table in the engine's dialect, which
+        supports ON CONFLICT clauses."""
+        if self.engine.dialect.name == "postgresql":
+            return insert(table)
+        return sqlite_insert(table)
+
+    def _insert_ignore(self, table):
+        """Returns an INSERT for table that skips rows violating a unique
+        constraint."""
+        return self._insert(table).on_conflict_do_nothing()
+
+    def _link_io_pointers(
+        self,
+        table,
+        prefix: str,
+        rows: typing.List[typing.Tuple[int, str, bytes]],
+    ):
+        """Inserts (component_run_id, name, hashed value) rows into an
+        input or output association table, skipping rows that exist."""
+        rows = list(dict.fromkeys(rows))
+        for chunk in _chunks(rows):
+            self.session.execute(
+                self._insert_ignore(table),
+                [
+                    {
+                        "component_run_id": run_id,
+                        f"{prefix}_path_name": name,
+                        f"{prefix}_path_value": value,
+                    }
+                    for run_id, name, value in chunk
+                ],
+            )
+
+    def _bulk_create_components(self, names: typing.Set[str]):
+        """Creates components that do not exist yet, without tags."""
+        existing = set()
+        for chunk in _chunks(list(names)):
+            existing |= set(
+                [
+                    r[0]
+                    for r in self.session.query(Component.name)
+                    .filter(Component.name.in_(chunk))
+                    .all()
+                ]
+            )
+        self.session.add_all(
+            [
+                Component(name=name, description="", owner="", tags=[])
+                for name in names - existing
+            ]
+        )
+
+    def _get_latest_producers(
+        self, output_names: typing.Set[str]
+    ) -> typing.Dict[str, ComponentRun]:
+        """Returns the most recent ComponentRun that wrote each name."""
+        res = {}
+        for chunk in _chunks(list(output_names)):
+            res.update(
+                self.session.query(
+                    component_run_latest_outputs.c.output_path_name,
+                    ComponentRun,
+                )
+                .join(
+                    ComponentRun,
+                    component_run_latest_outputs.c.component_run_id
+                    == ComponentRun.id,
+                )
+                .filter(
+                    component_run_latest_outputs.c.output_path_name.in_(chunk)
+                )
+                .all()
+            )
+        return res
+
+    def _get_latest_runs(
+        self, component_names: typing.Set[str]
+    ) -> typing.Dict[str, ComponentRun]:
+        """Returns the most recent ComponentRun of each component."""
+        res = {}
+        for chunk in _chunks(list(component_names)):
+            latest = (
+                self.session.query(
+                    ComponentRun.component_name,
+                    func.max(ComponentRun.start_timestamp).label("ts"),
+                )
+                .filter(ComponentRun.component_name.in_(chunk))
+                .group_by(ComponentRun.component_name)
+                .subquery()
+            )
+            runs = (
+                self.session.query(ComponentRun)
+                .join(
+                    latest,
+                    and_(
+                        ComponentRun.component_name
+                        == latest.c.component_name,
+                        ComponentRun.start_timestamp == latest.c.ts,
+                    ),
+                )
+                .order_by(ComponentRun.id)
+                .all()
+            )
+            res.update({cr.component_name: cr for cr in runs})
+        return res
 
     def set_dependencies_from_inputs(self, component_run: ComponentRun):
         """Gets IOPointers associated with component_run's inputs, checks
@@ -387,25 +1254,18 @@ class Store(object):
         if len(input_ids) == 0:
             return
 
-        match_ids = (
-            self.session.query(
-                func.max(component_run_output_association.c.component_run_id),
+        matches = (
+            self.session.query(ComponentRun)
+            .join(
+                component_run_latest_outputs,
+                component_run_latest_outputs.c.component_run_id
+                == ComponentRun.id,
             )
-            .group_by(component_run_output_association.c.output_path_name)
             .filter(
-                component_run_output_association.c.output_path_name.in_(
-                    input_ids
-                )
+                component_run_latest_outputs.c.output_path_name.in_(input_ids)
             )
             .all()
         )
-        match_ids = [m[0] for m in match_ids]
-
-        matches = (
-            self.session.query(ComponentRun)
-            .filter(ComponentRun.id.in_(match_ids))
-            .all()
-        )
 
         # If there are no matches, return
         if len(matches) == 0:
@@ -414,103 +1274,222 @@ class Store(object):
         # Get match with the max timestamp and set upstream
         component_run.set_upstream(matches)
 
+    def _load_lineage(
+        self, root_ids: typing.List[int], profile: str = "default"
+    ) -> typing.Dict[int, ComponentRun]:
+        """Loads the given runs and all of their ancestors, with the columns
+        in profile. The ancestor ids are found with one recursive query
+        over component_run_dependencies, the runs and their io pointers
+        are loaded in bulk, and each run's dependencies are set from the
+        fetched edges so traversing them doesn't hit the db."""
+        deps = component_run_dependencies
+        edges = {}
+        for chunk in _chunks(list(set(root_ids))):
+            ancestors = (
+                select(ComponentRun.id.label("id"))
+                .where(ComponentRun.id.in_(chunk))
+                .cte("ancestors", recursive=True)
+            )
+            # UNION (not UNION ALL) visits each run once, even in cycles
+            ancestors = ancestors.union(
+                select(deps.c.depends_on_component_run_id).where(
+                    deps.c.component_run_id == ancestors.c.id
+                )
+            )
+            res = self.session.execute(
+                select(ancestors.c.id, deps.c.depends_on_component_run_id)
+                .select_from(ancestors)
+                .outerjoin(deps, deps.c.component_run_id == ancestors.c.id)
+            ).all()
+            for run_id, dep_id in res:
+                edges.setdefault(run_id, set())
+                if dep_id is not None:
+                    edges[run_id].add(dep_id)
+
+        runs = {}
+        for chunk in _chunks(list(edges.keys())):
+            runs.update(
+                {
+                    cr.id: cr
+                    for cr in self.session.query(ComponentRun)
+                    .options(
+                        *_run_load_options(profile),
+                        selectinload(ComponentRun.inputs).lazyload("*"),
+                        selectinload(ComponentRun.outputs).lazyload("*"),
+                    )
+                    .filter(ComponentRun.id.in_(chunk))
+                    .all()
+                }
+            )
+
+        for run_id, cr in runs.items():
+            set_committed_value(
+                cr,
+                "dependencies",
+                [runs[dep_id] for dep_id in sorted(edges[run_id])],
+            )
+
+        return runs
+
     def _traverse(
         self,
         node: ComponentRun,
         depth: int,
         node_list: typing.List[ComponentRun],
     ):
-        # Add node to node_list as the step
-        node_list.append((depth, node))
-
-        # Base case
-        if len(node.dependencies) == 0:
-            return
-
-        # Recurse on neighbors
-        for neighbor in node.dependencies:
-            self._traverse(neighbor, depth + 1, node_list)
+        """Appends (depth, run) for node and its ancestors in depth-first
+        order. Iterative, so long chains don't hit the recursion limit."""
+        stack = [(depth, node)]
+        while len(stack) > 0:
+            depth, node = stack.pop()
+            node_list.append((depth, node))
+            stack.extend(
+                [(depth + 1, dep) for dep in reversed(node.dependencies)]
+            )
 
     def _web_trace_helper(self, component_run_object: ComponentRun):
         """Helper function that populates the dictionary of ComponentRuns for
         the web trace. Returns dictionary and counter."""
-        res = {}
-        res["id"] = f"componentrun_{component_run_object.id}"
-        res["label"] = component_run_object.component_name
-        res["hasCaret"] = True
-        res["isExpanded"] = True
-        res["stale"] = component_run_object.stale
-        res["childNodes"] = []
-
-        for out in sorted(component_run_object.outputs, key=lambda x: x.name):
-            out_dict = {
-                "id": f"iopointer_{out.name}",
-                "label": out.name,
-                "hasCaret": False,
-                "parent": res["id"],
-            }
-
-            # Settle on icon
-            if out.pointer_type == PointerTypeEnum.DATA:
-                out_dict["icon"] = "database"
-            elif out.pointer_type == PointerTypeEnum.MODEL:
-                out_dict["icon"] = "function"
-            elif out.pointer_type == PointerTypeEnum.ENDPOINT:
-                out_dict["icon"] = "flow-end"
-
-            res["childNodes"].append(out_dict)
-
-        for dep in sorted(
-            component_run_object.dependencies, key=lambda x: x.id
-        ):
-            child_res = self._web_trace_helper(dep)
-            res["childNodes"].append(child_res)
+        root = None
+        stack = [(component_run_object, None)]
+        while len(stack) > 0:
+            component_run_object, parent = stack.pop()
+            res = self._web_trace_node(component_run_object)
+            if parent is None:
+                root = res
+            else:
+                parent["childNodes"].append(res)
 
-        return res
+            deps = sorted(
+                component_run_object.dependencies, key=lambda x: x.id
+            )
+            stack.extend([(dep, res) for dep in reversed(deps)])
 
-    def web_trace(self, output_id: str, last_only: bool = False):
-        """Prints list of ComponentRuns to display in the UI."""
-        component_run_objects = (
-            self.session.query(ComponentRun)
+        return root
+
+    def _web_trace_node(self, component_run_object: ComponentRun):
+        """Returns the web trace dictionary of a ComponentRun and its
+        outputs, without its dependencies."""
+        return _web_trace_node(
+            component_run_object.id,
+            component_run_object.component_name,
+            component_run_object.stale,
+            [
+                (out.name, out.pointer_type)
+                for out in component_run_object.outputs
+            ],
+        )
+
+    def _get_web_trace_roots(
+        self, output_id: str, last_only: bool
+    ) -> typing.List[int]:
+        """Returns the ids of the runs that wrote output_id, most recent
+        first."""
+        root_ids = [
+            r[0]
+            for r in self.session.query(ComponentRun.id)
             .outerjoin(IOPointer, ComponentRun.outputs)
             .order_by(ComponentRun.start_timestamp.desc())
             .filter(IOPointer.name == output_id)
             .all()
-        )
+        ]
 
-        if len(component_run_objects) == 0:
+        if len(root_ids) == 0:
             raise RuntimeError(f"ID {output_id} does not exist.")
 
         if last_only:
-            component_run_objects = [component_run_objects[0]]
+            root_ids = [root_ids[0]]
 
-        return [self._web_trace_helper(cr) for cr in component_run_objects]
+        return root_ids
 
-    def trace(self, output_id: str):
+    def web_trace(self, output_id: str, last_only: bool = False):
+        """Prints list of ComponentRuns to display in the UI."""
+        root_ids = self._get_web_trace_roots(output_id, last_only)
+        runs = self._load_lineage(root_ids, "summary")
+        return [self._web_trace_helper(runs[run_id]) for run_id in root_ids]
+
+    def web_trace_dag(self, output_id: str, last_only: bool = False) -> dict:
+        """Returns the trace of output_id as a graph, with each
+        ComponentRun listed once no matter how many paths lead to it.
+        The result has keys roots (ids of the runs that wrote output_id),
+        nodes (web_trace dictionaries of every run in the lineage, with
+        their outputs but without dependencies) and edges ([run id,
+        dependency id] pairs)."""
+        root_ids = self._get_web_trace_roots(output_id, last_only)
+        runs = self._load_lineage(root_ids, "summary")
+        runs = sorted(runs.values(), key=lambda x: x.id)
+        return {
+            "roots": [f"componentrun_{run_id}" for run_id in root_ids],
+            "nodes": [self._web_trace_node(cr) for cr in runs],
+            "edges": [
+                [f"componentrun_{cr.id}", f"componentrun_{dep.id}"]
+                for cr in runs
+                for dep in cr.dependencies
+            ],
+        }
+
+    def trace(self, output_id: str, profile: str = "default"):
         """Prints trace for an output id.
         Returns list of tuples (level, ComponentRun) where level is how
         many hops away the node is from the node that produced the
-        output_id."""
+        output_id. Columns are loaded according to profile."""
         if not isinstance(output_id, str):
             raise RuntimeError("Please specify an output id of string type.")
 
-        component_run_object = (
-            self.session.query(ComponentRun)
+        root = (
+            self.session.query(ComponentRun.id)
             .outerjoin(IOPointer, ComponentRun.outputs)
             .order_by(ComponentRun.start_timestamp.desc())
             .filter(IOPointer.name == output_id)
             .first()
         )
 
-        if component_run_object is None:
+        if root is None:
             raise RuntimeError(f"ID {output_id} does not exist.")
 
+        runs = self._load_lineage([root.id], profile)
+
         node_list = []
-        self._traverse(component_run_object, 0, node_list)
+        self._traverse(runs[root.id], 0, node_list)
         return node_list
 
-    def trace_batch(self, output_ids: typing.List[str]):
-        pass
+    def trace_batch(
+        self, output_ids: typing.List[str], profile: str = "default"
+    ) -> typing.Dict[str, typing.List[typing.Tuple[int, ComponentRun]]]:
+        """Traces many output ids at once. Returns a dictionary from output
+        id to the list of tuples (level, ComponentRun) that trace would
+        return. The producing runs are found in one query per chunk of
+        ids, the union of their lineage is loaded once, and outputs with
+        the same producing run share its trace list and run objects."""
+        if not all([isinstance(output_id, str) for output_id in output_ids]):
+            raise RuntimeError("Please specify output ids of string type.")
+
+        producers = self._get_producers(set(output_ids))
+        missing = [o for o in output_ids if o not in producers]
+        if len(missing) > 0:
+            raise RuntimeError(f"IDs {missing} do not exist.")
+
+        runs = self._load_lineage(list(producers.values()), profile)
+        traces = {}
+        for run_id in set(producers.values()):
+            traces[run_id] = []
+            self._traverse(runs[run_id], 0, traces[run_id])
+
+        return {
+            output_id: traces[producers[output_id]]
+            for output_id in output_ids
+        }
+
+    def _get_producers(
+        self, output_ids: typing.Set[str]
+    ) -> typing.Dict[str, int]:
+        """Returns the id of the most recently started ComponentRun that
+        wrote each output id, like trace."""
+        res = {}
+        for chunk in _chunks(list(output_ids)):
+            res.update(dict(self.session.execute(_producers(chunk)).all()))
+
+        return res
 
     def get_history(
         self,
@@ -518,53 +1497,284 @@ class Store(object):
         limit: int = 10,
         date_lower: typing.Union[datetime, str] = datetime.min,
         date_upper: typing.Union[datetime, str] = datetime.max,
+        last_run_id: int = None,
+        profile: str = "default",
     ) -> typing.List[ComponentRun]:
-        """Gets lineage for the component, or a history of all its runs."""
-        history = (
+        """Gets lineage for the component, or a history of all its runs,
+        newest first. Pass the id of the last run of a page as last_run_id
+        to get the next page. Columns are loaded according to profile
+        ("summary", "default" or "full"); only "full" loads code
+        snapshots."""
+        return self._history_query(
+            self.session.query(ComponentRun).options(
+                *_run_load_options(profile)
+            ),
+            component_name,
+            limit,
+            date_lower,
+            date_upper,
+            last_run_id,
+        ).all()
+
+    def get_history_rows(
+        self,
+        component_name: str,
+        limit: int = 10,
+        date_lower: typing.Union[datetime, str] = datetime.min,
+        date_upper: typing.Union[datetime, str] = datetime.max,
+        last_run_id: int = None,
+        profile: str = "default",
+    ) -> typing.List[sqlalchemy.engine.Row]:
+        """Like get_history, but selects the ComponentRun columns in profile
+        as rows instead of loading ORM objects."""
+        return self._history_query(
+            self.session.query(*_run_columns(profile)),
+            component_name,
+            limit,
+            date_lower,
+            date_upper,
+            last_run_id,
+        ).all()
+
+    def _history_query(
+        self,
+        query: sqlalchemy.orm.Query,
+        component_name: str,
+        limit: int,
+        date_lower: typing.Union[datetime, str],
+        date_upper: typing.Union[datetime, str],
+        last_run_id: int,
+    ) -> sqlalchemy.orm.Query:
+        history = query.filter(
+            ComponentRun.component_name == component_name
+        ).filter(
+            and_(
+                ComponentRun.start_timestamp >= date_lower,
+                ComponentRun.start_timestamp <= date_upper,
+            )
+        )
+        if last_run_id:
+            history = history.filter(_after_run(last_run_id))
+
+        return history.order_by(*_run_order()).limit(limit)
+
+    def get_component_runs_page(
+        self,
+        component_name: str,
+        limit: int = 100,
+        last_run_id: int = None,
+        descending: bool = False,
+        profile: str = "default",
+    ) -> typing.List[ComponentRun]:
+        """Returns up to limit runs of the component that come after
+        last_run_id, oldest first unless descending is set. Pages are
+        found with the (start_timestamp, id) index instead of an OFFSET, so
+        deep pages are as cheap as the first one."""
+        runs = (
             self.session.query(ComponentRun)
+            .options(*_run_load_options(profile))
             .filter(ComponentRun.component_name == component_name)
-            .filter(
-                and_(
-                    ComponentRun.start_timestamp >= date_lower,
-                    ComponentRun.start_timestamp <= date_upper,
-                )
-            )
-            .order_by(ComponentRun.start_timestamp.desc())
-            .limit(limit)
-            .all()
         )
+        if last_run_id:
+            runs = runs.filter(_after_run(last_run_id, descending))
 
-        return history
+        return runs.order_by(*_run_order(descending)).limit(limit).all()
+
+    def find_component_runs(
+        self,
+        component_name: str = None,
+        stale: bool = None,
+        git_tag: str = None,
+        mlflow_params: typing.Dict[str, typing.Any] = None,
+        mlflow_metrics: typing.List[typing.Tuple[str, str, float]] = None,
+        limit: int = 100,
+        last_run_id: int = None,
+        profile: str = "default",
+    ) -> typing.List[ComponentRun]:
+        """Returns up to limit runs, newest first, that match all of the
+        given filters. Filters are applied in SQL:
+
+        stale: runs with (True) or without (False) staleness messages.
+        git_tag: runs whose git tags include git_tag.
+        mlflow_params: runs with all of these mlflow params.
+        mlflow_metrics: (name, op, value) tuples like ("val_auc", "<", 0.8),
+            where op is one of <, <=, >, >=, == or !=.
+
+        Pass the id of the last run of a page as last_run_id to get the
+        next page."""
+        return self._find_query(
+            self.session.query(ComponentRun).options(
+                *_run_load_options(profile)
+            ),
+            component_name,
+            stale,
+            git_tag,
+            mlflow_params,
+            mlflow_metrics,
+            limit,
+            last_run_id,
+        ).all()
+
+    def find_component_run_rows(
+        self,
+        component_name: str = None,
+        stale: bool = None,
+        git_tag: str = None,
+        mlflow_params: typing.Dict[str, typing.Any] = None,
+        mlflow_metrics: typing.List[typing.Tuple[str, str, float]] = None,
+        limit: int = 100,
+        last_run_id: int = None,
+        profile: str = "default",
+    ) -> typing.List[sqlalchemy.engine.Row]:
+        """Like find_component_runs, but selects the ComponentRun columns in
+        profile as rows instead of loading ORM objects."""
+        return self._find_query(
+            self.session.query(*_run_columns(profile)),
+            component_name,
+            stale,
+            git_tag,
+            mlflow_params,
+            mlflow_metrics,
+            limit,
+            last_run_id,
+        ).all()
+
+    def _find_query(
+        self,
+        query: sqlalchemy.orm.Query,
+        component_name: str,
+        stale: bool,
+        git_tag: str,
+        mlflow_params: typing.Dict[str, typing.Any],
+        mlflow_metrics: typing.List[typing.Tuple[str, str, float]],
+        limit: int,
+        last_run_id: int,
+    ) -> sqlalchemy.orm.Query:
+        filters = _run_filters(
+            self.engine.dialect.name,
+            stale,
+            git_tag,
+            mlflow_params,
+            mlflow_metrics,
+        )
+        if component_name:
+            filters.append(ComponentRun.component_name == component_name)
+        if last_run_id:
+            filters.append(_after_run(last_run_id))
+
+        return query.filter(*filters).order_by(*_run_order()).limit(limit)
 
     def get_component_runs_by_index(
         self,
         component_name: str,
         first_idx: int,
         last_idx: int,
+        profile: str = "default",
+        anchor: typing.Tuple[int, int] = None,
     ) -> typing.List[ComponentRun]:
-        """Gets lineage for the component, or a history of all its runs."""
-
-        if first_idx < 0 or last_idx < 0:
-            total_length = self.get_component_runs_count(component_name)
-            if first_idx < 0:
-                first_idx = first_idx + total_length
-            if last_idx < 0:
-                last_idx = last_idx + total_length
-
-        history = (
+        """Gets runs first_idx to last_idx (exclusive) of the component,
+        oldest first. Negative indexes count from the newest run, and a
+        last_idx of 0 after a negative first_idx means up to the newest
+        run.
+
+        The slice is read with (start_timestamp, id) keyset seeks, without
+        a COUNT. Its bounds are found by walking the run index from the
+        nearest known position: anchor, an (index, run id) pair such as
+        the first run of a cached page, if it counts from the same end as
+        the bound, and otherwise the oldest or newest run. Only the runs
+        between that position and the bound are read."""
+        runs = (
             self.session.query(ComponentRun)
+            .options(*_run_load_options(profile))
             .filter(ComponentRun.component_name == component_name)
-            .order_by(ComponentRun.start_timestamp)
-            .offset(first_idx)
-            .limit(last_idx - first_idx)
-            .all()
         )
-        return history
+        key = Tuple(ComponentRun.start_timestamp, ComponentRun.id)
+
+        # Slices that don't reach past the end of the history are a seek
+        # to their first run and a LIMIT
+        if first_idx >= 0 and last_idx >= 0:
+            limit = last_idx - first_idx
+        elif first_idx < 0 and last_idx <= 0:
+            limit = (last_idx or 0) - first_idx
+        else:
+            limit = None
+        if limit is not None and limit <= 0:
+            return []
+
+        lower = self._get_run_key_at(component_name, first_idx, anchor)
+        if lower is None and first_idx >= 0:
+            return []
+        if lower is not None:
+            runs = runs.filter(key >= Tuple(*lower))
+            if limit is not None:
+                return (
+                    runs.order_by(*_run_order(descending=False))
+                    .limit(limit)
+                    .all()
+                )
+
+        # Otherwise the slice ends at the run at last_idx. Bounds past the
+        # oldest run clamp to it, like list slices.
+        if last_idx != 0:
+            upper = self._get_run_key_at(component_name, last_idx, anchor)
+            if upper is None and last_idx < 0:
+                return []
+            if upper is not None:
+                runs = runs.filter(key < Tuple(*upper))
+        return runs.order_by(*_run_order(descending=False)).all()
+
+    def _get_run_key_at(
+        self,
+        component_name: str,
+        idx: int,
+        anchor: typing.Tuple[int, int] = None,
+    ) -> typing.Optional[typing.Tuple[datetime, int]]:
+        """Returns (start_timestamp, id) of the run at index idx of the
+        component's history, or None if there is no such run. See
+        get_component_runs_by_index for anchor."""
+        query = self.session.query(
+            ComponentRun.start_timestamp, ComponentRun.id
+        ).filter(ComponentRun.component_name == component_name)
+
+        if anchor is not None and (anchor[0] < 0) == (idx < 0):
+            anchor_idx, anchor_id = anchor
+            if idx == anchor_idx:
+                query = query.filter(ComponentRun.id == anchor_id)
+                steps = 0
+            else:
+                # Walk away from the anchor towards idx
+                descending = idx < anchor_idx
+                query = query.filter(
+                    _after_run(anchor_id, descending=descending)
+                ).order_by(*_run_order(descending=descending))
+                steps = abs(idx - anchor_idx) - 1
+        elif idx >= 0:
+            query = query.order_by(*_run_order(descending=False))
+            steps = idx
+        else:
+            query = query.order_by(*_run_order())
+            steps = -idx - 1
+
+        row = query.offset(steps).first()
+        return tuple(row) if row else None
 
     def get_component_runs_count(self, component_name: str):
         return self.session.query(ComponentRun)\
             .filter(ComponentRun.component_name == component_name).count()
 
+    def get_newest_component_run_key(
+        self, component_name: str
+    ) -> typing.Optional[typing.Tuple[datetime, int]]:
+        """Returns (start_timestamp, id) of the component's newest run, or
+        None if it has no runs. Reads one entry of the run index."""
+        newest = (
+            self.session.query(ComponentRun.start_timestamp, ComponentRun.id)
+            .filter(ComponentRun.component_name == component_name)
+            .order_by(*_run_order())
+            .first()
+        )
+        return tuple(newest) if newest else None
+
     def get_components(self, tag: str = "", owner: str = ""):
         """Returns a list of all the components associated with the specified
         owner and/or tags."""
@@ -604,49 +1814,20 @@ class Store(object):
 
     def get_recent_run_ids(
         self, limit: int = 50, last_run_id=None
-    ) -> typing.List[str]:
-        """Returns a list of recent component run IDs."""
-
+    ) -> typing.List[int]:
+        """Returns a list of recent component run IDs, newest first. Pass
+        the last id of a page as last_run_id to get the next page."""
+        query = self.session.query(ComponentRun.id)
         if last_run_id:
-            # Get start timestamp of last run id
-            ts = (
-                self.session.query(ComponentRun)
-                .filter(ComponentRun.id == last_run_id)
-                .first()
-            ).start_timestamp
-            if not ts:
-                raise RuntimeError(
-                    f"Last run ID {last_run_id} does not exist."
-                )
+            query = query.filter(_after_run(last_run_id))
+        runs = [
+            int(r[0]) for r in query.order_by(*_run_order()).limit(limit)
+        ]
 
-            # Return list of runs after ts
-            runs = list(
-                map(
-                    lambda x: int(x[0]),
-                    self.session.query(ComponentRun.id)
-                    .order_by(ComponentRun.start_timestamp.desc())
-                    .filter(
-                        and_(
-                            ComponentRun.start_timestamp <= ts,
-                            ComponentRun.id != last_run_id,
-                        )
-                    )
-                    .limit(limit)
-                    .all(),
-                )
-            )
-
-            return runs
-
-        runs = list(
-            map(
-                lambda x: int(x[0]),
-                self.session.query(ComponentRun.id)
-                .order_by(ComponentRun.start_timestamp.desc())
-                .limit(limit)
-                .all(),
-            )
-        )
+        if len(runs) == 0 and last_run_id and not self.get_component_run(
+            last_run_id
+        ):
+            raise RuntimeError(f"Last run ID {last_run_id} does not exist.")
 
         return runs
 
@@ -662,7 +1843,7 @@ class Store(object):
             )
 
         component_run.add_notes(notes)
-        self.session.commit()
+        self._commit()
         return component_run.notes
 
     def set_io_pointer_flag(self, output_id: str, value: bool):
@@ -676,7 +1857,12 @@ class Store(object):
             else:
                 iop.clear_flag()
 
-            self.session.commit()
+            self.session.flush()
+            if value:
+                self._cache_flagged_lineage([output_id])
+            else:
+                self._uncache_flagged_lineage([output_id])
+            self._commit()
 
             return value
 
@@ -686,39 +1872,137 @@ class Store(object):
             )
 
     def review_flagged_outputs(
-        self,
+        self, limit: int = None, profile: str = "default"
     ) -> typing.Tuple[
         typing.List[str], typing.List[typing.Tuple[ComponentRun, int]]
     ]:
-        """Finds common ComponentRuns for a group of flagged outputs."""
-        # Collate flagged outputs
-        flagged_iops = (
-            self.session.query(IOPointer)
+        """Finds common ComponentRuns for a group of flagged outputs.
+        Returns the flagged output ids and up to limit (ComponentRun,
+        count) tuples, where count is the number of flagged outputs whose
+        lineage contains the run, sorted by descending count and id. Counts
+        come from the flagged_output_lineage table, which is filled in for
+        any flagged outputs it is missing or that were written since it was
+        filled in. Columns of the runs are loaded according to profile."""
+        flagged_output_ids = [
+            r[0]
+            for r in self.session.query(IOPointer.name)
             .filter(IOPointer.flag.is_(True))
             .all()
+        ]
+        flagged = set(flagged_output_ids)
+
+        cached = set(
+            [
+                r[0]
+                for r in self.session.query(
+                    flagged_output_lineage_outputs.c.output_name
+                ).all()
+            ]
         )
-        flagged_output_ids = [iop.name for iop in flagged_iops]
-
-        # Perform traces for each output id
-        traces = [self.trace(output_id) for output_id in flagged_output_ids]
-        traces = [list(set([node for _, node in trace])) for trace in traces]
-
-        # Sort traces by ComponentRun count & id, descending
-        trace_nodes_counts = {}
-        for trace in traces:
-            for node in trace:
-                if node not in trace_nodes_counts:
-                    trace_nodes_counts[node] = 0
-                trace_nodes_counts[node] += 1
-
-        trace_nodes_counts = sorted(
-            trace_nodes_counts.items(),
-            key=lambda item: (-item[1], -item[0].id),
-        )
+        if len(flagged - cached) > 0:
+            self._cache_flagged_lineage(list(flagged - cached))
+            self._commit()
+
+        count = func.count().label("count")
+        counts = self.session.execute(
+            select(flagged_output_lineage.c.component_run_id, count)
+            .where(
+                flagged_output_lineage.c.output_name.in_(
+                    select(IOPointer.name).where(IOPointer.flag.is_(True))
+                )
+            )
+            .group_by(flagged_output_lineage.c.component_run_id)
+            .order_by(
+                count.desc(), flagged_output_lineage.c.component_run_id.desc()
+            )
+            .limit(limit)
+        ).all()
+
+        runs = {}
+        for chunk in _chunks([run_id for run_id, _ in counts]):
+            runs.update(
+                {
+                    cr.id: cr
+                    for cr in self.session.query(ComponentRun)
+                    .options(*_run_load_options(profile))
+                    .filter(ComponentRun.id.in_(chunk))
+                    .all()
+                }
+            )
 
-        # Return a list of the ComponentRuns in the order
+        trace_nodes_counts = [(runs[run_id], c) for run_id, c in counts]
         return flagged_output_ids, trace_nodes_counts
 
+    def _cache_flagged_lineage(self, output_ids: typing.List[str]):
+        """Stores the lineage of flagged output ids in
+        flagged_output_lineage, replacing any previous rows for them, and
+        marks them as cached, even if no run wrote them."""
+        self._delete_flagged_lineage(output_ids)
+        for chunk in _chunks(output_ids):
+            self.session.execute(
+                flagged_output_lineage.insert().from_select(
+                    ["output_name", "component_run_id"],
+                    _ancestors(_producers(chunk)),
+                )
+            )
+            self.session.execute(
+                flagged_output_lineage_outputs.insert(),
+                [{"output_name": name} for name in chunk],
+            )
+
+    def _delete_flagged_lineage(self, output_ids: typing.List[str]):
+        """Deletes the cached lineage of output ids, if there is any."""
+        for chunk in _chunks(output_ids):
+            for table in [
+                flagged_output_lineage_outputs,
+                flagged_output_lineage,
+            ]:
+                self.session.execute(
+                    table.delete().where(table.c.output_name.in_(chunk))
+                )
+
+    def _invalidate_flagged_lineage(
+        self, run_ids: typing.List[int], output_ids: typing.List[str]
+    ):
+        """Drops the cached lineage of flagged outputs that runs run_ids
+        wrote (output_ids) or whose lineage already contains one of the
+        runs, so the next review recomputes it with the new runs."""
+        stale = set(output_ids)
+        for chunk in _chunks(run_ids):
+            stale.update(
+                [
+                    r[0]
+                    for r in self.session.execute(
+                        select(flagged_output_lineage.c.output_name)
+                        .where(
+                            flagged_output_lineage.c.component_run_id.in_(
+                                chunk
+                            )
+                        )
+                        .distinct()
+                    )
+                ]
+            )
+        self._delete_flagged_lineage(list(stale))
+
+    def _uncache_flagged_lineage(self, output_ids: typing.List[str]):
+        """Removes the lineage of output ids from flagged_output_lineage
+        unless an IOPointer with the same name is still flagged."""
+        still_flagged = select(IOPointer.name).where(IOPointer.flag.is_(True))
+        for chunk in _chunks(output_ids):
+            for table in [
+                flagged_output_lineage_outputs,
+                flagged_output_lineage,
+            ]:
+                self.session.execute(
+                    table.delete().where(
+                        and_(
+                            table.c.output_name.in_(chunk),
+                            table.c.output_name.notin_(still_flagged),
+                        )
+                    )
+                )
+
     def get_tags(self) -> typing.List[Tag]:
         return self.session.query(Tag).all()
 
@@ -735,17 +2019,31 @@ class Store(object):
         # Create label vector
         label_vec = self.get_labels(labels) if labels else None
 
+        # Args are independent, so they are hashed in parallel
+        hvals = _hash_values(list(args_filtered.values()))
+
         io_pointers = []
-        # Hash each arg and see if the corresponding IOPointer exists
-        for key, value in args_filtered.items():
-            hval = _hash_value(value)
+        # See if the IOPointer of each hashed arg exists
+        for (key, value), hval in zip(args_filtered.items(), hvals):
+            # Saved args are identified by the contents of their files,
+            # like mltrace.load identifies them. Stored copies of exact
+            # values are found by fingerprint; other values are saved to
+            # find the contents of theirs.
+            pathname = None
+            fval = _stored_artifact_value(value, hval)
+            if fval is None:
+                pathname = _save(
+                    value, var_name=key, from_client=False, digest=hval
+                )
+                fval = _saved_artifact_value(pathname)
+
             same_name_res = (
                 self.session.query(
                     component_run_output_association.c.output_path_name
                 )
                 .filter(
                     component_run_output_association.c.output_path_value
-                    == hval
+                    == fval
                 )
                 .order_by(
                     component_run_output_association.c.component_run_id.desc()
@@ -759,34 +2057,36 @@ class Store(object):
                     .filter(
                         and_(
                             IOPointer.name == same_name_res[0],
-                            IOPointer.value == hval,
+                            IOPointer.value == fval,
                         )
                     )
-                    .all()
+                    .first()
                 )
-                if label_vec:
-                    res[0].add_labels(label_vec)
-                io_pointers.append(res[0])
-                continue
-
-            # See if IOPointer exists but not in output table
-            res = (
-                self.session.query(IOPointer)
-                .filter(
-                    IOPointer.value == hval,
+            else:
+                # See if IOPointer exists but not in output table
+                res = (
+                    self.session.query(IOPointer)
+                    .filter(
+                        IOPointer.value == fval,
+                    )
+                    .first()
                 )
-                .first()
-            )
 
             if res:
+                # The existing name refers to the same contents
+                if pathname is not None:
+                    os.remove(pathname)
                 if label_vec:
                     res.add_labels(label_vec)
                 io_pointers.append(res)
                 continue
 
-            # Save artifact and create new IOPointer
-            pathname = _save(value, var_name=key, from_client=False)
-            iop = self.get_io_pointer(pathname, value, labels=labels)
+            # Link the stored copy and create new IOPointer
+            if pathname is None:
+                pathname = _save(
+                    value, var_name=key, from_client=False, digest=hval
+                )
+            iop = self._get_io_pointer(pathname, fval, None, True, labels)
             io_pointers.append(iop)
 
         return io_pointers
@@ -798,7 +2098,7 @@ class Store(object):
         if not res:
             label = Label(id=label_id)
             self.session.add(label)
-            self.session.commit()
+            self._commit()
             return label
 
         return res
@@ -811,7 +2111,7 @@ class Store(object):
         if len(need_to_add) > 0:
             labels = [Label(id=label_id) for label_id in need_to_add]
             self.session.add_all(labels)
-            self.session.commit()
+            self._commit()
             return res + labels
 
         return res
@@ -861,7 +2161,7 @@ class Store(object):
         for out in outputs:
             out.add_labels(all_labels)
             self.session.add(out)
-        self.session.commit()
+        self._commit()
 
     def delete_label(self, label_id: str):
         stmt = insert(deleted_labels).values(
@@ -872,7 +2172,7 @@ class Store(object):
         )
         try:
             self.session.execute(stmt)
-            self.session.commit()
+            self._commit()
         except Exception as e:
             if type(e) == sqlalchemy.exc.IntegrityError:
                 raise RuntimeError(f"Label {label_id} does not exist.")
@@ -889,7 +2189,7 @@ class Store(object):
             constraint=deleted_labels.primary_key,
         )
         self.session.execute(stmt)
-        self.session.commit()
+        self._commit()
 
     def retrieve_deleted_labels(self):
         return self.session.query(deleted_labels).all()
@@ -921,7 +2221,7 @@ class Store(object):
             value=val,
         )
         self.session.execute(stmt)
-        self.session.commit()
+        self._commit()
 
     def log_outputs(
         self,
@@ -946,7 +2246,7 @@ class Store(object):
         )
 
         self.session.execute(stmt)
-        self.session.commit()
+        self._commit()
 
     def log_feedback(
         self,
@@ -965,7 +2265,7 @@ class Store(object):
             value=val,
         )
         self.session.execute(stmt)
-        self.session.commit()
+        self._commit()
 
     def log_feedbacks(
         self,
@@ -990,7 +2290,7 @@ class Store(object):
         )
 
         self.session.execute(stmt)
-        self.session.commit()
+        self._commit()
 
     def get_outputs_or_feedback(
         self,
@@ -1127,7 +2427,7 @@ class Store(object):
         self.session.execute(trigger_fn)
         self.session.execute(trigger_stmt)
 
-        self.session.commit()
+        self._commit()
 
     def compute_metric_from_view(
         self,
@@ -1,6 +1,13 @@
+from alembic.runtime.migration import MigrationContext
 from mltrace.db.base import Base
+from mltrace.db.fingerprint import (
+    _fingerprint,
+    _fingerprint_many,
+    _hash_file,
+    _is_exact,
+)
 from mltrace.db.models import ComponentRun, PointerTypeEnum
-from sqlalchemy import create_engine
+from sqlalchemy import Column, String, create_engine, inspect as sa_inspect
 from sqlalchemy.engine.reflection import Inspector
 from sqlalchemy.schema import (
     DropConstraint,
@@ -10,27 +17,69 @@ from sqlalchemy.schema import (
     ForeignKeyConstraint,
 )
 
-import hashlib
+import concurrent.futures
+import functools
 import inspect
 import joblib
+import logging
 import os
 import pandas as pd
+import pathlib
 import random
+import shutil
 import sqlalchemy
 import string
 import sys
+import threading
 import time
+import types
 import typing
+import uuid
+
+# Process-wide engine registry, keyed by URI. Engines own connection pools,
+# so every Store pointed at the same database shares one pool.
+_engines = {}
+_async_engines = {}
+_engines_lock = threading.Lock()
+_pool_config = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 3600,
+}
+
+# Alembic revision the models correspond to. Keep in sync with the head of
+# mltrace/db/migrations/versions.
+_SCHEMA_REVISION = "d7e2b9a4c615"
+
+# Revision of databases created before migrations were tracked
+_BASE_REVISION = "52750448d2da"
+
+# URIs whose schema has already been verified by this process
+_verified_uris = set()
+_verified_uris_lock = threading.Lock()
+
+# Background writer for mltrace.save, if async artifact writes are enabled
+_artifact_writer = None
+
+# Defaults for mltrace.save and mltrace.load. compress is one of the joblib
+# codecs below, or None to write uncompressed files.
+_COMPRESSION_CODECS = ("zlib", "gzip", "bz2", "lzma", "xz", "lz4")
+_artifact_config = {
+    "compress": None,
+    "compress_level": 3,
+    "mmap_mode": None,
+}
 
 
 def _create_engine_wrapper(
-    uri: str, max_retries=5
+    uri: str, max_retries=5, **engine_kwargs
 ) -> sqlalchemy.engine.base.Engine:
     """Creates engine using sqlalchemy API. Includes max retries parameter."""
     retries = 0
     while retries < max_retries:
         try:
-            engine = create_engine(uri)
+            engine = create_engine(uri, **engine_kwargs)
             return engine
         except Exception as e:
             print(f"DB could not be created with exception {e}. Trying again.")
@@ -38,9 +87,158 @@ def _create_engine_wrapper(
     raise RuntimeError("Max retries hit.")
 
 
+def _get_engine(uri: str) -> sqlalchemy.engine.base.Engine:
+    """Returns the process-wide engine for uri, creating it with the
+    current pool configuration on first use."""
+    engine = _engines.get(uri)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        if uri not in _engines:
+            engine_kwargs = (
+                {} if uri.startswith("sqlite") else dict(_pool_config)
+            )
+            _engines[uri] = _create_engine_wrapper(uri, **engine_kwargs)
+        return _engines[uri]
+
+
+def _get_async_engine(uri: str):
+    """Returns the process-wide async engine for uri. The driver must be
+    part of the uri (e.g. postgresql+asyncpg://)."""
+    engine = _async_engines.get(uri)
+    if engine is not None:
+        return engine
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    with _engines_lock:
+        if uri not in _async_engines:
+            engine_kwargs = (
+                {} if uri.startswith("sqlite") else dict(_pool_config)
+            )
+            _async_engines[uri] = create_async_engine(uri, **engine_kwargs)
+        return _async_engines[uri]
+
+
+def _set_pool_config(
+    pool_size: int = None,
+    max_overflow: int = None,
+    pool_pre_ping: bool = None,
+    pool_recycle: int = None,
+):
+    """Updates the connection pool configuration. Engines that already
+    exist are disposed so the next Store picks up the new settings."""
+    updates = {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": pool_pre_ping,
+        "pool_recycle": pool_recycle,
+    }
+    _pool_config.update({k: v for k, v in updates.items() if v is not None})
+    _dispose_engines()
+
+
+def _get_pool_config() -> dict:
+    """Returns a copy of the connection pool configuration."""
+    return dict(_pool_config)
+
+
+def _dispose_engines():
+    """Closes all pooled connections and empties the engine registry. Async
+    engines are dropped from the registry; their connections are closed
+    when they are garbage collected."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _async_engines.clear()
+
+
 def _initialize_db_tables(engine: sqlalchemy.engine.base.Engine):
-    """Initializes tables using sqlalchemy API."""
-    Base.metadata.create_all(engine)
+    """Initializes tables using sqlalchemy API. Stamps the schema revision
+    if the database was empty."""
+    with engine.begin() as con:
+        _create_tables(con)
+
+
+def _create_tables(con: sqlalchemy.engine.Connection):
+    """Creates missing tables on a connection, stamping the schema revision
+    if there were no tables. Raises if there are tables but no revision,
+    like in databases created by releases before migrations were tracked,
+    since their existing tables lack columns the models expect."""
+    existing_tables = set(sa_inspect(con).get_table_names()) & set(
+        Base.metadata.tables
+    )
+    if existing_tables and _read_schema_revision(con) is None:
+        raise RuntimeError(
+            "Database has mltrace tables but no schema revision. Please "
+            + f"run `alembic stamp {_BASE_REVISION}` and then `alembic "
+            + "upgrade head` in mltrace/db/migrations."
+        )
+
+    Base.metadata.create_all(con)
+    if not existing_tables:
+        _stamp_schema_revision(con)
+
+
+def _get_schema_revision(engine: sqlalchemy.engine.base.Engine) -> str:
+    """Returns the alembic revision recorded in the db, or None."""
+    with engine.connect() as con:
+        return _read_schema_revision(con)
+
+
+def _read_schema_revision(con: sqlalchemy.engine.Connection) -> str:
+    return MigrationContext.configure(con).get_current_revision()
+
+
+def _stamp_schema_revision(con: sqlalchemy.engine.Connection):
+    """Records the revision the models correspond to in the db."""
+    version_table = Table(
+        "alembic_version",
+        MetaData(),
+        Column("version_num", String(32), primary_key=True),
+    )
+    version_table.create(con, checkfirst=True)
+    con.execute(version_table.delete())
+    con.execute(version_table.insert().values(version_num=_SCHEMA_REVISION))
+
+
+def _check_schema(con: sqlalchemy.engine.Connection):
+    """Creates missing tables unless the db is stamped with the expected
+    revision."""
+    revision = _read_schema_revision(con)
+    if revision == _SCHEMA_REVISION:
+        return
+
+    if revision is not None:
+        logging.warning(
+            f"Database schema is at revision {revision}, but mltrace "
+            + f"expects {_SCHEMA_REVISION}. Please run the migrations in "
+            + "mltrace/db/migrations."
+        )
+    _create_tables(con)
+
+
+def _verify_schema(uri: str, engine: sqlalchemy.engine.base.Engine):
+    """Makes sure the tables exist, at most once per process per uri. If the
+    db is stamped with the expected revision, the catalog is not touched."""
+    if uri in _verified_uris:
+        return
+
+    with _verified_uris_lock:
+        if uri in _verified_uris:
+            return
+
+        with engine.begin() as con:
+            _check_schema(con)
+        _verified_uris.add(uri)
+
+
+def _forget_schema(uri: str):
+    """Forces the next Store for uri to verify the schema again."""
+    with _verified_uris_lock:
+        _verified_uris.discard(uri)
 
 
 def _drop_everything(engine: sqlalchemy.engine.base.Engine):
@@ -136,10 +334,33 @@ def _map_extension_to_enum(filename: str) -> PointerTypeEnum:
 
 
 def _hash_value(value: typing.Any = "") -> bytes:
-    """Hashes a value using the sqlalchemy API."""
-    if isinstance(value, str) and value == "":
-        return b""
-    return hashlib.sha256(repr(value).encode()).digest()
+    """Hashes a value for IOPointer.value. DataFrames, arrays, bytes and
+    files are hashed by content; see mltrace.db.fingerprint."""
+    return _fingerprint(value)
+
+
+def _hash_values(values: typing.List[typing.Any]) -> typing.List[bytes]:
+    """Hashes independent values in parallel threads."""
+    return _fingerprint_many(values)
+
+
+def _io_value(name: str, value: typing.Any = "") -> typing.Any:
+    """Returns the value an IOPointer called name is hashed by. Pointers
+    to local files that are logged without a value are identified by the
+    file's contents."""
+    if isinstance(value, str) and value == "" and os.path.isfile(name):
+        return pathlib.Path(name)
+    return value
+
+
+def _hash_io_values(
+    names: typing.List[str], values: typing.List[typing.Any] = None
+) -> typing.List[bytes]:
+    """Hashes the values of IOPointers called names; see _io_value."""
+    values = values if values else [""] * len(names)
+    return _hash_values(
+        [_io_value(name, value) for name, value in zip(names, values)]
+    )
 
 
 # TODO(shreyashankar): add cases for other types
@@ -159,28 +380,330 @@ def _get_data_and_model_args(**kwargs):
     return data_model_args
 
 
-def _load(pathname: str, from_client=True) -> typing.Any:
+def _set_artifact_writer(writer: typing.Any):
+    """Sets the ArtifactWriter _save queues writes on, or None to write
+    synchronously. Returns the previous writer."""
+    global _artifact_writer
+    previous, _artifact_writer = _artifact_writer, writer
+    return previous
+
+
+def _get_artifact_writer():
+    return _artifact_writer
+
+
+def _wait_for_artifacts(pathnames: typing.Iterable[str]):
+    """Blocks until queued writes to pathnames have finished."""
+    writer = _artifact_writer
+    if writer is not None:
+        writer.wait(list(pathnames))
+
+
+def _set_artifact_config(
+    compress: str = None, compress_level: int = None, mmap_mode: str = None
+):
+    """Updates the defaults of mltrace.save and mltrace.load. Arguments
+    left as None keep their current values; pass "" for compress or
+    mmap_mode to turn them off."""
+    updates = {
+        "compress": compress,
+        "compress_level": compress_level,
+        "mmap_mode": mmap_mode,
+    }
+    _artifact_config.update(
+        {k: v for k, v in updates.items() if v is not None}
+    )
+
+
+def _get_artifact_config() -> dict:
+    """Returns a copy of the artifact I/O defaults."""
+    return dict(_artifact_config)
+
+
+def _compress_arg(
+    compress: str = None, compress_level: int = None
+) -> typing.Union[int, typing.Tuple[str, int]]:
+    """Returns the joblib.dump compress argument for the given codec and
+    level, falling back to the configured defaults."""
+    if compress is None:
+        compress = _artifact_config["compress"]
+    if compress_level is None:
+        compress_level = _artifact_config["compress_level"]
+    if not compress:
+        return 0
+    if compress not in _COMPRESSION_CODECS:
+        raise RuntimeError(
+            f"Unknown compression codec {compress}. Options are "
+            + f"{list(_COMPRESSION_CODECS)}."
+        )
+    return (compress, compress_level)
+
+
+def _write_artifact(
+    obj: typing.Any,
+    pathname: str,
+    compress: typing.Union[int, typing.Tuple[str, int]] = 0,
+):
+    """Dumps obj to a temporary file next to pathname and renames it into
+    place, so readers never see a partially written artifact. compress is
+    passed to joblib.dump."""
+    directory = os.path.dirname(pathname)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_pathname = f"{pathname}.{uuid.uuid4().hex}.tmp"
+    try:
+        joblib.dump(obj, tmp_pathname, compress=compress)
+        os.replace(tmp_pathname, pathname)
+    except BaseException:
+        if os.path.exists(tmp_pathname):
+            os.remove(tmp_pathname)
+        raise
+
+
+def _get_save_dir() -> str:
+    return os.environ.get(
+        "SAVE_DIR", os.path.join(os.path.expanduser("~"), ".mltrace")
+    )
+
+
+def _get_objects_dir() -> str:
+    """Returns the directory of the content-addressed artifact store."""
+    return os.path.join(_get_save_dir(), "objects")
+
+
+# Blobs are shared by every name linked to them, so they are read-only to
+# keep writes through one name from changing the others
+_BLOB_MODE = 0o444
+
+
+def _blob_pathname(digest: bytes) -> str:
+    hexdigest = digest.hex()
+    return os.path.join(_get_objects_dir(), hexdigest[:2], hexdigest[2:])
+
+
+def _link_artifact(blob: str, pathname: str):
+    """Makes pathname a hard link to blob, or a copy of it if the two can't
+    be linked (e.g. they are on different filesystems)."""
+    directory = os.path.dirname(pathname)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_pathname = f"{pathname}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(blob, tmp_pathname)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(blob, tmp_pathname)
+    os.replace(tmp_pathname, pathname)
+
+
+def _write_content_addressed(
+    obj: typing.Any,
+    pathname: str,
+    digest: bytes = None,
+    compress: typing.Union[int, typing.Tuple[str, int]] = 0,
+):
+    """Stores obj once per content in the objects directory and links
+    pathname to it. Blobs are keyed by digest, the exact fingerprint of
+    obj, if given; then a blob that already exists is linked without
+    serializing obj, whatever compression it was written with. Otherwise
+    obj is serialized and keyed by the digest of the file.
+
+    Blobs are read-only, and so is pathname, since a hard link shares its
+    blob's mode; writing to it in place would change every artifact
+    linked to the same blob. Saving to pathname again replaces the link
+    instead of writing through it."""
+    for _ in range(3):
+        if digest is not None:
+            blob = _blob_pathname(digest)
+            if not os.path.exists(blob):
+                _write_artifact(obj, blob, compress)
+                os.chmod(blob, _BLOB_MODE)
+        else:
+            os.makedirs(_get_objects_dir(), exist_ok=True)
+            incoming = os.path.join(
+                _get_objects_dir(), f"{uuid.uuid4().hex}.incoming.tmp"
+            )
+            _write_artifact(obj, incoming, compress)
+            blob = _blob_pathname(
+                _hash_file(incoming, os.path.getsize(incoming))
+            )
+            if os.path.exists(blob):
+                os.remove(incoming)
+            else:
+                os.chmod(incoming, _BLOB_MODE)
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(incoming, blob)
+
+        try:
+            _link_artifact(blob, pathname)
+            return
+        except FileNotFoundError:
+            # The blob was garbage collected after we found it
+            continue
+
+    raise RuntimeError(f"Could not save {pathname}.")
+
+
+def _get_linked_inodes() -> typing.Set[typing.Tuple[int, int]]:
+    """Returns the devices and inodes of the hard-linked files in the save
+    directory, outside the objects directory."""
+    linked = set()
+    save_dir = _get_save_dir()
+    for root, dirs, files in os.walk(save_dir):
+        if root == save_dir and "objects" in dirs:
+            dirs.remove("objects")
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if st.st_nlink > 1:
+                linked.add((st.st_dev, st.st_ino))
+    return linked
+
+
+def _gc_artifacts(min_age: float = 3600, dry_run: bool = False) -> dict:
+    """Deletes blobs in the objects directory that no saved artifact links
+    to anymore, and temporary files of interrupted writes. Files created or
+    linked in the last min_age seconds are kept, so blobs that are being
+    written or linked right now are not collected. Returns the number of
+    files deleted and kept, and the bytes freed.
+
+    Only names in the save directory keep a blob. Links made elsewhere
+    keep their contents when the blob is deleted, but no longer share
+    them with later saves."""
+    res = {"deleted": 0, "kept": 0, "bytes": 0}
+    now = time.time()
+    linked = _get_linked_inodes()
+    for root, dirs, files in os.walk(_get_objects_dir(), topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            # Links update the blob's ctime
+            referenced = (st.st_dev, st.st_ino) in linked and not (
+                name.endswith(".tmp")
+            )
+            if referenced or now - st.st_ctime < min_age:
+                res["kept"] += 1
+                continue
+
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            res["deleted"] += 1
+            # Links outside the save directory still hold the contents
+            if st.st_nlink == 1:
+                res["bytes"] += st.st_size
+
+        if not dry_run and root != _get_objects_dir():
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+
+    return res
+
+
+def _read_artifact(pathname: str, mmap_mode: str = None) -> typing.Any:
+    """Loads the joblib file at pathname once pending writes to it are
+    done. With mmap_mode, numpy arrays in uncompressed files are memory
+    mapped instead of read into memory; "" turns off a configured
+    default."""
+    if mmap_mode is None:
+        mmap_mode = _artifact_config["mmap_mode"]
+    _wait_for_artifacts([pathname])
+    return joblib.load(pathname, mmap_mode=mmap_mode or None)
+
+
+def _record_loaded_artifacts(
+    client_frame: types.FrameType, pathnames: typing.List[str]
+):
+    """Records pathnames as inputs of the register-decorated function
+    running in client_frame."""
+    if "_mltrace_loaded_artifacts" not in client_frame.f_locals:
+        client_frame.f_locals["_mltrace_loaded_artifacts"] = {}
+    client_frame.f_locals["_mltrace_loaded_artifacts"].update(
+        {pathname: pathlib.Path(pathname) for pathname in pathnames}
+    )
+
+
+def _load(
+    pathname: str, from_client=True, mmap_mode: str = None
+) -> typing.Any:
     """Loads joblib file at pathname."""
-    obj = joblib.load(pathname)
+    obj = _read_artifact(pathname, mmap_mode)
     # Set frame locals
     if from_client:
-        client_frame = inspect.currentframe().f_back.f_back
-        if "_mltrace_loaded_artifacts" not in client_frame.f_locals:
-            client_frame.f_locals["_mltrace_loaded_artifacts"] = {}
-        client_frame.f_locals["_mltrace_loaded_artifacts"].update(
-            {pathname: obj}
+        _record_loaded_artifacts(
+            inspect.currentframe().f_back.f_back, [pathname]
         )
 
     return obj
 
 
+def _load_many(
+    pathnames: typing.List[str],
+    from_client=True,
+    mmap_mode: str = None,
+    max_workers: int = 8,
+) -> typing.List[typing.Any]:
+    """Loads the joblib files at pathnames concurrently, in order."""
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(min(max_workers, len(pathnames)), 1),
+        thread_name_prefix="mltrace-load",
+    ) as pool:
+        objs = list(
+            pool.map(
+                functools.partial(_read_artifact, mmap_mode=mmap_mode),
+                pathnames,
+            )
+        )
+
+    if from_client:
+        _record_loaded_artifacts(
+            inspect.currentframe().f_back.f_back, pathnames
+        )
+
+    return objs
+
+
 # TODO(shreyashankar): add cases for other types
 # (e.g., sklearn model, xgboost model, etc)
 def _save(
-    obj, pathname: str = None, var_name: str = "", from_client=True
+    obj,
+    pathname: str = None,
+    var_name: str = "",
+    from_client=True,
+    digest: bytes = None,
+    compress: str = None,
+    compress_level: int = None,
 ) -> str:
-    """Saves joblib object to pathname."""
-    if pathname is None:
+    """Saves joblib object to pathname. If async artifact writes are
+    enabled, the write is queued and pathname is returned right away.
+
+    Without a pathname, one is generated and linked to a content-addressed
+    copy of obj in the objects directory, so identical objects are stored
+    once. digest is _hash_value(obj), if the caller already has it.
+    compress and compress_level default to the configured ones."""
+    compress = _compress_arg(compress, compress_level)
+    if pathname is not None:
+        write_fn = functools.partial(_write_artifact, compress=compress)
+    else:
+        if _is_exact(obj):
+            digest = digest if digest is not None else _hash_value(obj)
+        else:
+            digest = None
+        write_fn = functools.partial(
+            _write_content_addressed, digest=digest, compress=compress
+        )
+
         # If being called with a component context, use the component name
         _identifier = "".join(
             random.choice(string.ascii_lowercase) for i in range(5)
@@ -202,15 +725,17 @@ def _save(
             pathname = os.path.join(prefix, pathname)
 
         # Prepend with save directory
-        pathname = os.path.join(
-            os.environ.get(
-                "SAVE_DIR", os.path.join(os.path.expanduser("~"), ".mltrace")
-            ),
-            pathname,
-        )
-
-    os.makedirs(os.path.dirname(pathname), exist_ok=True)
-    joblib.dump(obj, pathname)
+        pathname = os.path.join(_get_save_dir(), pathname)
+
+    # Copies that are already stored are only linked, which is cheap
+    # enough to do right away
+    writer = _artifact_writer
+    if writer is not None and not (
+        digest is not None and os.path.exists(_blob_pathname(digest))
+    ):
+        writer.put(obj, pathname, write_fn)
+    else:
+        write_fn(obj, pathname)
 
     # Set frame locals
     if from_client:
@@ -218,12 +743,34 @@ def _save(
         if "_mltrace_saved_artifacts" not in client_frame.f_locals:
             client_frame.f_locals["_mltrace_saved_artifacts"] = {}
         client_frame.f_locals["_mltrace_saved_artifacts"].update(
-            {pathname: obj}
+            {pathname: pathlib.Path(pathname)}
         )
 
     return pathname
 
 
+def _stored_artifact_value(
+    obj: typing.Any, digest: bytes
+) -> typing.Optional[bytes]:
+    """Returns the IOPointer value of the stored copy of obj, the
+    fingerprint of its file, if obj is exact and already stored. digest is
+    _hash_value(obj)."""
+    if not _is_exact(obj):
+        return None
+    blob = _blob_pathname(digest)
+    if not os.path.isfile(blob):
+        return None
+    return _hash_value(pathlib.Path(blob))
+
+
+def _saved_artifact_value(pathname: str) -> bytes:
+    """Returns the IOPointer value of the artifact saved to pathname, the
+    fingerprint of its file, once pending writes to it are done. This is
+    the value mltrace.load logs for it."""
+    _wait_for_artifacts([pathname])
+    return _hash_value(pathlib.Path(pathname))
+
+
 def _get_view_name(task_name: str, window_size: int) -> str:
     """Returns the view name for a given task name."""
     return f"{task_name}_{window_size}_view"
@@ -0,0 +1,198 @@
+from mltrace.db.store import Store
+
+import logging
+import queue
+import threading
+import time
+import typing
+
+_STOP = object()
+
+
+class BatchWriter(object):
+    """Drains a bounded in-process queue from a background thread and
+    writes the items to the db, one transaction per batch."""
+
+    def __init__(
+        self,
+        uri: str,
+        write_fn: typing.Callable[[Store, typing.List[typing.Any]], None],
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 0.1,
+        block: bool = True,
+    ):
+        """
+        Starts the writer thread.
+
+        Args:
+            uri (str): URI string to connect to the SQLAlchemy database.
+            write_fn (Callable): Called with the writer's Store and a list
+                of queued items. Must not commit outside the batch.
+            max_queue_size (int): Maximum number of items waiting to be
+                written.
+            batch_size (int): Maximum number of items per transaction.
+            flush_interval (float): Seconds to wait for a batch to fill up
+                before writing it.
+            block (bool): Whether put blocks when the queue is full
+                (backpressure). If False, new items are dropped instead.
+        """
+        self.uri = uri
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block = block
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._pending = 0
+        self._pending_cv = threading.Condition()
+        # Guards _stats, which the writer thread updates while clients
+        # read it
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_flush_latency": None,
+            "max_flush_latency": None,
+        }
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="mltrace-writer", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, item: typing.Any) -> bool:
+        """Queues an item for writing. Returns False if it was dropped."""
+        if self._closed:
+            raise RuntimeError("Writer has been closed.")
+
+        with self._pending_cv:
+            self._pending += 1
+
+        try:
+            self._queue.put(item, block=self.block)
+        except queue.Full:
+            self._done(1)
+            self._add_stats(dropped=1)
+            logging.warning("Logging queue is full. Dropping item.")
+            return False
+
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until every queued item has been written. Returns False
+        if the timeout expired first."""
+        with self._pending_cv:
+            return self._pending_cv.wait_for(
+                lambda: self._pending == 0, timeout=timeout
+            )
+
+    def close(self, timeout: float = None):
+        """Flushes the queue and stops the writer thread."""
+        if self._closed:
+            return
+
+        self.flush(timeout)
+        self._closed = True
+        # If the flush timed out, the queue may still be full
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logging.warning(
+                "Logging queue is still full. Not waiting for the writer "
+                + "thread to stop."
+            )
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Returns the queue depth, item counts and flush latencies (in
+        seconds) of the writer."""
+        with self._stats_lock:
+            return {"queue_depth": self._queue.qsize(), **self._stats}
+
+    def _add_stats(self, **counts: int):
+        with self._stats_lock:
+            for key, count in counts.items():
+                self._stats[key] += count
+
+    def _done(self, num_items: int):
+        with self._pending_cv:
+            self._pending -= num_items
+            self._pending_cv.notify_all()
+
+    def _next_batch(self) -> typing.Tuple[typing.List[typing.Any], bool]:
+        """Waits for items and returns (batch, whether to stop)."""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        store = Store(self.uri)
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if len(batch) == 0:
+                continue
+
+            start = time.monotonic()
+            self._write_batch(store, batch)
+            latency = time.monotonic() - start
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["last_flush_latency"] = latency
+                self._stats["max_flush_latency"] = max(
+                    latency, self._stats["max_flush_latency"] or 0
+                )
+            self._done(len(batch))
+
+        store.close()
+
+    def _write_batch(self, store: Store, batch: typing.List[typing.Any]):
+        """Writes the batch in one transaction. If that fails, retries the
+        items one by one so a single bad item does not lose the others."""
+        try:
+            with store.batch():
+                self.write_fn(store, batch)
+            self._add_stats(written=len(batch))
+            return
+        except Exception as e:
+            logging.warning(
+                f"Writing a batch of {len(batch)} items failed with "
+                + f"exception {e}. Retrying items individually."
+            )
+        finally:
+            store.close()
+
+        for item in batch:
+            try:
+                with store.batch():
+                    self.write_fn(store, [item])
+                self._add_stats(written=1)
+            except Exception as e:
+                self._add_stats(failed=1)
+                logging.error(f"Could not write item: {e}")
+            finally:
+                store.close()
@@ -8,6 +8,7 @@ import typing
 from mltrace import client
 from mltrace import utils as clientUtils
 from mltrace.db import Store, PointerTypeEnum
+from mltrace.db.utils import _wait_for_artifacts
 from mltrace.entities import utils, history
 from mltrace.entities.base import Base
 
@@ -230,11 +231,12 @@ class Component(Base):
                         ].items()
                     ]
                 if "_mltrace_saved_artifacts" in local_vars:
+                    saved_artifacts = local_vars["_mltrace_saved_artifacts"]
+                    # Saved files are identified by their contents
+                    _wait_for_artifacts(saved_artifacts)
                     output_pointers += [
                         store.get_io_pointer(name, val)
-                        for name, val in local_vars[
-                            "_mltrace_saved_artifacts"
-                        ].items()
+                        for name, val in saved_artifacts.items()
                     ]
 
                 func_source_code = inspect.getsource(func)
@@ -301,6 +303,7 @@ class Component(Base):
                 store.commit_component_run(
                     component_run, staleness_threshold=staleness_threshold
                 )
+                store.close()
 
                 # trigger afterRun method to print out last component run
                 self.afterRun()
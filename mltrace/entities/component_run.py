@@ -58,6 +58,19 @@ class ComponentRun(Base):
         self._mlflow_run_id = mlflow_run_id
         self._mlflow_run_metrics = mlflow_run_metrics
         self._mlflow_run_params = mlflow_run_params
+        self._loader = None
+
+    def _load_relations(self):
+        """Runs read from the db get inputs, outputs and dependencies from
+        a loader the first time any of them is used."""
+        loader = self._loader
+        if loader is not None:
+            self._loader = None
+            (
+                self._inputs,
+                self._outputs,
+                self._dependencies,
+            ) = loader.load(self._id)
 
     @property
     def component_name(self) -> str:
@@ -80,10 +93,12 @@ class ComponentRun(Base):
 
     @property
     def inputs(self) -> typing.List[IOPointer]:
+        self._load_relations()
         return self._inputs
 
     @inputs.setter
     def inputs(self, inputs: typing.List[IOPointer]):
+        self._load_relations()
         self._inputs = inputs
 
     @inputs.deleter
@@ -92,10 +107,12 @@ class ComponentRun(Base):
 
     @property
     def outputs(self) -> typing.List[IOPointer]:
+        self._load_relations()
         return self._outputs
 
     @outputs.setter
     def outputs(self, outputs: typing.List[IOPointer]):
+        self._load_relations()
         self._outputs = outputs
 
     @outputs.deleter
@@ -136,6 +153,7 @@ class ComponentRun(Base):
 
     @property
     def dependencies(self) -> typing.List[str]:
+        self._load_relations()
         return self._dependencies
 
     @property
@@ -250,6 +268,7 @@ class ComponentRun(Base):
             else dependencies
         )
 
+        self._load_relations()
         self._dependencies = self._dependencies + dependencies
         self._dependencies = list(set(self._dependencies))
 
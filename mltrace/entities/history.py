@@ -1,4 +1,6 @@
-import copy
+import collections
+import contextlib
+import time
 from datetime import datetime
 
 from mltrace.db import Store
@@ -6,47 +8,207 @@ from mltrace import utils as clientUtils
 
 
 class History(object):
+    """Lazy sequence of a component's runs, oldest first. Runs are fetched
+    page_size at a time and the max_pages most recently used pages are
+    cached, so iterating or slicing the history only queries the db once
+    per page.
+
+    Cached pages are trusted for max_age seconds. After that, the next
+    access reads the component's newest run and drops the cache if it
+    changed. Deleted runs and runs logged with an older start time are only
+    seen after invalidate()."""
+
     def __init__(
         self,
         componentName: str,
+        page_size: int = 100,
+        max_pages: int = 32,
+        max_age: float = 1.0,
+        store: Store = None,
     ):
         self.component_name = componentName
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self._store = store
+        self.invalidate()
+
+    @contextlib.contextmanager
+    def _get_store(self):
+        if self._store is not None:
+            yield self._store
+        else:
+            with Store(clientUtils.get_db_uri()) as store:
+                yield store
+
+    def invalidate(self):
+        """Drops all cached runs."""
+        self._pages = collections.OrderedDict()
+        self._len = None
+        self._newest = None
+        self._validated_at = None
+
+    def _validate(self, store: Store, force: bool = False):
+        """Drops the cache if the component's newest run changed."""
+        if (
+            not force
+            and self._validated_at is not None
+            and time.monotonic() - self._validated_at < self.max_age
+        ):
+            return
+
+        newest = store.get_newest_component_run_key(self.component_name)
+        if newest != self._newest:
+            self.invalidate()
+            self._newest = newest
+        self._validated_at = time.monotonic()
+
+    def _get_len(self, store: Store) -> int:
+        self._validate(store)
+        if self._len is None:
+            self._len = store.get_component_runs_count(self.component_name)
+        return self._len
+
+    def _get_page(self, store: Store, page_idx: int) -> list:
+        """Returns page page_idx, fetching it if it isn't cached. Pages next
+        to a cached page are found from its first or last run. Other pages
+        are found by seeking from the nearest cached page or end of the
+        history."""
+        self._validate(store)
+        if page_idx in self._pages:
+            self._pages.move_to_end(page_idx)
+            return self._pages[page_idx]
+
+        prev_page = self._pages.get(page_idx - 1)
+        next_page = self._pages.get(page_idx + 1)
+        if prev_page is not None and len(prev_page) == self.page_size:
+            runs = store.get_component_runs_page(
+                self.component_name, self.page_size, prev_page[-1].id
+            )
+        elif next_page:
+            runs = store.get_component_runs_page(
+                self.component_name,
+                self.page_size,
+                next_page[0].id,
+                descending=True,
+            )
+            runs.reverse()
+        else:
+            runs = store.get_component_runs_by_index(
+                self.component_name, *self._seek_args(page_idx)
+            )
+
+        self._pages[page_idx] = clientUtils.convertToClient(
+            runs, self._store
+        )
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return self._pages[page_idx]
+
+    def _seek_args(self, page_idx: int) -> tuple:
+        """Returns the (first_idx, last_idx, profile, anchor) arguments of
+        get_component_runs_by_index for page page_idx, counting from
+        whichever of the oldest run, the newest run or a run of a cached
+        page is closest, so the db walks as few runs as possible."""
+        first_idx = page_idx * self.page_size
+        last_idx = first_idx + self.page_size
+        distance, anchor = first_idx, None
+        for cached_idx, page in self._pages.items():
+            if len(page) == 0:
+                continue
+            # The closest run of an earlier page is its last one
+            if cached_idx < page_idx:
+                idx = cached_idx * self.page_size + len(page) - 1
+                run = page[-1]
+            else:
+                idx = cached_idx * self.page_size
+                run = page[0]
+            if abs(first_idx - idx) < distance:
+                distance, anchor = abs(first_idx - idx), (idx, run.id)
+
+        if self._len is not None and self._len - first_idx - 1 < distance:
+            # Count from the newest run instead
+            first_idx -= self._len
+            return first_idx, min(last_idx - self._len, 0), "default", None
+        return first_idx, last_idx, "default", anchor
+
+    def _get_runs(self, store: Store, indices: range) -> list:
+        res = []
+        for idx in indices:
+            page_idx, offset = divmod(idx, self.page_size)
+            res.append(self._get_page(store, page_idx)[offset])
+        return res
 
     def get_runs_by_time(
         self,
         start_time: datetime = datetime.min,
         end_time: datetime = datetime.max,
     ):
-        store = Store(clientUtils.get_db_uri())
-        history_runs = store.get_history(
-            self.component_name, None, start_time, end_time
-        )
-        history_runs = clientUtils.convertToClient(history_runs)
-        return history_runs
+        with self._get_store() as store:
+            history_runs = store.get_history(
+                self.component_name, None, start_time, end_time
+            )
+            return clientUtils.convertToClient(history_runs, self._store)
 
     def get_runs_by_index(
         self,
         front_idx: int,
         last_idx: int,
     ):
-        store = Store(clientUtils.get_db_uri())
-        history_runs = store.get_component_runs_by_index(
-            self.component_name, front_idx, last_idx
-        )
-        history_runs = clientUtils.convertToClient(history_runs)
-        return history_runs
+        with self._get_store() as store:
+            history_runs = store.get_component_runs_by_index(
+                self.component_name, front_idx, last_idx
+            )
+            return clientUtils.convertToClient(history_runs, self._store)
+
+    def get_runs_page(
+        self,
+        limit: int = 100,
+        last_run_id: int = None,
+        reverse: bool = False,
+    ):
+        """Returns up to limit runs after the run with id last_run_id,
+        oldest first unless reverse is set. Walking the history page by
+        page this way never seeks to an index, unlike get_runs_by_index."""
+        with self._get_store() as store:
+            history_runs = store.get_component_runs_page(
+                self.component_name, limit, last_run_id, descending=reverse
+            )
+            return clientUtils.convertToClient(history_runs, self._store)
 
     def __getitem__(self, index):
-        store = Store(clientUtils.get_db_uri())
-        history_run = store.get_component_runs_by_index(
-            self.component_name, index, index + 1
-        )
-        history_run = clientUtils.convertToClient(history_run)
-        return history_run
+        with self._get_store() as store:
+            length = self._get_len(store)
+            if isinstance(index, slice):
+                return self._get_runs(store, range(*index.indices(length)))
+
+            if index < 0:
+                index += length
+            if index < 0 or index >= length:
+                raise IndexError("History index out of range")
+            return self._get_runs(store, [index])[0]
+
+    def __iter__(self):
+        return self._iter(reverse=False)
+
+    def __reversed__(self):
+        return self._iter(reverse=True)
+
+    def _iter(self, reverse: bool):
+        """Yields runs a page at a time, checking for new runs once before
+        the first page."""
+        with self._get_store() as store:
+            self._validate(store, force=True)
+            num_pages = -(-self._get_len(store) // self.page_size)
+            pages = range(num_pages)
+        for page_idx in reversed(pages) if reverse else pages:
+            with self._get_store() as store:
+                page = self._get_page(store, page_idx)
+            yield from reversed(page) if reverse else page
 
     def __len__(self):
-        store = Store(clientUtils.get_db_uri())
-        return store.get_component_runs_count(self.component_name)
+        with self._get_store() as store:
+            return self._get_len(store)
 
     def __repr__(self) -> str:
         return f"History({self.component_name})"
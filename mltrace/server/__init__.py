@@ -2,13 +2,16 @@ from mltrace.client import flag_output_id, unflag_output_id
 from dateutil import parser
 from flask import Blueprint, Flask, request, Response
 from http import HTTPStatus
+from mltrace.db import LineageIndex
 from mltrace.entities import Component, ComponentRun, IOPointer
 from mltrace import (
+    get_db_uri,
     get_component_information,
     get_component_run_information,
     get_components,
     get_history,
     web_trace,
+    web_trace_dag,
     get_recent_run_ids,
     get_io_pointer,
     add_notes_to_component_run,
@@ -19,10 +22,22 @@ from mltrace import (
 import copy
 import json
 import logging
+import os
 
 app = Flask(__name__, static_folder="ui/build", static_url_path="")
 api = Blueprint("api", __name__)
 
+# Set MLTRACE_LINEAGE_INDEX to answer traces and reviews from memory. The
+# value is the number of seconds between polls for new runs.
+lineage_index = (
+    LineageIndex(
+        get_db_uri(),
+        refresh_interval=float(os.environ["MLTRACE_LINEAGE_INDEX"]),
+    )
+    if os.environ.get("MLTRACE_LINEAGE_INDEX")
+    else None
+)
+
 
 def error(err_msg, status_code):
     return Response(json.dumps({"error": err_msg}), status=status_code)
@@ -97,6 +112,7 @@ def history():
 
     component_name = request.args["component_name"]
     limit = request.args["limit"] if "limit" in request.args else None
+    last_run_id = request.args.get("last_run_id")
     date_upper = (
         parser.parse(request.args["date_upper"])
         if "date_upper" in request.args
@@ -110,10 +126,15 @@ def history():
 
     try:
         history = (
-            get_history(component_name, limit, date_lower, date_upper)
+            get_history(
+                component_name, limit, date_lower, date_upper, last_run_id
+            )
             if limit
             else get_history(
-                component_name, date_lower=date_lower, date_upper=date_upper
+                component_name,
+                date_lower=date_lower,
+                date_upper=date_upper,
+                last_run_id=last_run_id,
             )
         )
         return str(history)
@@ -141,8 +162,14 @@ def component():
 @api.route("/recent", methods=["GET"])
 def recent():
     kwargs = request.args
-    component_run_ids = get_recent_run_ids(**kwargs)
-    return json.dumps(component_run_ids)
+    try:
+        component_run_ids = get_recent_run_ids(**kwargs)
+        return json.dumps(component_run_ids)
+    except RuntimeError:
+        return error(
+            f"Run ID {kwargs.get('last_run_id')} not found",
+            HTTPStatus.NOT_FOUND,
+        )
 
 
 @api.route("/trace", methods=["GET"])
@@ -151,8 +178,12 @@ def trace():
         return error(f"output_id not specified.", HTTPStatus.NOT_FOUND)
     output_id = request.args["output_id"]
     try:
-        res = web_trace(output_id)
-        return json.dumps(res)
+        # format=tree returns the nested payload of older versions
+        if request.args.get("format") == "tree":
+            return json.dumps(web_trace(output_id))
+        if lineage_index is not None:
+            return json.dumps(lineage_index.web_trace_dag(output_id))
+        return json.dumps(web_trace_dag(output_id))
     except RuntimeError:
         return error(f"Output {output_id} not found", HTTPStatus.NOT_FOUND)
 
@@ -205,8 +236,15 @@ def unflag():
 
 @api.route("/review", methods=["GET"])
 def review():
+    limit = int(request.args["limit"]) if "limit" in request.args else None
     try:
-        flagged_output_ids, trace_nodes_counts = review_flagged_outputs()
+        if lineage_index is not None:
+            return json.dumps(
+                list(lineage_index.review_flagged_outputs(limit=limit))
+            )
+        flagged_output_ids, trace_nodes_counts = review_flagged_outputs(
+            limit=limit, profile="summary"
+        )
         cr_ids_counts = [
             (node.id, count) for node, count in trace_nodes_counts
         ]
@@ -14,7 +14,7 @@ const TRACE_API_URL = "/api/trace";
 function styleLabels(node) {
     node.labelText = node.label;
     // Set label to monospace style
-    if (node.hasCaret === false) {
+    if (node.hasCaret === false && !node.isReference) {
         node.label = (
             <div style={{ fontFamily: 'monospace', wordWrap: 'break-word' }}>{node.label}</div>
         )
@@ -33,6 +33,38 @@ function styleLabels(node) {
     }
 }
 
+// Converts the { roots, nodes, edges } trace payload into Tree nodes. A
+// component run reached by more than one path is only expanded the first
+// time; later occurrences are collapsed references to it.
+function dagToTree(dag) {
+    const nodes = {};
+    dag.nodes.forEach((node) => { nodes[node.id] = node; });
+    const deps = {};
+    dag.edges.forEach(([src, dst]) => {
+        if (!(src in deps)) deps[src] = [];
+        deps[src].push(dst);
+    });
+
+    const shown = new Set();
+    function build(id) {
+        const node = nodes[id];
+        if (shown.has(id)) {
+            return {
+                id: id,
+                label: node.label + " (see above)",
+                hasCaret: false,
+                isReference: true,
+                stale: node.stale
+            };
+        }
+        shown.add(id);
+        const children = (deps[id] || []).map(build);
+        return { ...node, childNodes: node.childNodes.concat(children) };
+    }
+
+    return dag.roots.map(build);
+}
+
 function copyToClipboard(textToCopy) {
     // navigator clipboard api needs a secure context (https)
     if (navigator.clipboard && window.isSecureContext) {
@@ -114,6 +146,7 @@ export default class Trace extends Component {
             }
         }).then(
             ({ data }) => {
+                data = dagToTree(data);
                 data.map((node) => styleLabels(node));
                 this.setState({ nodes: data, output_id: this.props.output_id, selected_id: data[0].id });
             }
@@ -1,7 +1,6 @@
 from mltrace.db import Store
 from mltrace.entities import IOPointer, ComponentRun
 
-import copy
 import logging
 import os
 import typing
@@ -42,28 +41,79 @@ def set_address(address: str):
     global _db_uri
     _db_uri = _set_address_helper(_db_uri, address)
 
-# helper function - convert to client facing component runs
-
-
-def convertToClient(componentRuns: typing.List):
-    component_runs = []
-    for cr in componentRuns:
-        inputs = [
-            IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-            for iop in cr.inputs
-        ]
-        outputs = [
-            IOPointer.from_dictionary(iop.__dict__).to_dictionary()
-            for iop in cr.outputs
-        ]
-        dependencies = [dep.component_name for dep in cr.dependencies]
-        d = copy.deepcopy(cr.__dict__)
-        d.update(
-            {
-                "inputs": inputs,
-                "outputs": outputs,
-                "dependencies": dependencies,
-            }
+
+# helper functions - convert to client facing component runs
+
+_RELATIONS = ("inputs", "outputs", "dependencies")
+
+
+class _RelationLoader(object):
+    """Loads the inputs, outputs and dependencies of a batch of client
+    ComponentRuns in one round trip, the first time any run in the batch
+    uses them. IOPointers are returned as dictionaries unless as_dicts is
+    False.
+
+    Relations are read with store if given, and otherwise from uri, which
+    defaults to the database URI when the loader is created. Pass the URI
+    the runs were queried from, so relations come from the same database
+    even if the URI is changed before they are used."""
+
+    def __init__(
+        self,
+        run_ids: typing.List[int],
+        uri: str = None,
+        store: Store = None,
+        as_dicts: bool = True,
+    ):
+        self._run_ids = list(run_ids)
+        self._uri = uri if uri is not None else get_db_uri()
+        self._store = store
+        self._as_dicts = as_dicts
+        self._relations = None
+
+    def load(self, run_id: int) -> typing.Tuple[list, list, list]:
+        if self._relations is None:
+            if self._store is not None:
+                self._relations = self._store.get_component_run_relations(
+                    self._run_ids
+                )
+            else:
+                with Store(self._uri) as store:
+                    self._relations = store.get_component_run_relations(
+                        self._run_ids
+                    )
+
+        inputs, outputs, dependencies = self._relations.get(
+            run_id, ([], [], [])
+        )
+        return (
+            self._io_pointers(inputs),
+            self._io_pointers(outputs),
+            list(dependencies),
         )
-        component_runs.append(ComponentRun.from_dictionary(d))
-    return component_runs
+
+    def _io_pointers(self, rows: list) -> list:
+        io_pointers = [IOPointer(*row) for row in rows]
+        if self._as_dicts:
+            return [iop.to_dictionary() for iop in io_pointers]
+        return io_pointers
+
+
+def _client_component_run(
+    values: typing.Mapping[str, typing.Any], loader: _RelationLoader = None
+) -> ComponentRun:
+    """Builds a client ComponentRun from the column values of a db row or
+    ORM object, without copying them. Its relations come from loader."""
+    cr = ComponentRun.from_dictionary(
+        {k: v for k, v in values.items() if k not in _RELATIONS}
+    )
+    cr._loader = loader
+    return cr
+
+
+def convertToClient(componentRuns: typing.List, store: Store = None):
+    """Converts db ComponentRuns to client ComponentRuns. Inputs, outputs
+    and dependencies are loaded for all of them at once when they are first
+    used, from store if given and from a new Store otherwise."""
+    loader = _RelationLoader([cr.id for cr in componentRuns], store=store)
+    return [_client_component_run(cr.__dict__, loader) for cr in componentRuns]
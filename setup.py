@@ -34,6 +34,7 @@ setup(
         "scikit-learn",
         "sqlalchemy",
     ],
+    extras_require={"async": ["asyncpg", "aiosqlite"]},
     entry_points="""
         [console_scripts]
         mltrace=mltrace.cli.cli:mltrace
@@ -0,0 +1,78 @@
+import asyncio
+import importlib.util
+import unittest
+
+# AsyncStore needs an asyncio driver; aiosqlite backs the test database
+aiosqlite_missing = importlib.util.find_spec("aiosqlite") is None
+
+
+@unittest.skipIf(aiosqlite_missing, "aiosqlite is not installed")
+class TestAsyncStore(unittest.TestCase):
+    def setUp(self):
+        from mltrace.db.async_store import AsyncStore
+
+        self.store = AsyncStore("test")
+
+    def tearDown(self):
+        asyncio.run(self.store.close())
+
+    def testLogOutputsAndFeedback(self):
+        async def run():
+            await self.store.log_output("task", "id_1", 0.5)
+            await self.store.log_feedback("task", "id_1", 1.0)
+            outputs = await self.store.get_outputs_or_feedback("task")
+            feedback = await self.store.get_outputs_or_feedback(
+                "task", tablename="feedback_table"
+            )
+            return outputs, feedback
+
+        outputs, feedback = asyncio.run(run())
+        self.assertEqual([o[1] for o in outputs], ["id_1"])
+        self.assertEqual([f[1] for f in feedback], ["id_1"])
+
+    def testComponentRunAndTrace(self):
+        from mltrace import async_client
+
+        def commit(store, component_name, inp, out):
+            cr = store.initialize_empty_component_run(component_name)
+            cr.set_start_timestamp()
+            cr.set_end_timestamp()
+            cr.add_input(store.get_io_pointer(inp))
+            cr.add_output(store.get_io_pointer(out))
+            store.set_dependencies_from_inputs(cr)
+            store.commit_component_run(cr)
+
+        async def run():
+            await self.store.run_sync(commit, "first", "iop_1", "iop_2")
+            await self.store.run_sync(commit, "second", "iop_2", "iop_3")
+            history = await self.store.get_history("second")
+            trace = await self.store.web_trace("iop_3")
+            client_history = await self.store.run_sync(
+                async_client._get_client_history, "second"
+            )
+            return history, trace, client_history
+
+        history, trace, client_history = asyncio.run(run())
+        self.assertEqual(len(history), 1)
+
+        # Relations of client runs are read on the async session, before
+        # it is closed
+        self.assertEqual(
+            [iop["name"] for iop in client_history[0].inputs], ["iop_2"]
+        )
+        self.assertEqual(
+            [iop["name"] for iop in client_history[0].outputs], ["iop_3"]
+        )
+        self.assertEqual(trace[0]["label"], "second")
+        self.assertEqual(trace[0]["childNodes"][-1]["label"], "first")
+
+    def testAsyncClient(self):
+        from mltrace import async_client, set_db_uri
+
+        set_db_uri("test")
+        asyncio.run(async_client.log_output("task", "id_1", 0.5))
+        asyncio.run(async_client.log_feedback("task", "id_1", 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
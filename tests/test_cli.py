@@ -0,0 +1,57 @@
+import contextlib
+import io
+import sys
+import unittest
+
+from mltrace.cli.cli import dag_to_tree, show_res
+
+
+class TestCLI(unittest.TestCase):
+    def _show(self, res) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            show_res(
+                res=res[0]["childNodes"],
+                indent=1,
+                count=0,
+                pos=0,
+                need_stick=0,
+            )
+        return out.getvalue()
+
+    def testDiamond(self):
+        dag = {
+            "roots": ["a"],
+            "nodes": [
+                {"id": node_id, "label": node_id, "childNodes": []}
+                for node_id in ["a", "b", "c", "d"]
+            ],
+            "edges": [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")],
+        }
+        res = dag_to_tree(dag)
+        self.assertEqual(res[0]["label"], "a")
+        self.assertEqual(
+            self._show(res).splitlines(),
+            ["  ├─b", "  │ └─d", "  └─c", "    └─d (see above)"],
+        )
+
+    def testDeepChain(self):
+        # Deeper than the recursion limit, like long retraining chains
+        depth = sys.getrecursionlimit() + 100
+        dag = {
+            "roots": [0],
+            "nodes": [
+                {"id": i, "label": f"run_{i}", "childNodes": []}
+                for i in range(depth)
+            ],
+            "edges": [(i, i + 1) for i in range(depth - 1)],
+        }
+        res = dag_to_tree(dag)
+        lines = self._show(res).splitlines()
+        self.assertEqual(len(lines), depth - 1)
+        self.assertEqual(lines[0], "  └─run_1")
+        self.assertTrue(lines[-1].endswith(f"└─run_{depth - 1}"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
+from datetime import datetime
 from mltrace.db import Store
+from mltrace.entities.history import History
 
 
 def isEqualComponentRun(crOne, crTwo):
@@ -149,3 +151,169 @@ class TestComponentRunHistory(unittest.TestCase):
         for idx, cr in enumerate(resCrList):
             self.assertTrue(isEqualComponentRun(
                 cr, self.secondAndThirdComponentRun[idx]))
+
+    def testKeysetPages(self):
+        """
+        Pages found by run id cursors don't skip or repeat runs that
+        started at the same time.
+        """
+        ts = datetime.utcnow()
+        ids = self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": "tied_component",
+                    "start_timestamp": ts,
+                    "end_timestamp": ts,
+                    "inputs": [],
+                    "outputs": [],
+                }
+                for _ in range(5)
+            ]
+        )
+
+        pages = []
+        last_run_id = None
+        while True:
+            page = self.store.get_component_runs_page(
+                "tied_component", 2, last_run_id
+            )
+            if len(page) == 0:
+                break
+            pages.append([cr.id for cr in page])
+            last_run_id = page[-1].id
+        self.assertEqual(pages, [ids[0:2], ids[2:4], ids[4:]])
+
+        history = self.store.get_history("tied_component", 3)
+        self.assertEqual([cr.id for cr in history], ids[::-1][:3])
+        history = self.store.get_history(
+            "tied_component", 3, last_run_id=history[-1].id
+        )
+        self.assertEqual([cr.id for cr in history], ids[::-1][3:])
+
+        recent = self.store.get_recent_run_ids(4)
+        recent += self.store.get_recent_run_ids(100, recent[-1])
+        self.assertEqual(recent, ids[::-1] + [4, 3, 2, 1])
+        with self.assertRaises(RuntimeError):
+            self.store.get_recent_run_ids(4, 1000)
+
+        # Slices from the end
+        resCrList = self.store.get_component_runs_by_index(
+            "tied_component", -2, 0)
+        self.assertEqual([cr.id for cr in resCrList], ids[-2:])
+        resCrList = self.store.get_component_runs_by_index(
+            "tied_component", -4, -1)
+        self.assertEqual([cr.id for cr in resCrList], ids[-4:-1])
+
+    def testIndexSeeks(self):
+        """
+        Index slices are keyset seeks from the nearest end or from an
+        anchor, and never count the runs.
+        """
+        ts = datetime.utcnow()
+        ids = self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": "seek_component",
+                    "start_timestamp": ts,
+                    "end_timestamp": ts,
+                    "inputs": [],
+                    "outputs": [],
+                }
+                for _ in range(10)
+            ]
+        )
+
+        def count(component_name):
+            raise AssertionError("get_component_runs_count was called")
+
+        self.store.get_component_runs_count = count
+        slices = [(2, -3), (-8, 5), (-3, 0), (-20, 2), (4, 20), (5, -9)]
+        for first_idx, last_idx in slices:
+            expected = ids[first_idx:last_idx or None]
+            for anchor in [None, (3, ids[3]), (7, ids[7]), (-4, ids[-4])]:
+                resCrList = self.store.get_component_runs_by_index(
+                    "seek_component", first_idx, last_idx, anchor=anchor
+                )
+                self.assertEqual([cr.id for cr in resCrList], expected)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.store = Store("test")
+        self.ids = self._log(7)
+        self.history = History(
+            "mock_component", page_size=3, max_pages=2, store=self.store
+        )
+
+    def _log(self, num_runs: int):
+        return self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": "mock_component",
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [],
+                    "outputs": [],
+                }
+                for _ in range(num_runs)
+            ]
+        )
+
+    def testSequence(self):
+        self.assertEqual(len(self.history), 7)
+        self.assertEqual([cr.id for cr in self.history], self.ids)
+        self.assertEqual(
+            [cr.id for cr in reversed(self.history)], self.ids[::-1]
+        )
+        self.assertEqual(self.history[0].id, self.ids[0])
+        self.assertEqual(self.history[-1].id, self.ids[-1])
+        self.assertEqual(
+            [cr.id for cr in self.history[2:6]], self.ids[2:6]
+        )
+        self.assertEqual(
+            [cr.id for cr in self.history[::-2]], self.ids[::-2]
+        )
+        with self.assertRaises(IndexError):
+            self.history[7]
+
+        # Only the most recently used pages are kept
+        self.assertEqual(len(self.history._pages), 2)
+
+    def testSeeksFromNearestPage(self):
+        ids = self.ids + self._log(33)
+        seeks = []
+        get_component_runs_by_index = self.store.get_component_runs_by_index
+
+        def spy(*args, **kwargs):
+            seeks.append(args[1:])
+            return get_component_runs_by_index(*args, **kwargs)
+
+        self.store.get_component_runs_by_index = spy
+        history = History(
+            "mock_component", page_size=3, max_pages=4, store=self.store
+        )
+        for idx in [19, 31, 25]:
+            self.assertEqual(history[idx].id, ids[idx])
+
+        # The first page is found from the oldest run, the second from the
+        # newest and the third from the last run of the first page
+        self.assertEqual(
+            seeks,
+            [
+                (18, 21, "default", None),
+                (-10, -7, "default", None),
+                (24, 27, "default", (20, ids[20])),
+            ],
+        )
+
+    def testInvalidation(self):
+        self.history.max_age = 3600
+        self.assertEqual(self.history[-1].id, self.ids[-1])
+
+        # Cached pages are trusted until max_age has passed
+        new_ids = self._log(2)
+        self.assertEqual(len(self.history), 7)
+        self.history.max_age = 0
+        self.assertEqual(len(self.history), 9)
+        self.assertEqual(self.history[-1].id, new_ids[-1])
+        self.assertEqual([cr.id for cr in self.history], self.ids + new_ids)
@@ -37,6 +37,63 @@ class TestDags(unittest.TestCase):
         level_id = [(level, cr.id) for level, cr in trace]
         self.assertEqual(expected_result, level_id)
 
+    def testLongChain(self):
+        # Chains deeper than the recursion limit can be traced
+        num_runs = 1500
+        self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": f"mock_component_{i}",
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [(f"iop_{i}", "", None)],
+                    "outputs": [(f"iop_{i + 1}", "", None)],
+                }
+                for i in range(num_runs)
+            ]
+        )
+
+        trace = self.store.trace(f"iop_{num_runs}")
+        self.assertEqual(
+            [(level, cr.id) for level, cr in trace],
+            [(num_runs - i, i) for i in range(num_runs, 0, -1)],
+        )
+
+        res = self.store.web_trace(f"iop_{num_runs}")[0]
+        for _ in range(num_runs - 1):
+            res = res["childNodes"][-1]
+        self.assertEqual(res["label"], "mock_component_0")
+
+    def testTraceBatch(self):
+        # Two branches sharing a root; the second branch writes two outputs
+        for name, inp, outs in [
+            ("root", "raw", ["clean"]),
+            ("left", "clean", ["left_out"]),
+            ("right", "clean", ["right_out_1", "right_out_2"]),
+        ]:
+            cr = self.store.initialize_empty_component_run(name)
+            cr.set_start_timestamp()
+            cr.set_end_timestamp()
+            cr.add_input(self.store.get_io_pointer(inp))
+            cr.add_outputs([self.store.get_io_pointer(out) for out in outs])
+            self.store.set_dependencies_from_inputs(cr)
+            self.store.commit_component_run(cr)
+
+        output_ids = ["left_out", "right_out_1", "right_out_2"]
+        traces = self.store.trace_batch(output_ids)
+        for output_id in output_ids:
+            self.assertEqual(
+                [(level, cr.id) for level, cr in traces[output_id]],
+                [(level, cr.id) for level, cr in self.store.trace(output_id)],
+            )
+
+        # Outputs of the same run share a trace, and runs are shared
+        self.assertIs(traces["right_out_1"], traces["right_out_2"])
+        self.assertIs(traces["left_out"][1][1], traces["right_out_1"][1][1])
+
+        with self.assertRaises(RuntimeError):
+            self.store.trace_batch(["left_out", "missing"])
+
     def testVersionedComputation(self):
         # Run the same computation many times
         self.store.create_component("mock_component", "", "")
@@ -0,0 +1,277 @@
+import hashlib
+import io
+import os
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mltrace.db import IOPointer, Store, fingerprint
+from mltrace.db.fingerprint import (
+    _FileFingerprintCache,
+    _fingerprinters,
+    _is_exact,
+    register_fingerprinter,
+)
+from mltrace.db.utils import _hash_value, _hash_values
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_file_cache = fingerprint._file_cache
+        fingerprint._file_cache = _FileFingerprintCache(
+            os.path.join(self.tmpdir.name, "fingerprints.db")
+        )
+
+    def tearDown(self):
+        fingerprint._file_cache = self.old_file_cache
+        self.tmpdir.cleanup()
+
+    def _write(self, name: str, contents: bytes, age: float = 60) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(contents)
+        mtime = os.stat(path).st_mtime - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def testDataFrames(self):
+        df = pd.DataFrame(np.arange(20000.0).reshape(2000, 10))
+        self.assertEqual(_hash_value(df), _hash_value(df.copy()))
+
+        # Memory layout doesn't matter, but every value does, including
+        # the ones repr leaves out
+        self.assertEqual(
+            _hash_value(df),
+            _hash_value(pd.DataFrame(np.asfortranarray(df.to_numpy()))),
+        )
+        changed = df.copy()
+        changed.iloc[1000, 5] = -1.0
+        self.assertEqual(repr(changed), repr(df))
+        self.assertNotEqual(_hash_value(changed), _hash_value(df))
+        self.assertNotEqual(_hash_value(df), _hash_value(df.astype("f4")))
+        self.assertNotEqual(_hash_value(df), _hash_value(df.iloc[::-1]))
+
+        mixed = pd.DataFrame(
+            {
+                "a": ["x", "y"],
+                "b": pd.Categorical(["p", "q"]),
+                "c": pd.to_datetime(["2020", "2021"]).tz_localize("UTC"),
+                "d": [1, 2],
+            }
+        )
+        self.assertEqual(_hash_value(mixed), _hash_value(mixed.copy()))
+        self.assertNotEqual(
+            _hash_value(mixed), _hash_value(mixed.assign(a=["x", "z"]))
+        )
+
+    def testArraysAndBytes(self):
+        a = np.arange(12).reshape(3, 4)
+        self.assertEqual(_hash_value(a), _hash_value(a.copy()))
+        self.assertEqual(
+            _hash_value(a[:, ::2]),
+            _hash_value(np.ascontiguousarray(a[:, ::2])),
+        )
+        self.assertNotEqual(_hash_value(a), _hash_value(a.reshape(4, 3)))
+        self.assertNotEqual(_hash_value(a), _hash_value(a.T))
+        self.assertEqual(
+            _hash_value(np.array(["a", 1], dtype=object)),
+            _hash_value(np.array(["a", 1], dtype=object)),
+        )
+
+        self.assertEqual(_hash_value(b"abc"), _hash_value(b"abc"))
+        self.assertNotEqual(_hash_value(b"abc"), _hash_value(b"abd"))
+        f = io.BytesIO(b"abc")
+        self.assertEqual(_hash_value(f), _hash_value(f))
+        self.assertEqual(f.tell(), 0)
+
+    def testObjectElementTypes(self):
+        # Elements with the same string form but different types differ
+        self.assertNotEqual(
+            _hash_value(np.array([1, 2], dtype=object)),
+            _hash_value(np.array(["1", "2"], dtype=object)),
+        )
+        self.assertNotEqual(
+            _hash_value(pd.Series([1, 2], dtype=object)),
+            _hash_value(pd.Series(["1", "2"])),
+        )
+        self.assertNotEqual(
+            _hash_value(pd.DataFrame({"a": [1.0, None]}, dtype=object)),
+            _hash_value(pd.DataFrame({"a": ["1.0", "None"]})),
+        )
+        self.assertEqual(
+            _hash_value(pd.Series(["x", "y"])),
+            _hash_value(pd.Series(["x", "y"])),
+        )
+
+    def testFiles(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = pathlib.Path(tmpdir) / "first.csv"
+            second = pathlib.Path(tmpdir) / "second.csv"
+            first.write_bytes(b"a,b\n1,2\n")
+            second.write_bytes(b"a,b\n1,2\n")
+
+            # Identity comes from the contents of the file
+            self.assertEqual(_hash_value(first), _hash_value(second))
+            second.write_bytes(b"a,b\n1,3\n")
+            self.assertNotEqual(_hash_value(first), _hash_value(second))
+            self.assertNotEqual(
+                _hash_value(first), _hash_value(pathlib.Path(tmpdir, "x"))
+            )
+
+    def testFileCache(self):
+        cache = fingerprint._file_cache
+        path = self._write("train.csv", b"a,b\n1,2\n")
+        self.assertIsNone(cache.get(path))
+        digest = cache.fingerprint(path)
+        self.assertEqual(cache.get(path), digest)
+
+        # The cache persists across processes
+        other = _FileFingerprintCache(cache.path)
+        self.assertEqual(other.get(path), digest)
+
+        # Changing the file changes its stat key
+        self._write("train.csv", b"a,b\n1,2\n3,4\n")
+        self.assertIsNone(cache.get(path))
+        self.assertNotEqual(cache.fingerprint(path), digest)
+
+        # Files written just now are hashed but not cached
+        fresh = self._write("fresh.csv", b"a,b\n", age=0)
+        cache.fingerprint(fresh)
+        self.assertIsNone(cache.get(fresh))
+
+    def testChunkedFiles(self):
+        contents = bytes(range(256)) * 40
+        path = self._write("large.bin", contents)
+        old_chunk_size = fingerprint._FILE_CHUNK_SIZE
+        fingerprint._FILE_CHUNK_SIZE = 1000
+        try:
+            digest = fingerprint._hash_file(path, len(contents))
+        finally:
+            fingerprint._FILE_CHUNK_SIZE = old_chunk_size
+
+        root = hashlib.blake2b(digest_size=32, person=b"mltrace-file")
+        root.update(f"{len(contents)}\0".encode())
+        for start in range(0, len(contents), 1000):
+            end = start + 1000
+            root.update(
+                hashlib.blake2b(
+                    contents[start:end],
+                    digest_size=32,
+                    person=b"mltrace-chunk",
+                ).digest()
+            )
+        self.assertEqual(digest, root.digest())
+
+    def testFilePointers(self):
+        store = Store("test")
+        path = self._write("features.csv", b"a,b\n1,2\n")
+        self.assertEqual(
+            bytes(store.get_io_pointer(path).value),
+            _hash_value(pathlib.Path(path)),
+        )
+        self.assertEqual(bytes(store.get_io_pointer("not_a_file").value), b"")
+
+        self._write("features.csv", b"a,b\n1,3\n")
+        self.assertEqual(
+            [bytes(iop.value) for iop in store.get_io_pointers([path])],
+            [_hash_value(pathlib.Path(path))],
+        )
+        self.assertEqual(store.session.query(IOPointer).count(), 3)
+
+    def testReprFallback(self):
+        # Other values hash as in earlier releases
+        self.assertEqual(_hash_value(""), b"")
+        self.assertEqual(
+            _hash_value("abc"), hashlib.sha256(repr("abc").encode()).digest()
+        )
+        self.assertEqual(
+            _hash_value({"a": 1}), hashlib.sha256(b"{'a': 1}").digest()
+        )
+
+    def testRegisterFingerprinter(self):
+        class Model(object):
+            def __init__(self, weights):
+                self.weights = weights
+
+        num_fingerprinters = len(_fingerprinters)
+        try:
+            register_fingerprinter(
+                Model, lambda model, h: h.update(model.weights)
+            )
+            self.assertEqual(
+                _hash_value(Model(np.ones(3))), _hash_value(Model(np.ones(3)))
+            )
+            self.assertNotEqual(
+                _hash_value(Model(np.ones(3))),
+                _hash_value(Model(np.zeros(3))),
+            )
+        finally:
+            del _fingerprinters[: len(_fingerprinters) - num_fingerprinters]
+
+    def testUnhashableElements(self):
+        tokens = pd.DataFrame({"tokens": [["a", "b"], ["c"]]})
+        self.assertEqual(_hash_value(tokens), _hash_value(tokens.copy()))
+        self.assertNotEqual(
+            _hash_value(tokens),
+            _hash_value(pd.DataFrame({"tokens": [["a", "b"], ["d"]]})),
+        )
+
+        nested = np.empty(2, dtype=object)
+        nested[0], nested[1] = [1, 2], {"a": 1}
+        self.assertEqual(_hash_value(nested), _hash_value(nested.copy()))
+
+    def testFingerprinterErrors(self):
+        class Model(object):
+            def __repr__(self):
+                return "Model()"
+
+        def fail(value, h):
+            raise ValueError("no weights")
+
+        num_fingerprinters = len(_fingerprinters)
+        try:
+            # Values whose fingerprinter raises are hashed by their repr
+            register_fingerprinter(Model, fail)
+            self.assertEqual(
+                _hash_value(Model()),
+                hashlib.sha256(b"Model()").digest(),
+            )
+
+            # unless they are exact
+            register_fingerprinter(Model, fail, exact=True)
+            with self.assertRaises(RuntimeError):
+                _hash_value(Model())
+        finally:
+            del _fingerprinters[: len(_fingerprinters) - num_fingerprinters]
+
+    def testIsExact(self):
+        self.assertTrue(_is_exact(np.arange(3)))
+        self.assertTrue(_is_exact(pd.DataFrame({"a": [1, 2], "b": [0.5, 1]})))
+        self.assertTrue(_is_exact(b"abc"))
+
+        # Values that hold Python objects are hashed by element reprs
+        self.assertFalse(_is_exact(np.array([1, 2], dtype=object)))
+        self.assertFalse(_is_exact(pd.DataFrame({"a": [1], "b": ["x"]})))
+        self.assertFalse(_is_exact(pd.Series([1, 2], index=["x", "y"])))
+        self.assertFalse(_is_exact(pd.Series(pd.Categorical(["p", "q"]))))
+        self.assertFalse(_is_exact(np.ma.masked_array([1, 2])))
+
+    def testHashValues(self):
+        values = [
+            "",
+            "abc",
+            np.arange(5),
+            pd.DataFrame({"a": [1, 2]}),
+            b"abc",
+        ]
+        self.assertEqual(
+            _hash_values(values), [_hash_value(v) for v in values]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+
+from datetime import datetime
+from mltrace.db import ComponentRun, LineageIndex, Store
+from mltrace.db.models import component_run_dependencies
+
+
+class TestLineageIndex(unittest.TestCase):
+    def setUp(self):
+        self.store = Store("test")
+        self.index = LineageIndex(store=self.store, refresh_interval=0)
+
+    def _log(self, name: str, inputs: list, outputs: list):
+        self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": name,
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [(i, "", None) for i in inputs],
+                    "outputs": [(o, "", None) for o in outputs],
+                }
+            ]
+        )
+
+    def _diamond(self):
+        self._log("ingest", ["raw"], ["clean"])
+        self._log("features", ["clean"], ["features"])
+        self._log("labels", ["clean"], ["labels"])
+        self._log("train", ["features", "labels"], ["model"])
+
+    def testTraceMatchesStore(self):
+        self._diamond()
+        self.assertEqual(
+            self.index.web_trace_dag("model"),
+            self.store.web_trace_dag("model", last_only=True),
+        )
+        self.assertEqual(self.index.producer("model"), 4)
+        self.assertEqual(self.index.ancestors(4), [1, 2, 3, 4])
+        self.assertEqual(self.index.descendants(1), [1, 2, 3, 4])
+        self.assertEqual(self.index.descendants(2), [2, 4])
+
+        with self.assertRaises(RuntimeError):
+            self.index.web_trace_dag("missing")
+
+    def testIncrementalRefresh(self):
+        self._diamond()
+        self.index.refresh()
+        self.assertEqual(len(self.index), 4)
+
+        # A newer run of an existing output becomes its producer
+        self._log("features", ["clean"], ["features"])
+        self._log("evaluate", ["model"], ["report"])
+        self.assertEqual(self.index.producer("features"), 5)
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.ancestors(6), [1, 2, 3, 4, 6])
+        self.assertEqual(
+            self.index.web_trace_dag("report"),
+            self.store.web_trace_dag("report", last_only=True),
+        )
+
+        # Polls are skipped until refresh_interval has passed
+        self.index.refresh_interval = 3600
+        self._log("evaluate", ["model"], ["report_2"])
+        with self.assertRaises(RuntimeError):
+            self.index.producer("report_2")
+        self.index.refresh()
+        self.assertEqual(self.index.producer("report_2"), 7)
+
+    def testOutOfOrderCommits(self):
+        # Run 6 commits before run 5, which it depends on
+        self._diamond()
+        self.index.refresh()
+
+        def insert(run_id: int, dep_ids: list):
+            run = ComponentRun("train")
+            run.id = run_id
+            run.start_timestamp = datetime.utcnow()
+            self.store.session.add(run)
+            self.store.session.flush()
+            for dep_id in dep_ids:
+                self.store.session.execute(
+                    component_run_dependencies.insert().values(
+                        component_run_id=run_id,
+                        depends_on_component_run_id=dep_id,
+                    )
+                )
+            self.store.session.commit()
+
+        insert(6, [5])
+        self.index.refresh()
+        self.assertEqual(self.index.ancestors(6), [6])
+
+        # The poll that finds run 5 adds the edge to it
+        insert(5, [4])
+        self.index.refresh()
+        self.assertEqual(self.index.ancestors(6), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.index.descendants(5), [5, 6])
+
+    def testReviewFlaggedOutputs(self):
+        self._diamond()
+        self._log("predict", ["model", "x"], ["pred_1"])
+        self._log("predict", ["model", "y"], ["pred_2"])
+        self.store.set_io_pointer_flag("pred_1", True)
+        self.store.set_io_pointer_flag("pred_2", True)
+
+        flagged, counts = self.index.review_flagged_outputs()
+        expected_flagged, expected_counts = self.store.review_flagged_outputs()
+        self.assertEqual(sorted(flagged), sorted(expected_flagged))
+        self.assertEqual(
+            counts, [(cr.id, count) for cr, count in expected_counts]
+        )
+
+        _, counts = self.index.review_flagged_outputs(limit=2)
+        self.assertEqual(counts, [(4, 2), (3, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,27 @@
 import copy
+import os
+
+from datetime import datetime
+import tempfile
 import unittest
 
+from sqlalchemy import inspect as sa_inspect, text
+
 from mltrace.db import Component, ComponentRun, IOPointer, Store
+from mltrace.db.models import (
+    flagged_output_lineage,
+    flagged_output_lineage_outputs,
+)
+from mltrace.db.store import _known_code_snapshots
+from mltrace.utils import convertToClient
+from mltrace.db.utils import (
+    _SCHEMA_REVISION,
+    _dispose_engines,
+    _get_engine,
+    _get_schema_revision,
+    _verify_schema,
+    _verified_uris,
+)
 
 
 class TestStore(unittest.TestCase):
@@ -114,6 +134,64 @@ class TestStore(unittest.TestCase):
 
         self.assertEqual(set(iops), set(iops2))
 
+    def testUpsertIOPointers(self):
+        # Existing pointers are reused and returned in request order
+        existing = self.store.get_io_pointers(["a", "b"])
+        iops = self.store.get_io_pointers(["b", "c", "a", "c"])
+        self.assertEqual([iop.name for iop in iops], ["b", "c", "a"])
+        self.assertEqual(set(existing), set([iops[0], iops[2]]))
+        self.assertEqual(self.store.session.query(IOPointer).count(), 3)
+
+    def testLatestOutputs(self):
+        for value in ["v1", "v2"]:
+            cr = self.store.initialize_empty_component_run("writer")
+            cr.set_start_timestamp()
+            cr.set_end_timestamp()
+            cr.add_output(self.store.get_io_pointer("out", value))
+            self.store.commit_component_run(cr)
+
+        # Only a value different from the last write warns
+        with self.assertLogs(level="WARNING"):
+            self.store.get_io_pointer("out", "v1")
+        with self.assertRaises(AssertionError):
+            with self.assertLogs(level="WARNING"):
+                self.store.get_io_pointer("out", "v2")
+
+        # Deleting the latest writer falls back to the previous one
+        latest = self.store.get_history("writer", limit=1)[0]
+        self.store.delete_component_run(latest)
+        with self.assertRaises(AssertionError):
+            with self.assertLogs(level="WARNING"):
+                self.store.get_io_pointer("out", "v1")
+
+    def testStalenessMessages(self):
+        # Two upstream components, the first with two fresher runs
+        deps = []
+        for name, num_runs in [("up_1", 3), ("up_2", 1)]:
+            for i in range(num_runs):
+                cr = self.store.initialize_empty_component_run(name)
+                cr.set_start_timestamp(datetime(2021, 1, 1 + i))
+                cr.set_end_timestamp(datetime(2021, 1, 1 + i))
+                self.store.commit_component_run(cr)
+                if i == 0:
+                    deps.append(cr)
+
+        cr = self.store.initialize_empty_component_run("down")
+        cr.set_start_timestamp(datetime(2021, 3, 1))
+        cr.set_end_timestamp(datetime(2021, 3, 1))
+        cr.set_upstream(deps)
+        self.store.commit_component_run(cr)
+
+        self.assertEqual(
+            sorted(self.store.get_history("down", limit=1)[0].stale),
+            [
+                f"up_1 (ID {deps[0].id}) has 2 fresher runs that began "
+                + "before this component run started.",
+                f"up_1 (ID {deps[0].id}) was run 59 days ago.",
+                f"up_2 (ID {deps[1].id}) was run 59 days ago.",
+            ],
+        )
+
     def testKVIOPointer(self):
         iop_name = "name"
         iop_value = "value"
@@ -283,6 +361,46 @@ class TestStore(unittest.TestCase):
 
         self.assertEqual(web_trace, expected_res)
 
+    def testWebTraceDag(self):
+        # Diamond: top depends on left and right, which share a root
+        for name, inps, outs in [
+            ("root", [], ["raw"]),
+            ("left", ["raw"], ["l"]),
+            ("right", ["raw"], ["r"]),
+            ("top", ["l", "r"], ["out"]),
+        ]:
+            cr = self.store.initialize_empty_component_run(name)
+            cr.set_start_timestamp()
+            cr.set_end_timestamp()
+            cr.add_inputs([self.store.get_io_pointer(inp) for inp in inps])
+            cr.add_outputs([self.store.get_io_pointer(out) for out in outs])
+            self.store.set_dependencies_from_inputs(cr)
+            self.store.commit_component_run(cr)
+
+        dag = self.store.web_trace_dag("out")
+        self.assertEqual(dag["roots"], ["componentrun_4"])
+        self.assertEqual(
+            [(node["id"], node["label"]) for node in dag["nodes"]],
+            [
+                ("componentrun_1", "root"),
+                ("componentrun_2", "left"),
+                ("componentrun_3", "right"),
+                ("componentrun_4", "top"),
+            ],
+        )
+        self.assertEqual(
+            dag["nodes"][3]["childNodes"][0]["id"], "iopointer_out"
+        )
+        self.assertEqual(
+            dag["edges"],
+            [
+                ["componentrun_2", "componentrun_1"],
+                ["componentrun_3", "componentrun_1"],
+                ["componentrun_4", "componentrun_2"],
+                ["componentrun_4", "componentrun_3"],
+            ],
+        )
+
     def testBasicFlaggedOutputs(self):
         # Create components and iopointers
         self.store.create_component(
@@ -329,6 +447,20 @@ class TestStore(unittest.TestCase):
         expected_res = [(1, 2), (3, 1), (2, 1)]
         self.assertEqual(res, expected_res)
 
+        # Flagged outputs without a producer are only looked up once
+        self.store.get_io_pointer("orphan")
+        self.store.set_io_pointer_flag("orphan", True)
+        cached = []
+        cache_flagged_lineage = self.store._cache_flagged_lineage
+        self.store._cache_flagged_lineage = lambda output_ids: (
+            cached.extend(output_ids),
+            cache_flagged_lineage(output_ids),
+        )
+        for _ in range(2):
+            _, res = self.store.review_flagged_outputs()
+            self.assertEqual([(cr.id, c) for cr, c in res], expected_res)
+        self.assertEqual(cached, [])
+
     def testManyFlaggedOutputs(self):
         # Create components and iopointers
         self.store.create_component(
@@ -410,6 +542,359 @@ class TestStore(unittest.TestCase):
         ]
         self.assertEqual(res, expected_res)
 
+        # Top-k
+        _, res = self.store.review_flagged_outputs(limit=2)
+        self.assertEqual([cr.id for cr, _ in res], [2, 1])
+
+        # Unflagging updates the cached counts
+        self.store.set_io_pointer_flag("iop_7", False)
+        outputs, res = self.store.review_flagged_outputs()
+        self.assertEqual(sorted(outputs), ["iop_4", "iop_5", "iop_6"])
+        self.assertEqual(
+            [(cr.id, count) for cr, count in res],
+            [(2, 3), (1, 3), (5, 1), (4, 1), (3, 1)],
+        )
+
+        # Outputs flagged before the cache existed are filled in
+        self.store.session.execute(flagged_output_lineage.delete())
+        self.store.session.execute(flagged_output_lineage_outputs.delete())
+        _, res = self.store.review_flagged_outputs()
+        self.assertEqual(len(res), 5)
+
+        # A newer run that writes a flagged output replaces its lineage
+        cr_D = self.store.initialize_empty_component_run("test_component_D")
+        cr_D.set_start_timestamp()
+        cr_D.set_end_timestamp()
+        cr_D.add_output(self.store.get_io_pointer("iop_6"))
+        self.store.commit_component_run(cr_D)
+        _, res = self.store.review_flagged_outputs()
+        self.assertEqual(
+            [(cr.id, count) for cr, count in res],
+            [(2, 2), (1, 2), (7, 1), (4, 1), (3, 1)],
+        )
+
+        self.store.unflag_all()
+        self.assertEqual(self.store.review_flagged_outputs(), ([], []))
+
+    def testBulkCommitComponentRuns(self):
+        # Existing upstream run
+        cr = self.store.initialize_empty_component_run("upstream")
+        cr.set_start_timestamp()
+        cr.set_end_timestamp()
+        cr.add_output(self.store.get_io_pointer("raw.csv"))
+        self.store.commit_component_run(cr)
+
+        # Chain of runs that depend on the db and on each other
+        runs = [
+            {
+                "component_name": f"bulk_{i}",
+                "start_timestamp": datetime.utcnow(),
+                "end_timestamp": datetime.utcnow(),
+                "inputs": [(f"iop_{i}" if i else "raw.csv", "", None)],
+                "outputs": [(f"iop_{i + 1}", "", None)],
+            }
+            for i in range(5)
+        ]
+        runs.append(
+            {
+                "component_name": "explicit",
+                "start_timestamp": datetime.utcnow(),
+                "end_timestamp": datetime.utcnow(),
+                "dependencies": ["upstream"],
+            }
+        )
+        ids = self.store.bulk_commit_component_runs(runs)
+        self.assertEqual(len(ids), 6)
+
+        # The caller's runs keep their unhashed values
+        self.assertEqual(runs[1]["inputs"], [("iop_1", "", None)])
+        self.assertNotIn("inputs", runs[-1])
+
+        trace = self.store.trace("iop_5")
+        self.assertEqual(
+            [(level, cr.component_name) for level, cr in trace],
+            [(4 - i, f"bulk_{i}") for i in reversed(range(5))]
+            + [(5, "upstream")],
+        )
+        explicit = self.store.get_component_run(ids[-1])
+        self.assertEqual(
+            [dep.id for dep in explicit.dependencies], [cr.id]
+        )
+        self.assertIsNotNone(self.store.get_component("bulk_0"))
+        self.assertEqual(
+            [iop.name for iop in self.store.get_component_run(ids[0]).inputs],
+            ["raw.csv"],
+        )
+
+        # Repeated io pointers are linked once
+        (dup_id,) = self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": "dup",
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [("dup.csv", "", None)] * 2,
+                }
+            ]
+        )
+        self.assertEqual(
+            len(self.store.get_component_run(dup_id).inputs), 1
+        )
+
+        # Runs without timestamps are rejected
+        with self.assertRaises(RuntimeError):
+            self.store.bulk_commit_component_runs(
+                [{"component_name": "incomplete"}]
+            )
+
+    def testClientConversion(self):
+        ids = self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": name,
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [(inp, "", None)],
+                    "outputs": [(out, "", None)],
+                    "git_tags": ["v1"],
+                }
+                for name, inp, out in [
+                    ("first", "raw", "clean"),
+                    ("second", "clean", "model"),
+                ]
+            ]
+        )
+        relations = self.store.get_component_run_relations(ids)
+        self.assertEqual(relations[ids[1]][0][0][0], "clean")
+        self.assertEqual(relations[ids[1]][1][0][0], "model")
+        self.assertEqual(relations[ids[1]][2], ["first"])
+
+        # Relations are loaded for the whole batch on first use
+        crs = convertToClient(
+            self.store.get_history("second", limit=None), self.store
+        )
+        self.assertEqual(crs[0].git_tags, ["v1"])
+        loader = crs[0]._loader
+        self.assertIsNone(loader._relations)
+        self.assertEqual(crs[0].dependencies, ["first"])
+        self.assertEqual(
+            [iop["name"] for iop in crs[0].outputs], ["model"]
+        )
+        self.assertIsNotNone(loader._relations)
+
+        rows = self.store.get_history_rows("first", limit=None)
+        self.assertEqual([row.id for row in rows], ids[:1])
+        self.assertEqual(self.store.get_component_run_row(ids[0]).id, ids[0])
+        self.assertIsNone(self.store.get_component_run_row(1000))
+
+    def testLoadProfiles(self):
+        self.store.bulk_commit_component_runs(
+            [
+                {
+                    "component_name": "profiled",
+                    "start_timestamp": datetime.utcnow(),
+                    "end_timestamp": datetime.utcnow(),
+                    "inputs": [],
+                    "outputs": [("profiled_out", "", None)],
+                    "git_tags": ["v1"],
+                    "code_snapshot": b"print('hello')",
+                }
+            ]
+        )
+
+        def loaded(cr):
+            return set(cr.__dict__.keys())
+
+        cr = self.store.get_history("profiled")[0]
+        self.assertNotIn("code_snapshot", loaded(cr))
+        self.assertIn("git_tags", loaded(cr))
+        self.store.session.expunge_all()
+
+        cr = self.store.trace("profiled_out", "summary")[0][1]
+        self.assertNotIn("git_tags", loaded(cr))
+        # Deferred columns still load on access inside the session
+        self.assertEqual(cr.code_snapshot, b"print('hello')")
+        self.store.session.expunge_all()
+
+        cr = self.store.get_history("profiled", profile="full")[0]
+        self.assertEqual(cr.code_snapshot, b"print('hello')")
+
+        row = self.store.get_history_rows("profiled", profile="summary")[0]
+        self.assertNotIn("git_tags", row._mapping)
+        self.assertIn("stale", row._mapping)
+
+        with self.assertRaises(RuntimeError):
+            self.store.get_history("profiled", profile="everything")
+
+    def testCodeSnapshots(self):
+        snapshot = b"def f():\n    return 1\n" * 100
+
+        def log(name):
+            return self.store.bulk_commit_component_runs(
+                [
+                    {
+                        "component_name": name,
+                        "start_timestamp": datetime.utcnow(),
+                        "end_timestamp": datetime.utcnow(),
+                        "code_snapshot": snapshot,
+                    }
+                ]
+            )[0]
+
+        ids = [log("first"), log("second")]
+        cr = self.store.initialize_empty_component_run("third")
+        cr.set_start_timestamp()
+        cr.set_end_timestamp()
+        cr.set_code_snapshot(snapshot)
+        self.store.commit_component_run(cr)
+        ids.append(cr.id)
+
+        # One compressed copy is stored, and later runs don't resend it
+        stored = self.store.session.execute(
+            text("SELECT hash, snapshot FROM code_snapshots")
+        ).all()
+        self.assertEqual(len(stored), 1)
+        self.assertLess(len(stored[0][1]), len(snapshot))
+        self.assertIn(
+            stored[0][0], _known_code_snapshots[self.store.engine]
+        )
+
+        self.store.session.expunge_all()
+        for run_id in ids:
+            self.assertEqual(
+                self.store.get_component_run(run_id).code_snapshot, snapshot
+            )
+            self.assertEqual(
+                self.store.get_component_run_row(run_id).code_snapshot,
+                snapshot,
+            )
+
+        # Snapshots of rolled back runs are not remembered
+        with self.assertRaises(ValueError):
+            with self.store.batch():
+                self.store.bulk_commit_component_runs(
+                    [
+                        {
+                            "component_name": "fourth",
+                            "start_timestamp": datetime.utcnow(),
+                            "end_timestamp": datetime.utcnow(),
+                            "code_snapshot": b"rolled back",
+                        }
+                    ]
+                )
+                raise ValueError()
+        self.assertEqual(len(_known_code_snapshots[self.store.engine]), 1)
+
+    def testFindComponentRuns(self):
+        ids = []
+        for i, auc in enumerate([0.7, 0.85, 0.9]):
+            cr = self.store.initialize_empty_component_run("train")
+            cr.set_start_timestamp()
+            cr.set_end_timestamp()
+            cr.set_git_tags(["v1"] if i == 0 else ["v2", "release"])
+            cr.set_mlflow_run_params({"lr": "0.1", "depth": i})
+            cr.set_mlflow_run_metrics({"val_auc": auc})
+            if i == 1:
+                cr.add_staleness_message("features is stale")
+            self.store.commit_component_run(cr)
+            ids.append(cr.id)
+
+        def find(**kwargs):
+            return [cr.id for cr in self.store.find_component_runs(**kwargs)]
+
+        self.assertEqual(find(), ids[::-1])
+        self.assertEqual(find(stale=True), [ids[1]])
+        self.assertEqual(find(stale=False), [ids[2], ids[0]])
+        self.assertEqual(find(git_tag="release"), [ids[2], ids[1]])
+        self.assertEqual(find(git_tag="v3"), [])
+        self.assertEqual(
+            find(mlflow_params={"lr": "0.1", "depth": 1}), [ids[1]]
+        )
+        self.assertEqual(
+            find(mlflow_metrics=[("val_auc", "<", 0.8)]), [ids[0]]
+        )
+        self.assertEqual(
+            find(
+                component_name="train",
+                git_tag="v2",
+                mlflow_metrics=[("val_auc", ">=", 0.85)],
+                limit=1,
+                last_run_id=ids[2],
+            ),
+            [ids[1]],
+        )
+        with self.assertRaises(RuntimeError):
+            find(mlflow_metrics=[("val_auc", "~", 0.8)])
+
+        rows = self.store.find_component_run_rows(stale=True)
+        self.assertEqual(rows[0].stale, ["features is stale"])
+        self.assertEqual(rows[0].mlflow_run_metrics, {"val_auc": 0.85})
+
+    def testBatch(self):
+        # Writes in a batch are committed together
+        with self.store.batch():
+            self.store.create_component("batch_component", "", "")
+            self.store.get_io_pointer("batch_iop")
+        self.assertIsNotNone(self.store.get_component("batch_component"))
+
+        # A batch that raises is rolled back
+        with self.assertRaises(ValueError):
+            with self.store.batch():
+                self.store.create_component("rolled_back", "", "")
+                raise ValueError()
+        self.assertIsNone(self.store.get_component("rolled_back"))
+
+    def testEngineRegistry(self):
+        # Engines are shared per uri until the registry is disposed
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = "sqlite:///" + os.path.join(tmpdir, "registry.db")
+            engine = _get_engine(uri)
+            self.assertIs(engine, _get_engine(uri))
+
+            _dispose_engines()
+            self.assertIsNot(engine, _get_engine(uri))
+            _dispose_engines()
+
+    def testSchemaVerification(self):
+        # A fresh db gets tables and is stamped with the current revision
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = "sqlite:///" + os.path.join(tmpdir, "schema.db")
+            engine = _get_engine(uri)
+            self.assertIsNone(_get_schema_revision(engine))
+
+            _verify_schema(uri, engine)
+            self.assertIn(uri, _verified_uris)
+            self.assertEqual(_get_schema_revision(engine), _SCHEMA_REVISION)
+
+            _verified_uris.discard(uri)
+            _dispose_engines()
+
+    def testJsonIndexes(self):
+        # GIN indexes are only built on Postgres
+        names = {
+            index["name"]
+            for index in sa_inspect(self.store.engine).get_indexes(
+                "component_runs"
+            )
+        }
+        self.assertIn("ix_component_runs_stale", names)
+        self.assertNotIn("ix_component_runs_git_tags", names)
+
+    def testUnstampedSchema(self):
+        # Tables created before revisions were tracked lack new columns,
+        # so they aren't silently reused
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = "sqlite:///" + os.path.join(tmpdir, "unstamped.db")
+            engine = _get_engine(uri)
+            with engine.begin() as con:
+                con.execute(text("CREATE TABLE components (name TEXT)"))
+
+            with self.assertRaises(RuntimeError):
+                _verify_schema(uri, engine)
+            self.assertNotIn(uri, _verified_uris)
+            self.assertIsNone(_get_schema_revision(engine))
+            _dispose_engines()
+
 
 if __name__ == "__main__":
     unittest.main()
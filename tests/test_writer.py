@@ -0,0 +1,172 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import joblib
+import numpy as np
+
+from mltrace.db.artifact_writer import ArtifactWriter
+from mltrace.db.utils import _write_artifact
+from mltrace.db.writer import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+    def testWritesInBatches(self):
+        written = []
+
+        def write_fn(store, items):
+            for item in items:
+                store.create_component(item, "", "")
+            written.extend(items)
+
+        writer = BatchWriter("test", write_fn, batch_size=10)
+        for i in range(25):
+            self.assertTrue(writer.put(f"component_{i}"))
+        self.assertTrue(writer.flush(timeout=10))
+
+        stats = writer.stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["written"], 25)
+        self.assertGreaterEqual(stats["batches"], 3)
+        self.assertIsNotNone(stats["last_flush_latency"])
+        self.assertEqual(len(written), 25)
+        writer.close()
+
+    def testBadItemDoesNotLoseBatch(self):
+        def write_fn(store, items):
+            for item in items:
+                if item == "bad":
+                    raise RuntimeError("bad item")
+                store.create_component(item, "", "")
+
+        writer = BatchWriter("test", write_fn)
+        for item in ["good_1", "bad", "good_2"]:
+            writer.put(item)
+        writer.flush(timeout=10)
+
+        stats = writer.stats()
+        self.assertEqual(stats["written"], 2)
+        self.assertEqual(stats["failed"], 1)
+        writer.close()
+
+    def testDropWhenFull(self):
+        release = threading.Event()
+
+        def write_fn(store, items):
+            release.wait(10)
+
+        writer = BatchWriter(
+            "test", write_fn, max_queue_size=1, batch_size=1, block=False
+        )
+        results = [writer.put(i) for i in range(5)]
+        release.set()
+        writer.flush(timeout=10)
+
+        self.assertFalse(all(results))
+        self.assertEqual(writer.stats()["dropped"], results.count(False))
+        writer.close()
+
+    def testCloseWhenFull(self):
+        release = threading.Event()
+
+        def write_fn(store, items):
+            release.wait(10)
+
+        writer = BatchWriter("test", write_fn, max_queue_size=1, batch_size=1)
+        for i in range(2):
+            writer.put(i)
+
+        # A timed out close returns instead of blocking on the full queue
+        writer.close(timeout=0.1)
+        release.set()
+        with self.assertRaises(RuntimeError):
+            writer.put(2)
+
+
+class TestArtifactWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testWritesInBackground(self):
+        release = threading.Event()
+
+        def write_fn(obj, pathname):
+            release.wait(10)
+            _write_artifact(obj, pathname)
+
+        writer = ArtifactWriter(write_fn)
+        pathname = os.path.join(self.tmpdir.name, "model", "weights.mlt")
+        self.assertEqual(writer.put(np.arange(10), pathname), pathname)
+        self.assertFalse(os.path.exists(pathname))
+        self.assertEqual(writer.stats()["pending"], 1)
+        self.assertFalse(writer.flush(timeout=0.01))
+
+        release.set()
+        writer.wait([pathname])
+        np.testing.assert_array_equal(joblib.load(pathname), np.arange(10))
+        self.assertTrue(writer.flush(timeout=10))
+
+        # Only the renamed file is left behind
+        self.assertEqual(
+            os.listdir(os.path.dirname(pathname)), ["weights.mlt"]
+        )
+        stats = writer.stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["in_flight_bytes"], 0)
+        self.assertEqual(stats["written"], 1)
+        writer.close()
+
+    def testInFlightBytesCap(self):
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def write_fn(obj, pathname):
+            with lock:
+                in_flight.append(obj.nbytes)
+                max_in_flight.append(sum(in_flight))
+            threading.Event().wait(0.01)
+            with lock:
+                in_flight.remove(obj.nbytes)
+
+        writer = ArtifactWriter(
+            write_fn, max_workers=4, max_in_flight_bytes=2000
+        )
+        for i in range(10):
+            writer.put(np.zeros(100), f"{i}.mlt")
+        # Objects larger than the cap are written on their own
+        writer.put(np.zeros(1000), "large.mlt")
+        self.assertTrue(writer.flush(timeout=10))
+
+        self.assertTrue(all(b <= 2000 or b == 8000 for b in max_in_flight))
+        self.assertEqual(writer.stats()["written"], 11)
+        writer.close()
+
+    def testSamePathInOrder(self):
+        writer = ArtifactWriter(_write_artifact, max_workers=4)
+        pathname = os.path.join(self.tmpdir.name, "latest.mlt")
+        for i in range(20):
+            writer.put(i, pathname)
+        writer.wait([pathname])
+        self.assertEqual(joblib.load(pathname), 19)
+        writer.close()
+
+    def testFailedWrite(self):
+        def write_fn(obj, pathname):
+            raise RuntimeError("disk full")
+
+        writer = ArtifactWriter(write_fn)
+        writer.put("obj", "bad.mlt")
+        self.assertTrue(writer.flush(timeout=10))
+        self.assertEqual(writer.stats()["failed"], 1)
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.put("obj", "bad.mlt")
+
+
+if __name__ == "__main__":
+    unittest.main()